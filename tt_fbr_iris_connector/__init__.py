@@ -1,20 +1,22 @@
 from . import models
+from . import controllers
+from . import cli
 
-from odoo import api, SUPERUSER_ID
 import logging
 _logger = logging.getLogger(__name__)
 
 
-def _compute_fbr_rates_for_existing_products(env):
-    """ Compute FBR rates for all existing products """
-    # env = api.Environment(cr, SUPERUSER_ID, {})
-    products = env['product.template'].search([])
-    products._compute_fbr_rate_id()
-    _logger.info("Computed FBR rates for %s existing products", len(products))
-    
-def load_fbr_data_after_install(env):
-    """ Compute FBR rates for all existing products """
-    # env = api.Environment(cr, SUPERUSER_ID, {})
-    products = env['product.template'].search([])
-    products.load_fbr_static_options()
-    _logger.info("Computed FBR options", len(products))
\ No newline at end of file
+def pre_init_hook(env):
+    """Create the stored fbr_rate_id column up front.
+
+    The ORM computes a new stored field over every product in one recordset;
+    with the column already there it leaves it alone and the install
+    pipeline fills it in chunks instead.
+    """
+    env.cr.execute("ALTER TABLE product_template ADD COLUMN IF NOT EXISTS fbr_rate_id int4")
+
+
+def post_init_hook(env):
+    """Compute rates of existing products and load the FBR option catalog, in the background."""
+    env['fbr.install.pipeline']._schedule()
+    _logger.info("FBR product rates and option catalog will be loaded by the install pipeline cron")
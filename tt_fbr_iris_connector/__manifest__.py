@@ -1,6 +1,6 @@
 {
     'name': 'IRIS FBR CONNECTOR',
-    'version': '1.0',
+    'version': '1.3',
     'category': 'Point of Sale',
     'summary': 'Integrates Odoo POS with FBR Digital Invoicing for grocery stores in Pakistan',
     'description': """
@@ -40,19 +40,28 @@
         'views/account_move.xml',   
         'views/account_tax.xml',
         'views/fbr_options.xml',
+        'views/fbr_outbox.xml',
+        'views/fbr_registration_cache.xml',
+        'views/fbr_metrics_dashboard.xml',
+        'views/fbr_submission.xml',
+        'views/fbr_rate_limit.xml',
+        'views/fbr_circuit_breaker.xml',
+        'views/fbr_status_summary.xml',
+        'data/ir_cron.xml',
     ],
     'assets': {
         'point_of_sale._assets_pos': [
             'tt_fbr_iris_connector/static/src/app/models.js',
+            'tt_fbr_iris_connector/static/src/app/fbr_status.js',
+            'tt_fbr_iris_connector/static/src/app/fbr_items.js',
             'tt_fbr_iris_connector/static/src/js/shape.js',
             'tt_fbr_iris_connector/static/src/js/get_customer.js',
             'tt_fbr_iris_connector/static/src/xml/OrderReceipt.xml',
             'tt_fbr_iris_connector/static/src/js/pos_service_fee.js',
         ],
     },
-    # 'pre_init_hook': 'pre_init_check',
-    'post_init_hook': 'load_fbr_data_after_install',
-    'post_init_hook': '_compute_fbr_rates_for_existing_products',
+    'pre_init_hook': 'pre_init_hook',
+    'post_init_hook': 'post_init_hook',
     'auto_install': False,
     'application': True,
 }
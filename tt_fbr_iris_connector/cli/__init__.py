@@ -0,0 +1 @@
+from . import fbr_drain
@@ -0,0 +1,118 @@
+"""``odoo-bin fbr_drain``: post the FBR outbox from a dedicated process.
+
+Keeps gateway traffic out of the HTTP workers. Each round leases a batch of
+due outbox entries (SELECT ... FOR UPDATE SKIP LOCKED, see
+``fbr.outbox._claim_batch``), commits the lease, posts the whole batch with
+up to ``--workers`` requests in flight and commits the outcomes together.
+Any number of copies can run on any number of nodes: a leased entry is
+invisible to the others, and the idempotency keys stop a document from being
+accepted twice even if a lease runs out mid-post.
+
+Every post in flight briefly holds a database connection of its own (rate
+limiter, circuit breaker, metrics), so ``--workers`` is capped to fit the
+``db_maxconn`` connection pool of the process.
+
+    odoo-bin fbr_drain -c odoo.conf -d mydb --db_maxconn 64 --workers 48 --batch-size 500
+"""
+import argparse
+import logging
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+
+from odoo import api, SUPERUSER_ID
+from odoo.cli import Command
+from odoo.modules.registry import Registry
+from odoo.tools import config
+
+from ..tools import fbr_metrics
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 32
+# Connections kept free for the batch cursor, idempotency keys and ledger
+CONNECTION_HEADROOM = 4
+
+
+class FbrDrain(Command):
+    """Post queued FBR documents outside of the HTTP workers"""
+    name = 'fbr_drain'
+
+    def __init__(self):
+        super().__init__()
+        self.stop = threading.Event()
+
+    def _parse(self, args):
+        parser = argparse.ArgumentParser(
+            prog=f'{Path(sys.argv[0]).name} {self.name}',
+            description=self.__doc__,
+        )
+        parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                            help="FBR posts kept in flight at once, at most db_maxconn - %d (default: %d)"
+                                 % (CONNECTION_HEADROOM, DEFAULT_WORKERS))
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Outbox entries leased and committed together (default: 500)")
+        parser.add_argument('--lease', type=int, default=600,
+                            help="Seconds a leased batch stays hidden from other drains (default: 600)")
+        parser.add_argument('--idle', type=float, default=5.0,
+                            help="Seconds to sleep when the outbox is empty (default: 5)")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit as soon as the outbox is empty")
+        opts, odoo_args = parser.parse_known_args(args)
+        config.parse_config(odoo_args, setup_logging=True)
+        max_workers = max(config['db_maxconn'] - CONNECTION_HEADROOM, 1)
+        if opts.workers > max_workers:
+            _logger.warning("FBR drain: --workers %s exceeds what db_maxconn %s allows, using %s",
+                            opts.workers, config['db_maxconn'], max_workers)
+            opts.workers = max_workers
+        opts.workers = max(opts.workers, 1)
+        return opts
+
+    def _handle_signal(self, signum, _frame):
+        _logger.info("FBR drain: signal %s received, stopping after the current batch", signum)
+        self.stop.set()
+
+    def _drain_once(self, registry, opts):
+        """Lease, post and commit one batch; returns the number of entries leased."""
+        with registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            rate_wait = float(env['ir.config_parameter'].get_param('fbr.rate_limit_max_wait', 5))
+            env = env(context={'fbr_traffic': 'background', 'fbr_rate_wait': rate_wait, 'fbr_pool_size': opts.workers})
+            entries = env['fbr.outbox']._claim_batch(opts.batch_size, opts.lease)
+            cr.commit()
+            if not entries:
+                return 0
+            start = time.monotonic()
+            posted = entries._drain(opts.workers)
+            cr.commit()
+            _logger.info("FBR drain: %s of %s entries posted in %.1fs",
+                         posted, len(entries), time.monotonic() - start)
+            return len(entries)
+
+    def run(self, args):
+        opts = self._parse(args)
+        dbname = config['db_name']
+        if not dbname or ',' in dbname:
+            sys.exit("fbr_drain needs exactly one database, use -d")
+        threading.current_thread().dbname = dbname
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+
+        _logger.info("FBR drain started on %s with %s workers", dbname, opts.workers)
+        registry = None
+        while not self.stop.is_set():
+            try:
+                registry = Registry(dbname).check_signaling()
+                leased = self._drain_once(registry, opts)
+            except Exception:
+                _logger.exception("FBR drain: batch failed, retrying in %ss", opts.idle)
+                leased = 0
+            if not leased:
+                if opts.once:
+                    break
+                self.stop.wait(opts.idle)
+        if registry:
+            fbr_metrics.flush(registry, force=True)
+        _logger.info("FBR drain stopped")
@@ -0,0 +1,22 @@
+import hmac
+
+from odoo import http
+from odoo.http import request
+
+from ..tools import fbr_metrics
+
+
+class FbrMetricsController(http.Controller):
+
+    @http.route('/fbr/metrics', type='http', auth='public', methods=['GET'], csrf=False, save_session=False)
+    def fbr_metrics(self, token=None, **kwargs):
+        """Prometheus scrape endpoint, enabled by setting the fbr.metrics_token parameter."""
+        expected = request.env['ir.config_parameter'].sudo().get_param('fbr.metrics_token')
+        if not expected or not token or not hmac.compare_digest(expected, token):
+            return request.not_found()
+        gauges = request.env['fbr.metrics.dashboard'].sudo()._get_metric_gauges()
+        fbr_metrics.flush(request.env.registry, force=True)
+        return request.make_response(
+            fbr_metrics.render_prometheus(fbr_metrics.read(request.env.cr), gauges),
+            headers=[('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')],
+        )
@@ -0,0 +1,7 @@
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    # Recompute product rates in resumable chunks rather than in the upgrade transaction
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['fbr.install.pipeline']._schedule(['rates'])
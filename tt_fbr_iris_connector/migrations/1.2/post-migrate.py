@@ -0,0 +1,7 @@
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    # Build the FBR status summary of the existing orders session by session
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['fbr.install.pipeline']._schedule(['status_summary'])
@@ -0,0 +1,7 @@
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    # oldest_pending_at no longer counts failed orders: rebuild the summary session by session
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['fbr.install.pipeline']._schedule(['status_summary'])
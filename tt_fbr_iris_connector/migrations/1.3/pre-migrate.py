@@ -0,0 +1,15 @@
+from odoo.tools.sql import column_exists, create_column
+
+
+def migrate(cr, version):
+    # Idempotency keys keep only the FBR invoice number of an accepted send, not the whole response
+    if not column_exists(cr, 'fbr_idempotency_key', 'response'):
+        return
+    if not column_exists(cr, 'fbr_idempotency_key', 'invoice_number'):
+        create_column(cr, 'fbr_idempotency_key', 'invoice_number', 'varchar')
+    cr.execute("""
+        UPDATE fbr_idempotency_key
+           SET invoice_number = response::jsonb ->> 'invoiceNumber'
+         WHERE state = 'posted' AND response IS NOT NULL
+    """)
+    cr.execute("ALTER TABLE fbr_idempotency_key DROP COLUMN response")
@@ -1,3 +1,4 @@
+from . import fbr_document_mixin
 from . import res_company
 from . import res_partner
 # from . import res_config_settings
@@ -8,4 +9,16 @@ from . import product_template
 from . import pos_config
 from . import account_move
 from . import account_tax
-from . import product_product
\ No newline at end of file
+from . import product_product
+from . import fbr_outbox
+from . import fbr_registration_cache
+from . import fbr_option_sync
+from . import fbr_metric
+from . import fbr_metrics_dashboard
+from . import fbr_submission
+from . import fbr_idempotency
+from . import fbr_rate_limit
+from . import fbr_circuit_breaker
+from . import fbr_cache_stamp
+from . import fbr_install
+from . import fbr_status_summary
@@ -1,23 +1,32 @@
-from odoo import models, fields, api
-import json
+from odoo import models, fields, api, Command
 import requests
 import logging
-from odoo.exceptions import UserError, ValidationError
+from odoo.exceptions import UserError
 import time
+from datetime import timedelta
+
+from ..tools import fbr_metrics, fbr_tax_engine
+from ..tools.fbr_client import FbrClient
+from ..tools.fbr_errors import FbrDeferred
+from ..tools.fbr_rate_limiter import FbrRateLimited, retry_after_of
+from .fbr_idempotency import FbrAmbiguousSubmission, ReplayedResponse
 
 _logger = logging.getLogger(__name__)
 
+# FBR tax types a line keeps when the tax assignment map is applied
+FBR_LINE_TAX_TYPES = ('sales_tax', 'extra_tax', 'further_tax', 'fed_payable')
+
 class AccountMove(models.Model):
-    _inherit = 'account.move'
+    _name = 'account.move'
+    _inherit = ['account.move', 'fbr.document.mixin']
 
     fbr_invoice_number = fields.Char(string='FBR Invoice Number', readonly=True)
     fbr_status = fields.Selection([
         ('draft', 'Draft'),
         ('posted', 'Posted to FBR'),
         ('failed', 'Failed'),
-    ], string='FBR Status', default='draft', copy=False)
+    ], string='FBR Status', default='draft', copy=False, index=True)
     fbr_error_message = fields.Text(string='FBR Error Message', readonly=True)
-    fbr_response = fields.Text(string='FBR Response', readonly=True)
 
     def _get_fbr_config(self):
         """Get FBR configuration from company settings."""
@@ -45,52 +54,35 @@ class AccountMove(models.Model):
             return product.scenario_id
         return None
 
-    def _compute_tax_amounts(self, line, base_price, quantity, discount):
-        """Compute tax amounts for included/excluded taxes and fixed taxes using account.tax."""
-        product = line.product_id
-        buyer_registration_type = self.partner_id.fbr_registration_type or 'Unregistered'
+    def _get_fbr_tax_info(self, taxes):
+        """Map each tax id to ``(fbr_tax_type, amount, amount_type)`` for the tax engine."""
+        taxes.fetch(['fbr_tax_type', 'amount', 'amount_type'])
+        return {tax.id: (tax.fbr_tax_type, tax.amount, tax.amount_type) for tax in taxes}
 
-        # Fetch taxes based on fbr_tax_type
-        taxes = line.tax_ids
-        sales_tax = taxes.filtered(lambda t: t.fbr_tax_type == 'sales_tax')
-        extra_tax = taxes.filtered(lambda t: t.fbr_tax_type == 'extra_tax')
-        further_tax = taxes.filtered(lambda t: t.fbr_tax_type == 'further_tax')
-        fed_tax = taxes.filtered(lambda t: t.fbr_tax_type == 'fed_payable')  # Assuming duty maps here
-        withholding_tax = taxes.filtered(lambda t: t.fbr_tax_type == 'withholding_tax')
-
-        # Tax rates
-        tax_rate = sales_tax.amount if sales_tax else 0.0
-        extra_tax_rate = extra_tax.amount if extra_tax else 0.0
-        further_tax_rate = further_tax.amount if further_tax and buyer_registration_type == 'Unregistered' else 0.0
-        withholding_tax_rate = withholding_tax.amount if withholding_tax else 0.0
-
-        # Base price is untaxed (as per Odoo figures)
-        base_price_excl_tax = base_price
-        value_sales_excluding_st = base_price_excl_tax * quantity * (1 - discount / 100)
-
-        # Calculate taxes (excluded case)
-        sales_tax_applicable = value_sales_excluding_st * (tax_rate / 100) if tax_rate > 0 else 0.0
-        extra_tax_applicable = value_sales_excluding_st * (extra_tax_rate / 100) if extra_tax_rate > 0 else 0.0
-        further_tax_applicable = value_sales_excluding_st * (further_tax_rate / 100) if further_tax_rate > 0 else 0.0
-        withholding_tax_applicable = value_sales_excluding_st * (withholding_tax_rate / 100) if withholding_tax_rate > 0 else 0.0
-
-        # Calculate FED/duty (assuming fixed amount for duty)
-        fed_payable = 0.0
-        if fed_tax and fed_tax.amount_type == 'fixed':
-            fed_payable = fed_tax.amount * quantity  # 45.00 Rs as fixed duty
-
-        total_values = (value_sales_excluding_st + sales_tax_applicable + extra_tax_applicable +
-                       further_tax_applicable + withholding_tax_applicable + fed_payable)
+    def _compute_fbr_document_amounts(self, lines):
+        """Compute the FBR amount columns of ``lines`` in one pass through the tax engine."""
+        buyer_registration_type = self.partner_id.fbr_registration_type or 'Unregistered'
+        tax_matrix = fbr_tax_engine.build_tax_matrix(
+            [line.tax_ids.ids for line in lines],
+            self._get_fbr_tax_info(lines.tax_ids),
+            apply_further_tax=buyer_registration_type == 'Unregistered',
+        )
+        return fbr_tax_engine.compute_document(
+            lines.mapped('price_unit'),
+            lines.mapped('quantity'),
+            [line.discount or 0.0 for line in lines],
+            tax_matrix,
+        )
 
-        return {
-            'value_sales_excluding_st': value_sales_excluding_st,
-            'sales_tax_applicable': sales_tax_applicable,
-            'extra_tax_applicable': extra_tax_applicable,
-            'further_tax_applicable': further_tax_applicable,
-            'withholding_tax_applicable': withholding_tax_applicable,
-            'fed_payable': fed_payable,  # Maps to duty
-            'total_values': total_values,
-        }
+    def _compute_tax_amounts(self, line, base_price, quantity, discount):
+        """Compute tax amounts for a single line using account.tax."""
+        tax_matrix = fbr_tax_engine.build_tax_matrix(
+            [line.tax_ids.ids],
+            self._get_fbr_tax_info(line.tax_ids),
+            apply_further_tax=(self.partner_id.fbr_registration_type or 'Unregistered') == 'Unregistered',
+        )
+        amounts, _totals = fbr_tax_engine.compute_document([base_price], [quantity], [discount], tax_matrix)
+        return {name: values[0] for name, values in amounts.items()}
 
     def _prepare_fbr_invoice_data(self):
         """Prepare invoice data for FBR API with tax verification."""
@@ -111,70 +103,55 @@ class AccountMove(models.Model):
         buyer_address = self.partner_id.fbr_address or self.partner_id.street or 'Unknown'
         buyer_registration_type = self.partner_id.fbr_registration_type or 'Unregistered'
 
+        invoice_lines = self.invoice_line_ids
+        invoice_lines.fetch(['product_id', 'price_unit', 'quantity', 'discount', 'tax_ids'])
+        templates = invoice_lines.product_id.product_tmpl_id
+        templates.fetch(['name', 'fbr_hs_code', 'fbr_uom_id', 'fbr_sro_id', 'fbr_sale_type_id', 'fbr_general_sro_item_id'])
+        amounts, totals = self._compute_fbr_document_amounts(invoice_lines)
+        Option = self.env['fbr.option']
+        rate_by_tax = {
+            tax.id: Option._resolve('rate', tax.fbr_rate_id.id)[1]
+            for tax in invoice_lines.tax_ids if tax.fbr_tax_type == 'sales_tax'
+        }
+
         lines = []
-        total_sales_tax = 0.0
-        total_extra_tax = 0.0
-        total_further_tax = 0.0
-        total_fed = 0.0
-        total_withholding_tax = 0.0
-        total_base = 0.0
-        total_calculated = 0.0
-
-        for line in self.invoice_line_ids:
+        for index, line in enumerate(invoice_lines):
             product = line.product_id
-            hs_code = product.fbr_hs_code.code if product.fbr_hs_code else ''
-            uom = product.fbr_uom_id.name or 'Pcs'
-            unit_price = line.price_unit
-            quantity = line.quantity
-            discount = line.discount or 0.0
-
-            tax_amounts = self._compute_tax_amounts(line, unit_price, quantity, discount)
-            value_sales_excluding_st = tax_amounts['value_sales_excluding_st']
-            sales_tax_applicable = tax_amounts['sales_tax_applicable']
-            extra_tax_applicable = tax_amounts['extra_tax_applicable']
-            further_tax_applicable = tax_amounts['further_tax_applicable']
-            fed_payable = tax_amounts['fed_payable']  # Duty
-            withholding_tax_applicable = tax_amounts['withholding_tax_applicable']
-            total_values = tax_amounts['total_values']
-
-            sales_tax = line.tax_ids.filtered(lambda t: t.fbr_tax_type == 'sales_tax')
-            rate_display = sales_tax.fbr_rate_id.name if sales_tax else ""
+            hs_code = Option._resolve('hscode', product.fbr_hs_code.id)[0]
+            uom = Option._resolve('uom', product.fbr_uom_id.id)[1]
+            sro = Option._resolve('sro', product.fbr_sro_id.id)[1]
+            sale_type = Option._resolve('sale_type', product.fbr_sale_type_id.id)[1]
+            sro_item = Option._resolve('sro_item_general', product.fbr_general_sro_item_id.id)[1]
+            rate_display = next((rate_by_tax[tax_id] for tax_id in line.tax_ids.ids if tax_id in rate_by_tax), "")
 
             lines.append({
-                "itemSNo": len(lines) + 1,
-                "hsCode": hs_code,
+                "itemSNo": index + 1,
+                "hsCode": hs_code or '',
                 "productDescription": product.name or 'Unknown Item',
-                "unitPrice": round(unit_price, 2),
+                "unitPrice": round(line.price_unit, 2),
                 "rate": rate_display,
-                "uoM": uom,
-                "quantity": quantity,
-                "totalValues": round(total_values, 2),
-                "valueSalesExcludingST": round(value_sales_excluding_st, 2),
-                "fixedNotifiedValueOrRetailPrice": round(value_sales_excluding_st, 2),
-                "salesTaxApplicable": round(sales_tax_applicable, 2),
-                "salesTaxWithheldAtSource": round(withholding_tax_applicable, 2),
-                "extraTax": round(extra_tax_applicable, 2),
-                "furtherTax": round(further_tax_applicable, 2),
-                "sroScheduleNo": product.fbr_sro_id.name,
-                "fedPayable": round(fed_payable, 2),  # Duty maps here
-                "discount": round(discount, 2),
-                "saleType": product.fbr_sale_type_id.name,
-                "sroItemSerialNo": product.fbr_general_sro_item_id.name or 'other'
+                "uoM": uom or 'Pcs',
+                "quantity": line.quantity,
+                "totalValues": amounts['total_values'][index],
+                "valueSalesExcludingST": amounts['value_sales_excluding_st'][index],
+                "fixedNotifiedValueOrRetailPrice": amounts['value_sales_excluding_st'][index],
+                "salesTaxApplicable": amounts['sales_tax_applicable'][index],
+                "salesTaxWithheldAtSource": amounts['withholding_tax_applicable'][index],
+                "extraTax": amounts['extra_tax_applicable'][index],
+                "furtherTax": amounts['further_tax_applicable'][index],
+                "sroScheduleNo": sro,
+                "fedPayable": amounts['fed_payable'][index],  # Duty maps here
+                "discount": round(line.discount or 0.0, 2),
+                "saleType": sale_type,
+                "sroItemSerialNo": sro_item or 'other'
             })
 
-            # Aggregate for verification
-            total_base += value_sales_excluding_st
-            total_sales_tax += sales_tax_applicable
-            total_extra_tax += extra_tax_applicable
-            total_further_tax += further_tax_applicable
-            total_fed += fed_payable
-            total_withholding_tax += withholding_tax_applicable
-            total_calculated += total_values
-
         # Verification: Check if calculated totals match Odoo totals
-        calculated_tax = total_sales_tax + total_extra_tax + total_further_tax + total_fed + total_withholding_tax
-        if round(calculated_tax, 2) != round(self.amount_tax, 2) or round(total_calculated, 2) != round(self.amount_total, 2):
-            _logger.warning("FBR tax calculation mismatch: Calculated tax %s vs Odoo %s; Total %s vs Odoo %s", calculated_tax, self.amount_tax, total_calculated, self.amount_total)
+        calculated_tax = round(
+            totals['sales_tax_applicable'] + totals['extra_tax_applicable'] + totals['further_tax_applicable']
+            + totals['fed_payable'] + totals['withholding_tax_applicable'], 2)
+        if calculated_tax != round(self.amount_tax, 2) or totals['total_values'] != round(self.amount_total, 2):
+            _logger.warning("FBR tax calculation mismatch: Calculated tax %s vs Odoo %s; Total %s vs Odoo %s", calculated_tax, self.amount_tax, totals['total_values'], self.amount_total)
 
         payload = {
             "invoiceType": "Sale Invoice",
@@ -191,7 +168,7 @@ class AccountMove(models.Model):
             "buyerRegistrationType": buyer_registration_type,
             "paymentMode": self.invoice_payment_term_id.name or 'Cash',
             "totalInvoiceAmount": round(self.amount_total, 2),  # 211.40 Rs
-            "totalSalesTax": round(total_sales_tax, 2),  # 24.41 Rs
+            "totalSalesTax": totals['sales_tax_applicable'],  # 24.41 Rs
             "posServerFee": 0.0,
             "items": lines
         }
@@ -199,100 +176,199 @@ class AccountMove(models.Model):
         if scenario_id:
             payload["scenarioId"] = scenario_id
 
-        # Log payload without sensitive information
-        safe_payload = payload.copy()
-        safe_payload['sellerNTNCNIC'] = '****'
-        safe_payload['buyerNTNCNIC'] = '****'
-        _logger.info("FBR Invoice Payload: %s", json.dumps(safe_payload, indent=2))
+        if _logger.isEnabledFor(logging.DEBUG):
+            # Log payload without sensitive information
+            safe_payload = dict(payload, sellerNTNCNIC='****', buyerNTNCNIC='****')
+            self.env['fbr.submission']._log_payload("FBR Invoice Payload", safe_payload)
         return payload
 
 
+    def _fbr_tax_assignment_key(self):
+        """(company id, POS config id or False, buyer registration type) of the tax assignment map."""
+        self.ensure_one()
+        return (
+            self.company_id.id,
+            self.pos_order_ids[:1].config_id.id or False,
+            self.partner_id.fbr_registration_type or 'Unregistered',
+        )
+
     def _update_invoice_lines_with_taxes(self):
-        """Update invoice lines to include applicable taxes."""
+        """Keep the FBR taxes of each line and add the assigned ones, in a single write."""
         self.ensure_one()
+        assigned = self.env['account.tax']._fbr_tax_assignment(*self._fbr_tax_assignment_key())
+        lines = self.invoice_line_ids
+        lines.fetch(['tax_ids'])
+        lines.tax_ids.fetch(['fbr_tax_type'])
         tax_lines = []
-        fed_applicable_sales_types = self.env['ir.config_parameter'].sudo().get_param('fbr.fed_applicable_sales_types', default=[
-            'Petroleum Products', 'Telecommunication services', 'Cigarettes', 'Beverages'
-        ])
-        for line in self.invoice_line_ids:
-            product = line.product_id
-            taxes = []
-            # Keep existing taxes that are already in the line
-            existing_taxes = line.tax_ids.filtered(lambda t: t.fbr_tax_type in ['sales_tax', 'extra_tax', 'further_tax', 'fed_payable'])
-            taxes.extend(existing_taxes.ids)
-            # Add further tax only for unregistered buyers if not already present
-            if (self.partner_id.fbr_registration_type or 'Unregistered') == 'Unregistered':
-                further_tax = self.env['account.tax'].search([('fbr_tax_type', '=', 'further_tax')], limit=1)
-                if further_tax and further_tax.id not in taxes:
-                    taxes.append(further_tax.id)
-            if taxes:
-                tax_lines.append((1, line.id, {'tax_ids': [(6, 0, taxes)]}))
-                _logger.info("Updated taxes for product %s: %s", product.name, taxes)
+        for line in lines:
+            taxes = line.tax_ids.filtered(lambda t: t.fbr_tax_type in FBR_LINE_TAX_TYPES).ids
+            taxes += [tax_id for tax_id in assigned if tax_id not in taxes]
+            if taxes and set(taxes) != set(line.tax_ids.ids):
+                tax_lines.append(Command.update(line.id, {'tax_ids': [Command.set(taxes)]}))
 
         if tax_lines:
             self.write({'invoice_line_ids': tax_lines})
+            _logger.info("Updated FBR taxes of %s lines of %s", len(tax_lines), self.name)
+
+    def _fbr_post_document(self):
+        """Single attempt used by the retry sweeper, which owns the backoff."""
+        self.ensure_one()
+        self.action_post_to_fbr(max_retries=0)
 
     def send_to_fbr(self):
         """Public method to send invoice to FBR."""
         self.ensure_one()
-        with self.env.cr.savepoint():
-            self._update_invoice_lines_with_taxes()
-            return self.action_post_to_fbr()
+        try:
+            with self.env.cr.savepoint():
+                self._update_invoice_lines_with_taxes()
+                return self.action_post_to_fbr()
+        except FbrDeferred as e:
+            raise UserError(str(e))
 
     def action_post_to_fbr(self, max_retries=2):
-        """Post the invoice to FBR API with exponential backoff."""
+        """Post the invoice to FBR API, retrying transient failures within the rate limit.
+
+        Never sleeps: an open circuit breaker, an exhausted rate limit or a
+        429 raise FbrDeferred so the caller can reschedule instead of
+        holding the worker.
+        """
         self.ensure_one()
         fbr_config = self._get_fbr_config()
         payload = self._prepare_fbr_invoice_data()
-        headers = {
-            "Authorization": fbr_config['token'],
-            "Content-Type": "application/json"
-        }
-        _logger.info("FBR API Request - URL: %s, Headers: %s", fbr_config['server_url'], headers)
-
-        for attempt in range(max_retries + 1):
-            try:
-                response = requests.post(fbr_config['server_url'], json=payload, headers=headers, timeout=10)
-                _logger.info("FBR Raw Response: %s", response.text)
-                response_data = response.json() if response.text else {'Message': 'No response data'}
-
-                if response.status_code == 200 and response_data.get('validationResponse', {}).get('statusCode') == '00':
-                    self.write({
-                        'fbr_invoice_number': response_data.get('invoiceNumber', ''),
-                        'fbr_status': 'posted',
-                        'fbr_error_message': '',
-                        'fbr_response': json.dumps(response_data, indent=2)
-                    })
-                    return response_data
-                elif response.status_code == 429:
-                    retry_after = int(response.headers.get('Retry-After', 2 ** attempt))
-                    _logger.warning("Rate limit hit. Retrying after %d seconds...", retry_after)
-                    time.sleep(retry_after)
-                    continue
-                else:
-                    error_message = response_data.get('Message') or response_data.get('validationResponse', {}).get('message', 'Unknown Error')
+        client = FbrClient.from_env(self.env, fbr_config['token'])
+        Submission = self.env['fbr.submission']
+        IdempotencyKey = self.env['fbr.idempotency.key'].sudo()
+        submissions = []
+        _logger.debug("FBR API Request - URL: %s", fbr_config['server_url'])
+
+        try:
+            for attempt in range(max_retries + 1):
+                started_at = fields.Datetime.now()
+                start = time.monotonic()
+                try:
+                    response = IdempotencyKey._send(self, client, fbr_config['server_url'], payload)
+                    response_data = response.json() if response.text else {'Message': 'No response data'}
+                except FbrAmbiguousSubmission as e:
+                    # FBR may hold this invoice already: never resend it from here
+                    if e.sent:
+                        submissions.append(Submission._prepare_vals(
+                            self, fbr_config['server_url'], payload, attempt + 1, started_at,
+                            time.monotonic() - start, error=str(e)))
+                    self._fbr_mark_ambiguous(str(e))
+                    raise
+                except requests.exceptions.RequestException as e:
+                    error_message = f"Request error (Attempt {attempt + 1}/{max_retries + 1}): {str(e)}"
+                    submissions.append(Submission._prepare_vals(
+                        self, fbr_config['server_url'], payload, attempt + 1, started_at,
+                        time.monotonic() - start, error=error_message))
                     if attempt < max_retries:
-                        _logger.warning("FBR post attempt %d failed: %s. Retrying after %d seconds...", attempt + 1, error_message, 2 ** attempt)
-                        time.sleep(2 ** attempt)
+                        _logger.warning(error_message + ". Retrying...")
+                        fbr_metrics.count_retry('account.move')
                         continue
                     self.write({
                         'fbr_status': 'failed',
                         'fbr_error_message': error_message,
-                        'fbr_response': json.dumps(response_data, indent=2)
                     })
-                    raise UserError(f"FBR posting failed after {max_retries + 1} attempts: {error_message}")
-            except requests.exceptions.RequestException as e:
-                error_message = f"Request error (Attempt {attempt + 1}/{max_retries + 1}): {str(e)}"
+                    raise UserError(error_message)
+
+                Submission._log_payload("FBR Raw Response", response.text)
+                fbr_metrics.count_fbr_status(response_data.get('validationResponse', {}).get('statusCode'))
+                accepted = self._fbr_is_accepted(response, response_data)
+                error_message = '' if accepted else self._fbr_error_of(response_data)
+                if not isinstance(response, ReplayedResponse):
+                    submissions.append(Submission._prepare_vals(
+                        self, fbr_config['server_url'], payload, attempt + 1, started_at, time.monotonic() - start,
+                        response=response, response_data=response_data, error=error_message))
+                if accepted:
+                    self._fbr_mark_posted(response_data)
+                    return response_data
+                elif response.status_code == 429:
+                    # The shared limiter has learned the delay; let the caller reschedule
+                    raise FbrRateLimited(retry_after_of(response))
                 if attempt < max_retries:
-                    _logger.warning(error_message + ". Retrying after %d seconds...", 2 ** attempt)
-                    time.sleep(2 ** attempt)
+                    _logger.warning("FBR post attempt %d failed: %s. Retrying...", attempt + 1, error_message)
+                    fbr_metrics.count_retry('account.move')
                     continue
                 self.write({
                     'fbr_status': 'failed',
                     'fbr_error_message': error_message,
-                    'fbr_response': ''
                 })
-                raise UserError(error_message)
+                raise UserError(f"FBR posting failed after {max_retries + 1} attempts: {error_message}")
+        finally:
+            Submission._record(submissions)
+
+    def _prefetch_fbr_data(self):
+        """Load what _prepare_fbr_invoice_data reads for every move of ``self`` in a fixed number of queries."""
+        self.fetch(['name', 'invoice_date', 'amount_total', 'amount_tax', 'company_id', 'partner_id',
+                    'invoice_payment_term_id'])
+        self.company_id.fetch(['name', 'enable_fbr_integration', 'fbr_token_url', 'fbr_bearer_token',
+                               'seller_province', 'seller_address', 'seller_business_name', 'seller_ntn_cnic'])
+        self.partner_id.fetch(['name', 'ntn', 'region', 'fbr_address', 'street', 'fbr_registration_type'])
+        self.invoice_payment_term_id.fetch(['name'])
+        self.pos_order_ids.fetch(['config_id'])
+        lines = self.invoice_line_ids
+        lines.fetch(['move_id', 'product_id', 'price_unit', 'quantity', 'discount', 'tax_ids'])
+        lines.tax_ids.fetch(['fbr_tax_type', 'amount', 'amount_type', 'fbr_rate_id'])
+        lines.product_id.product_tmpl_id.fetch([
+            'name', 'scenario_id', 'fbr_hs_code', 'fbr_uom_id', 'fbr_sro_id', 'fbr_sale_type_id',
+            'fbr_general_sro_item_id',
+        ])
+
+    def _fbr_prepare_bulk_jobs(self):
+        self._prefetch_fbr_data()
+        jobs, errors = {}, {}
+        for move in self:
+            try:
+                with self.env.cr.savepoint():
+                    fbr_config = move._get_fbr_config()
+                    move._update_invoice_lines_with_taxes()
+                    jobs[move.id] = (fbr_config, move._prepare_fbr_invoice_data())
+            except Exception as e:
+                # Bad data on one move, whatever the error, must not abort the batch and its outbox lease
+                _logger.warning("FBR payload of %s could not be built: %s", move.name, e)
+                errors[move.id] = str(e) or type(e).__name__
+        return jobs, errors
+
+    def post_to_fbr_bulk(self, max_workers=None):
+        """Post many invoices to FBR concurrently and return a summary per invoice.
+
+        See ``fbr.document.mixin._fbr_post_bulk``; failed invoices are left
+        to the retry sweeper rather than retried in-request, and deferred
+        ones are queued in the outbox for when the gateway accepts them.
+        """
+        # Bulk runs draw on the background budget but never wait for it in a request worker
+        results = self.with_context(fbr_traffic='background', fbr_rate_wait=0)._fbr_post_bulk(max_workers)
+        deferred = {move_id: result['retry_after'] for move_id, result in results.items()
+                    if result['status'] == 'deferred'}
+        for entry in self.env['fbr.outbox']._enqueue(self.browse(list(deferred))):
+            entry.next_attempt_at = fields.Datetime.now() + timedelta(seconds=deferred[entry.res_id])
+        return results
+
+    def action_post_to_fbr_bulk(self):
+        """List view server action: bulk post and report the outcome in a notification."""
+        results = self.post_to_fbr_bulk()
+        failed = self.browse([move_id for move_id, result in results.items() if result['status'] == 'failed'])
+        posted = sum(result['status'] == 'posted' for result in results.values())
+        skipped = sum(result['status'] == 'skipped' for result in results.values())
+        deferred = sum(result['status'] == 'deferred' for result in results.values())
+        message = "%s posted, %s failed, %s already posted." % (posted, len(failed), skipped)
+        if deferred:
+            message += " %s queued while FBR throttles or is unavailable." % deferred
+        if failed:
+            message += "\n" + "\n".join(
+                "%s: %s" % (move.name, results[move.id]['error']) for move in failed[:10]
+            )
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': "FBR Bulk Posting",
+                'message': message,
+                'type': 'danger' if failed else 'success',
+                'sticky': bool(failed),
+                'next': {'type': 'ir.actions.act_window_close'},
+            },
+        }
 
     # def action_post(self):
     #     """Override the default post action to include FBR posting."""
@@ -1,4 +1,12 @@
-from odoo import models, fields
+from odoo import models, fields, api
+from odoo.tools import SQL, ormcache
+
+from ..tools import fbr_cache_stamp
+
+# Tax fields feeding ProductTemplate._compute_fbr_rate_id
+FBR_RATE_FIELDS = {'fbr_tax_type', 'fbr_rate_id', 'sequence', 'active'}
+# Tax fields feeding the cached _fbr_tax_assignment map
+FBR_ASSIGNMENT_FIELDS = {'fbr_tax_type', 'sequence', 'active', 'company_id'}
 
 class AccountTax(models.Model):
     _inherit = 'account.tax'
@@ -11,4 +19,73 @@ class AccountTax(models.Model):
         ('withholding_tax', 'Withholding Tax'),  # Added withholding tax option
     ], string="FBR Tax Type")
     
-    fbr_rate_id = fields.Many2one("fbr.option", string="FBR Rate", ondelete="set null", domain=[("type", "=", "rate")])
\ No newline at end of file
+    fbr_rate_id = fields.Many2one("fbr.option", string="FBR Rate", ondelete="set null", domain=[("type", "=", "rate")])
+
+    @api.model
+    def _load_pos_data_fields(self, config_id):
+        fields_list = super()._load_pos_data_fields(config_id)
+        return fields_list + ['fbr_tax_type'] if fields_list else fields_list
+
+    @api.model
+    def _fbr_tax_assignment(self, company_id, config_id, registration_type):
+        """Ids of the taxes FBR requires on every line sold to a buyer of ``registration_type``.
+
+        The taxes set on the POS config for the registration type win;
+        otherwise unregistered buyers get the first further tax of the
+        company. Cached per worker under the stamp bumped when taxes or
+        configs change in a way that affects it.
+        """
+        stamp = fbr_cache_stamp.get(self.env, fbr_cache_stamp.TAX_ASSIGNMENT)
+        return self._fbr_tax_assignment_cached(stamp, company_id, config_id, registration_type)
+
+    @api.model
+    @ormcache('stamp', 'company_id', 'config_id', 'registration_type')
+    def _fbr_tax_assignment_cached(self, stamp, company_id, config_id, registration_type):
+        if config_id:
+            config = self.env['pos.config'].sudo().browse(config_id)
+            taxes = config.fbr_taxes_registered if registration_type == 'Registered' else config.fbr_taxes_unregistered
+            if taxes:
+                return tuple(taxes.ids)
+        if registration_type == 'Registered':
+            return ()
+        further_tax = self.sudo().search([
+            ('fbr_tax_type', '=', 'further_tax'), ('company_id', 'parent_of', company_id),
+        ], limit=1)
+        return tuple(further_tax.ids)
+
+    def _fbr_in_tax_assignment(self):
+        """Whether any of these taxes may be part of a cached tax assignment."""
+        if any(tax.fbr_tax_type == 'further_tax' for tax in self):
+            return True
+        return bool(self.env['pos.config'].sudo().with_context(active_test=False).search_count([
+            '|', ('fbr_taxes_registered', 'in', self.ids), ('fbr_taxes_unregistered', 'in', self.ids),
+        ], limit=1))
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        taxes = super().create(vals_list)
+        # A new tax is not on any config yet: only a further tax can be assigned
+        if any(vals.get('fbr_tax_type') == 'further_tax' for vals in vals_list):
+            fbr_cache_stamp.bump(self.env, [fbr_cache_stamp.TAX_ASSIGNMENT])
+        return taxes
+
+    def write(self, vals):
+        affects_assignment = FBR_ASSIGNMENT_FIELDS.intersection(vals) and (
+            vals.get('fbr_tax_type') == 'further_tax' or self._fbr_in_tax_assignment())
+        res = super().write(vals)
+        if FBR_RATE_FIELDS.intersection(vals):
+            self.env['product.template']._fbr_update_rate_ids_for_taxes(self.ids)
+        if affects_assignment:
+            fbr_cache_stamp.bump(self.env, [fbr_cache_stamp.TAX_ASSIGNMENT])
+        return res
+
+    def unlink(self):
+        affects_assignment = self._fbr_in_tax_assignment()
+        self.env.cr.execute("SELECT DISTINCT prod_id FROM product_taxes_rel WHERE tax_id = ANY(%s)", [self.ids])
+        template_ids = [row[0] for row in self.env.cr.fetchall()]
+        res = super().unlink()
+        if template_ids:
+            self.env['product.template']._fbr_update_rate_ids(SQL("chunk.id = ANY(%s)", template_ids))
+        if affects_assignment:
+            fbr_cache_stamp.bump(self.env, [fbr_cache_stamp.TAX_ASSIGNMENT])
+        return res
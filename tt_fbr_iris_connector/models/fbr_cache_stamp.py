@@ -0,0 +1,19 @@
+from odoo import models, fields
+
+
+class FbrCacheStamp(models.Model):
+    _name = 'fbr.cache.stamp'
+    _description = 'FBR Cache Version Stamp'
+    _log_access = False
+    _rec_name = 'scope'
+
+    # Maintained by tools/fbr_cache_stamp.py in raw SQL, shared by all workers
+    scope = fields.Char(string='Scope', required=True, readonly=True)
+    stamp = fields.Integer(string='Stamp', readonly=True)
+
+    _sql_constraints = [
+        ('scope_unique', 'unique(scope)', 'One stamp per cache scope.'),
+    ]
+
+    def init(self):
+        self.env.cr.execute("CREATE SEQUENCE IF NOT EXISTS fbr_cache_stamp_seq")
@@ -0,0 +1,103 @@
+from odoo import models, fields, api
+import logging
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import psycopg2
+import requests
+
+from ..tools import fbr_circuit_breaker
+from ..tools.fbr_client import FbrClient
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_PROBE_PATH = "/pdi/v1/provinces"
+
+
+class FbrCircuitBreaker(models.Model):
+    _name = 'fbr.circuit.breaker'
+    _description = 'FBR Gateway Circuit Breaker'
+    _log_access = False
+    _rec_name = 'host'
+
+    # Maintained by tools/fbr_circuit_breaker.py in raw SQL, shared by all workers
+    host = fields.Char(string='Host', required=True, readonly=True)
+    state = fields.Selection([
+        ('closed', 'Closed'),
+        ('open', 'Open'),
+    ], string='State', required=True, default='closed', readonly=True)
+    consecutive_failures = fields.Integer(string='Consecutive Failures', readonly=True)
+    trip_count = fields.Integer(string='Times Opened', readonly=True)
+    opened_at = fields.Datetime(string='Opened At', readonly=True)
+    open_until = fields.Datetime(string='Open Until', readonly=True)
+    half_open_until = fields.Datetime(string='Trial Call Until', readonly=True,
+                                      help='Set while the single trial call after open_until is in progress.')
+    last_failure_at = fields.Datetime(string='Last Failure', readonly=True)
+    last_error = fields.Text(string='Last Error', readonly=True)
+    last_probe_at = fields.Datetime(string='Last Probe', readonly=True)
+    last_probe_ok = fields.Boolean(string='Last Probe Succeeded', readonly=True)
+
+    _sql_constraints = [
+        ('host_unique', 'unique(host)', 'One circuit breaker per gateway host.'),
+    ]
+
+    def _get_probe_client(self):
+        """Client with the first configured company token; probes bypass the breaker."""
+        company = self.env['res.company'].sudo().search([('fbr_bearer_token', '!=', False)], limit=1)
+        if not company:
+            return None
+        return FbrClient.from_env(self.env, company.fbr_bearer_token)
+
+    def _get_probe_url(self):
+        """Probe endpoint on the host of this breaker; fbr.breaker_probe_url only contributes its path."""
+        self.ensure_one()
+        configured = self.env['ir.config_parameter'].sudo().get_param('fbr.breaker_probe_url') or ''
+        return "https://%s%s" % (self.host, urlsplit(configured).path or DEFAULT_PROBE_PATH)
+
+    def _probe(self, client):
+        """Call the lightweight probe endpoint and record the outcome like any other request.
+
+        The probe outcome is written in a transaction of its own, like the
+        breaker state updated by the client during the call: writing the
+        same row from this transaction would conflict with that update.
+        """
+        self.ensure_one()
+        try:
+            ok = client.get(self._get_probe_url(), probe=True).status_code < 500
+        except requests.exceptions.RequestException as e:
+            _logger.info("FBR probe of %s failed: %s", self.host, e)
+            ok = False
+        try:
+            with self.env.registry.cursor() as cr:
+                cr.execute("""
+                    UPDATE fbr_circuit_breaker SET last_probe_at = %s, last_probe_ok = %s WHERE id = %s
+                """, [datetime.utcnow(), ok, self.id])
+        except psycopg2.Error as e:
+            _logger.warning("Could not record the FBR probe of %s: %s", self.host, e)
+        self.invalidate_recordset(['last_probe_at', 'last_probe_ok'])
+        return ok
+
+    @api.model
+    def _cron_probe(self):
+        """Probe every open breaker so the gateway is used again as soon as it is back."""
+        breakers = self.search([('state', '=', 'open')])
+        if not breakers:
+            return
+        client = self._get_probe_client()
+        if not client:
+            return
+        for breaker in breakers:
+            breaker._probe(client)
+        fbr_circuit_breaker.forget(self.env.registry)
+
+    def action_probe(self):
+        client = self._get_probe_client()
+        for breaker in self:
+            if client:
+                breaker._probe(client)
+        fbr_circuit_breaker.forget(self.env.registry)
+
+    def action_close(self):
+        self.write({'state': 'closed', 'consecutive_failures': 0, 'open_until': False, 'half_open_until': False})
+        self.env.flush_all()
+        fbr_circuit_breaker.forget(self.env.registry)
@@ -0,0 +1,378 @@
+from odoo import models, fields, api
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+import threading
+import time
+import logging
+
+import psycopg2
+import requests
+
+from ..tools import fbr_metrics
+from ..tools.fbr_client import DEFAULT_READ_TIMEOUT, FbrClient, is_ambiguous_error
+from ..tools.fbr_errors import FbrDeferred
+from ..tools.fbr_rate_limiter import retry_after_of
+from .fbr_idempotency import FbrAmbiguousSubmission, FbrSubmissionInProgress, ReplayedResponse, mark_sending
+
+_logger = logging.getLogger(__name__)
+
+# Methods every model inheriting the mixin must implement
+FBR_DOCUMENT_HOOKS = ('_fbr_post_document', '_fbr_prepare_bulk_jobs')
+
+
+class FbrDocumentMixin(models.AbstractModel):
+    _name = 'fbr.document.mixin'
+    _description = 'FBR Document Retry Mixin'
+
+    fbr_attempt_count = fields.Integer(string='FBR Attempts', default=0, copy=False, readonly=True)
+    fbr_next_retry_at = fields.Datetime(string='FBR Next Retry', copy=False, readonly=True, index=True)
+    fbr_needs_reconciliation = fields.Boolean(
+        string='FBR Needs Reconciliation', copy=False, readonly=True,
+        help='A send may have reached FBR without an answer. It is not sent again until the gateway lookup '
+             'or an operator confirms FBR did not receive it.')
+    fbr_response = fields.Text(string='FBR Response', compute='_compute_fbr_response')
+    fbr_submission_ids = fields.One2many('fbr.submission', 'res_id', string='FBR Submissions',
+                                         domain=lambda self: [('res_model', '=', self._name)])
+    fbr_outbox_ids = fields.One2many('fbr.outbox', 'res_id', string='FBR Outbox Entries',
+                                     domain=lambda self: [('res_model', '=', self._name)])
+
+    def _register_hook(self):
+        """Refuse to load a model that inherits the mixin without implementing its hooks."""
+        super()._register_hook()
+        if self._abstract:
+            return
+        missing = [name for name in FBR_DOCUMENT_HOOKS
+                   if getattr(type(self), name) is getattr(FbrDocumentMixin, name)]
+        if missing:
+            raise TypeError("%s inherits fbr.document.mixin but does not implement %s"
+                            % (self._name, ', '.join(missing)))
+
+    def _compute_fbr_response(self):
+        responses = self.env['fbr.submission'].sudo()._latest_responses(self._name, self.ids)
+        for record in self:
+            record.fbr_response = responses.get(record.id, '')
+
+    def _fbr_post_document(self):
+        """Post the single document ``self`` to FBR once, without in-request retries.
+
+        Called by the outbox and the retry sweeper, which own the backoff.
+        On success the document is marked posted. Raises FbrDeferred when
+        posting must wait (rate limit, open circuit, deadline),
+        FbrSubmissionInProgress when another worker is posting it, and any
+        other exception for a failed attempt, after marking it failed.
+        Must be implemented by every inheriting model.
+        """
+        raise NotImplementedError()
+
+    def _fbr_prepare_bulk_jobs(self):
+        """Build what every document of ``self`` needs to be posted.
+
+        Returns ``(jobs, errors)``: ``jobs`` maps a record id to its
+        ``(fbr_config, payload)``, ``errors`` maps the id of each document
+        that cannot be posted to the reason. Must not raise for a bad
+        document, and must leave out documents that are not to be posted
+        at all. Must be implemented by every inheriting model.
+        """
+        raise NotImplementedError()
+
+    def _fbr_notify_status(self):
+        """Tell whoever waits for these documents that their FBR status changed."""
+
+    @staticmethod
+    def _fbr_is_accepted(response, response_data):
+        return response.status_code == 200 and response_data.get('validationResponse', {}).get('statusCode') == '00'
+
+    @staticmethod
+    def _fbr_error_of(response_data):
+        return response_data.get('Message') or response_data.get('validationResponse', {}).get('message', 'Unknown Error')
+
+    def _fbr_mark_posted(self, response_data):
+        self.write({
+            'fbr_invoice_number': response_data.get('invoiceNumber', ''),
+            'fbr_status': 'posted',
+            'fbr_error_message': '',
+            'fbr_needs_reconciliation': False,
+        })
+
+    def _fbr_mark_ambiguous(self, error_message):
+        """Flag documents whose send may have been accepted; they stay failed until reconciled."""
+        self.write({
+            'fbr_status': 'failed',
+            'fbr_error_message': error_message,
+            'fbr_needs_reconciliation': True,
+        })
+
+    def _fbr_sweep_domain(self):
+        """Domain of documents the retry sweeper should pick up."""
+        now = fields.Datetime.now()
+        domain = [
+            ('fbr_status', '=', 'failed'),
+            '|', ('fbr_next_retry_at', '=', False), ('fbr_next_retry_at', '<=', now),
+        ]
+        if not self.env['fbr.idempotency.key'].sudo()._get_lookup_url():
+            # Without a lookup, only an operator can settle an ambiguous send
+            domain.append(('fbr_needs_reconciliation', '=', False))
+        return domain
+
+    def action_fbr_resend_not_received(self):
+        """Operator confirmed FBR never received the ambiguous sends: allow them again and queue the documents."""
+        flagged = self.filtered('fbr_needs_reconciliation')
+        if not flagged:
+            return
+        self.env['fbr.idempotency.key'].sudo()._mark_not_received(flagged)
+        flagged.write({'fbr_needs_reconciliation': False, 'fbr_attempt_count': 0, 'fbr_next_retry_at': False})
+        self.env['fbr.outbox']._enqueue(flagged)
+
+    def _fbr_mark_failed(self, error_message):
+        self.write({
+            'fbr_status': 'failed',
+            'fbr_error_message': error_message,
+        })
+
+    def _fbr_defer(self, seconds):
+        """Keep the sweeper off these records for ``seconds``, e.g. while FBR rate limits us."""
+        self.write({'fbr_next_retry_at': fields.Datetime.now() + timedelta(seconds=seconds)})
+
+    def _fbr_schedule_retry(self):
+        """Push the next sweep of each record back exponentially, capped by fbr.sweep_max_backoff."""
+        ICP = self.env['ir.config_parameter'].sudo()
+        base = int(ICP.get_param('fbr.sweep_base_backoff', 60))
+        cap = int(ICP.get_param('fbr.sweep_max_backoff', 6 * 3600))
+        now = fields.Datetime.now()
+        for record in self:
+            attempts = record.fbr_attempt_count + 1
+            record.write({
+                'fbr_attempt_count': attempts,
+                'fbr_next_retry_at': now + timedelta(seconds=min(base * 2 ** (attempts - 1), cap)),
+            })
+
+    def _fbr_sweep_one(self, record_id):
+        """Post one document in its own cursor; runs in a sweeper worker thread."""
+        with self.env.registry.cursor() as cr:
+            env = self.env(cr=cr)
+            record = env[self._name].browse(record_id).exists()
+            if not record:
+                return False
+            fbr_metrics.count_retry('sweep')
+            try:
+                with cr.savepoint():
+                    record._fbr_post_document()
+            except FbrSubmissionInProgress:
+                return False
+            except FbrAmbiguousSubmission as e:
+                record._fbr_mark_ambiguous(str(e))
+                record._fbr_schedule_retry()
+                return False
+            except FbrDeferred as e:
+                record._fbr_defer(e.retry_after)
+                return False
+            except Exception as e:
+                _logger.warning("FBR retry of %s failed: %s", record.display_name, e)
+                record._fbr_mark_failed(str(e))
+                record._fbr_schedule_retry()
+                return False
+            record.write({'fbr_attempt_count': 0, 'fbr_next_retry_at': False})
+            return True
+
+    @api.model
+    def _cron_fbr_retry_sweep(self, batch_size=None, max_workers=None, time_budget=None):
+        """Re-post failed and overdue documents concurrently within a time budget.
+
+        Each worker posts in its own transaction, so one slow or failing
+        document never holds back the rest of the batch. A post is only
+        started while a full read timeout is left in the budget, and the
+        ``fbr_deadline`` context key keeps any post from starting past its
+        end.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        batch_size = batch_size or int(ICP.get_param('fbr.sweep_batch_size', 100))
+        max_workers = max_workers or int(ICP.get_param('fbr.sweep_max_workers', 8))
+        time_budget = time_budget or int(ICP.get_param('fbr.sweep_time_budget', 240))
+        read_timeout = float(ICP.get_param('fbr.http_read_timeout', DEFAULT_READ_TIMEOUT))
+        testing = getattr(threading.current_thread(), 'testing', False)
+
+        deadline = time.monotonic() + time_budget
+        last_start = deadline - min(read_timeout, time_budget / 2)
+        sweeper = self.with_context(fbr_traffic='background',
+                                    fbr_rate_wait=float(ICP.get_param('fbr.rate_limit_max_wait', 5)),
+                                    fbr_deadline=deadline)
+        seen = set()
+        posted = attempted = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while time.monotonic() < last_start:
+                domain = self._fbr_sweep_domain()
+                if seen:
+                    domain += [('id', 'not in', list(seen))]
+                ids = self.search(domain, order='fbr_next_retry_at, id', limit=batch_size).ids
+                if not ids:
+                    break
+                seen.update(ids)
+                results = []
+                if testing:
+                    for record_id in ids:
+                        if time.monotonic() >= last_start:
+                            break
+                        results.append(sweeper._fbr_sweep_one(record_id))
+                else:
+                    todo = list(reversed(ids))
+                    running = set()
+                    while todo or running:
+                        while todo and len(running) < max_workers and time.monotonic() < last_start:
+                            running.add(executor.submit(sweeper._fbr_sweep_one, todo.pop()))
+                        if not running:
+                            break
+                        done, running = wait(running, return_when=FIRST_COMPLETED)
+                        results += [future.result() if not future.exception() else False for future in done]
+                posted += results.count(True)
+                attempted += len(results)
+        if seen:
+            _logger.info("FBR retry sweep on %s: %s posted, %s failed", self._name, posted, attempted - posted)
+        return {'posted': posted, 'failed': attempted - posted}
+
+    @staticmethod
+    def _fbr_bulk_send(registry, key, client, url, payload):
+        """Post one payload; runs in a bulk worker thread and never touches the ORM."""
+        started_at = fields.Datetime.now()
+        start = time.monotonic()
+        try:
+            mark_sending(registry, [key])
+            response = client.post(url, payload)
+            response_data = response.json() if response.text else {'Message': 'No response data'}
+            return response, response_data, None, started_at, time.monotonic() - start
+        except (requests.exceptions.RequestException, ValueError, FbrDeferred, psycopg2.Error) as e:
+            # psycopg2.Error: the sending marker could not be written, nothing was sent
+            return None, None, e, started_at, time.monotonic() - start
+
+    def _fbr_post_bulk(self, max_workers=None):
+        """Post many documents to FBR concurrently and return a summary per document.
+
+        Payloads are built on the current cursor, then only the HTTP calls
+        fan out to ``fbr.bulk_max_workers`` threads. Each document is
+        updated in its own savepoint so one bad document fails alone.
+        Documents that must wait carry the delay in ``retry_after``: those
+        throttled or stopped by an open circuit are ``deferred`` and keep
+        their FBR status, like in the single-document path, and those
+        posted by someone else right now are ``skipped``.
+
+        Documents whose send may have been accepted without an answer are
+        flagged for reconciliation and carry ``ambiguous``; they are never
+        resent blindly.
+
+        :return: ``{record_id: {'status': 'posted'|'failed'|'deferred'|'skipped', 'invoice_number', 'error'[, 'retry_after'][, 'ambiguous']}}``
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        max_workers = max_workers or int(ICP.get_param('fbr.bulk_max_workers', 8))
+        testing = getattr(threading.current_thread(), 'testing', False)
+        results = {}
+
+        to_send = self.filtered(lambda m: m.fbr_status != 'posted')
+        for record in self - to_send:
+            results[record.id] = {'status': 'skipped', 'invoice_number': record.fbr_invoice_number, 'error': ''}
+
+        prepared, errors = to_send._fbr_prepare_bulk_jobs()
+        for record_id, error in errors.items():
+            self.browse(record_id)._fbr_mark_failed(error)
+            results[record_id] = {'status': 'failed', 'invoice_number': '', 'error': error}
+        jobs = {}
+        clients = {}
+        for record_id, (fbr_config, payload) in prepared.items():
+            token = fbr_config['token']
+            if token not in clients:
+                clients[token] = FbrClient.from_env(self.env, token)
+            jobs[record_id] = (clients[token], fbr_config['server_url'], payload)
+
+        # Claim every invoiceRefNo up front so concurrent posts of the same invoice collapse
+        IdempotencyKey = self.env['fbr.idempotency.key'].sudo()
+        keys = {record_id: IdempotencyKey._key_of(job[2]) for record_id, job in jobs.items()}
+        decisions = IdempotencyKey._acquire({keys[record_id]: self.browse(record_id) for record_id in jobs})
+        outcomes = {}
+        reconciled = {}
+        for record_id, job in list(jobs.items()):
+            decision, response_data = decisions[keys[record_id]]
+            if decision == 'reconcile':
+                response_data = IdempotencyKey._reconcile(job[0], job[2])
+                if response_data:
+                    reconciled[keys[record_id]] = ('posted', response_data)
+                    decision = 'done'
+                elif response_data is None:
+                    reconciled[keys[record_id]] = ('ambiguous', None)
+                    error = "An earlier send of %s may have reached FBR; it is not sent again until reconciled." % (
+                        job[2]['invoiceRefNo'])
+                    self.browse(record_id)._fbr_mark_ambiguous(error)
+                    results[record_id] = {'status': 'failed', 'invoice_number': '', 'error': error, 'ambiguous': True}
+                    del jobs[record_id]
+                    continue
+            if decision == 'done':
+                outcomes[record_id] = (ReplayedResponse(response_data), response_data, None, fields.Datetime.now(), 0.0)
+                del jobs[record_id]
+            elif decision == 'busy':
+                results[record_id] = {'status': 'skipped', 'invoice_number': '', 'error': "Already being posted to FBR",
+                                      'retry_after': 60}
+                del jobs[record_id]
+        IdempotencyKey._release(reconciled)
+
+        sent = {}
+        if testing:
+            sent = {record_id: self._fbr_bulk_send(self.env.registry, keys[record_id], *job)
+                    for record_id, job in jobs.items()}
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {record_id: executor.submit(self._fbr_bulk_send, self.env.registry, keys[record_id], *job)
+                           for record_id, job in jobs.items()}
+                sent = {record_id: future.result() for record_id, future in futures.items()}
+        ambiguous_ids = {
+            record_id for record_id, (response, _data, exc, _started, _duration) in sent.items()
+            if response is None and isinstance(exc, requests.exceptions.RequestException) and is_ambiguous_error(exc)
+        }
+        IdempotencyKey._release({
+            keys[record_id]: IdempotencyKey._outcome_of(response) if response is not None else
+            ('ambiguous' if record_id in ambiguous_ids else 'failed', None)
+            for record_id, (response, _data, _exc, _started, _duration) in sent.items()
+        })
+        outcomes.update(sent)
+
+        Submission = self.env['fbr.submission']
+        submissions = []
+        posted = self.browse()
+        for record in self.browse(list(outcomes)):
+            response, response_data, error, started_at, duration = outcomes[record.id]
+            error_message = str(error) if error else ''
+            if response is not None and not self._fbr_is_accepted(response, response_data):
+                error_message = self._fbr_error_of(response_data)
+            if record.id in sent:
+                _client, url, payload = jobs[record.id]
+                submissions.append(Submission._prepare_vals(
+                    record, url, payload, 1, started_at, duration,
+                    response=response, response_data=response_data, error=error_message))
+            with self.env.cr.savepoint():
+                if response is not None:
+                    fbr_metrics.count_fbr_status(response_data.get('validationResponse', {}).get('statusCode'))
+                    if self._fbr_is_accepted(response, response_data):
+                        record._fbr_mark_posted(response_data)
+                        posted |= record
+                        results[record.id] = {'status': 'posted', 'invoice_number': record.fbr_invoice_number, 'error': ''}
+                        continue
+                if record.id in ambiguous_ids:
+                    error_message = "FBR may have received %s before the connection failed: %s" % (
+                        jobs[record.id][2]['invoiceRefNo'], error_message)
+                    record._fbr_mark_ambiguous(error_message)
+                    results[record.id] = {'status': 'failed', 'invoice_number': '', 'error': error_message,
+                                          'ambiguous': True}
+                    continue
+                if isinstance(error, FbrDeferred) or (response is not None and response.status_code == 429):
+                    # Throttling or an open circuit is not a failure of the document, just wait
+                    retry_after = error.retry_after if error else retry_after_of(response)
+                    record._fbr_defer(retry_after)
+                    results[record.id] = {'status': 'deferred', 'invoice_number': '', 'error': error_message,
+                                          'retry_after': retry_after}
+                    continue
+                record._fbr_mark_failed(error_message)
+                results[record.id] = {'status': 'failed', 'invoice_number': '', 'error': error_message}
+        Submission._record(submissions)
+        posted._fbr_notify_status()
+
+        _logger.info("FBR bulk post of %s %s: %s posted, %s failed, %s deferred", len(self), self._name,
+                     sum(r['status'] == 'posted' for r in results.values()),
+                     sum(r['status'] == 'failed' for r in results.values()),
+                     sum(r['status'] == 'deferred' for r in results.values()))
+        return results
@@ -0,0 +1,285 @@
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+import json
+import logging
+from datetime import timedelta
+
+import requests
+
+from ..tools.fbr_client import is_ambiguous_error
+from ..tools.fbr_errors import FbrDeferred
+
+_logger = logging.getLogger(__name__)
+
+
+def mark_sending(registry, keys):
+    """Mark idempotency ``keys`` as about to reach the gateway, on a cursor of its own.
+
+    Usable from worker threads. A key left in flight without this marker
+    was never sent, so it can be claimed again once stale.
+    """
+    with registry.cursor() as cr:
+        cr.execute("""
+            UPDATE fbr_idempotency_key
+               SET state = 'sending', started_at = now() at time zone 'UTC'
+             WHERE key = ANY(%s) AND state = 'in_flight'
+        """, [list(keys)])
+
+
+class FbrSubmissionInProgress(UserError):
+    """Another worker is posting the same invoiceRefNo right now."""
+
+
+class FbrAmbiguousSubmission(UserError):
+    """A previous send of the invoiceRefNo may have been accepted by FBR.
+
+    The invoice is not sent again until the send is reconciled, by the
+    gateway lookup or by an operator. ``sent`` tells whether this call
+    reached the gateway.
+    """
+
+    def __init__(self, message, sent=False):
+        super().__init__(message)
+        self.sent = sent
+
+
+class ReplayedResponse:
+    """Stand-in for a ``requests.Response`` carrying an already accepted FBR result."""
+
+    status_code = 200
+    headers = {}
+
+    def __init__(self, response_data):
+        self._data = response_data
+        self.text = json.dumps(response_data, separators=(',', ':'))
+
+    def json(self):
+        return self._data
+
+
+class FbrIdempotencyKey(models.Model):
+    _name = 'fbr.idempotency.key'
+    _description = 'FBR Submission Idempotency Key'
+    _log_access = False
+    _order = 'id desc'
+    _rec_name = 'key'
+
+    key = fields.Char(string='Key', required=True, readonly=True)
+    res_model = fields.Char(string='Document Model', readonly=True)
+    res_id = fields.Many2oneReference(string='Document ID', model_field='res_model', readonly=True)
+    state = fields.Selection([
+        ('in_flight', 'In Flight'),
+        ('sending', 'Sending'),
+        ('posted', 'Posted'),
+        ('failed', 'Failed'),
+        ('ambiguous', 'Ambiguous'),
+    ], string='State', required=True, readonly=True)
+    started_at = fields.Datetime(string='Started At', readonly=True)
+    finished_at = fields.Datetime(string='Finished At', readonly=True)
+    invoice_number = fields.Char(string='FBR Invoice Number', readonly=True)
+
+    _sql_constraints = [
+        ('key_unique', 'unique(key)', 'An FBR idempotency key must be unique.'),
+    ]
+
+    @api.model
+    def _accepted_data(self, invoice_number):
+        """Response data of an accepted invoice, as replayed to the posting code."""
+        return {'invoiceNumber': invoice_number or '', 'validationResponse': {'statusCode': '00', 'status': 'Valid'}}
+
+    @api.model
+    def _key_of(self, payload):
+        return '%s:%s' % (payload.get('sellerNTNCNIC') or '', payload['invoiceRefNo'])
+
+    def _get_inflight_timeout(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param('fbr.inflight_timeout', 120))
+
+    @api.model
+    def _get_lookup_url(self):
+        """Gateway endpoint telling whether an invoiceRefNo was accepted, from fbr.invoice_lookup_url."""
+        return self.env['ir.config_parameter'].sudo().get_param('fbr.invoice_lookup_url')
+
+    @api.model
+    def _acquire(self, entries):
+        """Claim the right to send each key, in a transaction of its own.
+
+        ``entries`` maps key to the document being posted. Returns a dict of
+        key to ``(decision, response_data)`` where decision is:
+
+        * ``send``: the marker is ours, post the payload;
+        * ``done``: FBR already accepted it, replay ``response_data``;
+        * ``busy``: another worker holds a fresh in-flight marker;
+        * ``reconcile``: a previous send ended ambiguously, or its worker
+          died after marking it as sending; check before resending.
+
+        A stale marker that never got to ``sending`` is claimed again as
+        ``send``: its worker died before contacting the gateway.
+        """
+        decisions = {}
+        timeout = self._get_inflight_timeout()
+        with self.env.registry.cursor() as cr:
+            for key, document in entries.items():
+                cr.execute("""
+                    INSERT INTO fbr_idempotency_key (key, res_model, res_id, state, started_at)
+                    VALUES (%s, %s, %s, 'in_flight', now() at time zone 'UTC')
+                    ON CONFLICT (key) DO NOTHING
+                    RETURNING id
+                """, [key, document._name, document.id])
+                if cr.fetchone():
+                    decisions[key] = ('send', None)
+                    continue
+                cr.execute("""
+                    SELECT state, invoice_number,
+                           started_at < (now() at time zone 'UTC') - make_interval(secs => %s)
+                      FROM fbr_idempotency_key
+                     WHERE key = %s
+                       FOR UPDATE
+                """, [timeout, key])
+                state, invoice_number, stale = cr.fetchone()
+                if state == 'posted':
+                    decisions[key] = ('done', self._accepted_data(invoice_number))
+                    continue
+                if state in ('in_flight', 'sending') and not stale:
+                    decisions[key] = ('busy', None)
+                    continue
+                decisions[key] = ('reconcile' if state in ('sending', 'ambiguous') else 'send', None)
+                cr.execute("""
+                    UPDATE fbr_idempotency_key
+                       SET state = 'in_flight', started_at = now() at time zone 'UTC', finished_at = NULL,
+                           res_model = %s, res_id = %s
+                     WHERE key = %s
+                """, [document._name, document.id, key])
+        return decisions
+
+    @api.model
+    def _release(self, outcomes):
+        """Store the outcome of each send; ``outcomes`` maps key to ``(state, response_data)``.
+
+        Only the FBR invoice number of an accepted send is kept, the
+        response itself is in the submission ledger.
+        """
+        if not outcomes:
+            return
+        with self.env.registry.cursor() as cr:
+            for key, (state, response_data) in outcomes.items():
+                cr.execute("""
+                    UPDATE fbr_idempotency_key
+                       SET state = %s, invoice_number = %s, finished_at = now() at time zone 'UTC'
+                     WHERE key = %s
+                """, [state, (response_data or {}).get('invoiceNumber') if state == 'posted' else None, key])
+
+    @api.model
+    def _reconcile(self, client, payload):
+        """Look for an accepted result of a previous ambiguous send of ``payload``.
+
+        Checks the submission ledger first, archived entries included, then
+        the gateway lookup endpoint configured in fbr.invoice_lookup_url, if
+        any. Returns the accepted response data, False when the lookup shows
+        FBR does not have the invoice, or None when that cannot be told,
+        e.g. without a lookup. Only False makes it safe to send again.
+        """
+        ref = payload['invoiceRefNo']
+        # Archived entries have lost their blobs but keep the invoice number
+        posted = self.env['fbr.submission'].sudo().with_context(active_test=False).search([
+            ('invoice_ref', '=', ref), ('status', '=', 'posted'), ('fbr_invoice_number', '!=', False),
+        ], limit=1)
+        if posted:
+            return self._accepted_data(posted.fbr_invoice_number)
+
+        lookup_url = self._get_lookup_url()
+        if not lookup_url:
+            return None
+        try:
+            response = client.get(lookup_url, params={'invoiceRefNo': ref, 'sellerNTNCNIC': payload.get('sellerNTNCNIC')})
+            if response.status_code == 404:
+                return False
+            if response.status_code != 200:
+                _logger.warning("FBR reconciliation lookup of %s answered HTTP %s", ref, response.status_code)
+                return None
+            data = response.json() if response.text else {}
+        except (requests.exceptions.RequestException, ValueError, FbrDeferred) as e:
+            _logger.warning("FBR reconciliation lookup of %s failed: %s", ref, e)
+            return None
+        return self._accepted_data(data['invoiceNumber']) if data.get('invoiceNumber') else False
+
+    @api.model
+    def _send(self, document, client, url, payload):
+        """Post ``payload`` at most once successfully per invoiceRefNo.
+
+        Returns the gateway response, or a replayed one when FBR already
+        accepted the invoice. Raises FbrSubmissionInProgress when another
+        worker is sending it, and FbrAmbiguousSubmission when a send may
+        have been accepted without us knowing, now or before; the key then
+        stays ambiguous and nothing is resent until it is reconciled. Other
+        transport errors are re-raised after marking the key failed.
+        """
+        key = self._key_of(payload)
+        decision, response_data = self._acquire({key: document})[key]
+        if decision == 'busy':
+            raise FbrSubmissionInProgress(f"{payload['invoiceRefNo']} is already being posted to FBR.")
+        if decision == 'done':
+            _logger.info("FBR already accepted %s, not posting it again", payload['invoiceRefNo'])
+            return ReplayedResponse(response_data)
+        if decision == 'reconcile':
+            response_data = self._reconcile(client, payload)
+            if response_data:
+                self._release({key: ('posted', response_data)})
+                _logger.info("Reconciled %s with an earlier accepted FBR submission", payload['invoiceRefNo'])
+                return ReplayedResponse(response_data)
+            if response_data is None:
+                self._release({key: ('ambiguous', None)})
+                raise FbrAmbiguousSubmission(
+                    f"An earlier send of {payload['invoiceRefNo']} may have reached FBR; "
+                    "it is not sent again until reconciled.")
+
+        try:
+            mark_sending(self.env.registry, [key])
+            response = client.post(url, payload)
+        except FbrDeferred:
+            self._release({key: ('failed', None)})
+            raise
+        except requests.exceptions.RequestException as e:
+            if is_ambiguous_error(e):
+                self._release({key: ('ambiguous', None)})
+                raise FbrAmbiguousSubmission(
+                    f"FBR may have received {payload['invoiceRefNo']} before the connection failed: {e}",
+                    sent=True) from e
+            self._release({key: ('failed', None)})
+            raise
+        self._release({key: self._outcome_of(response)})
+        return response
+
+    @api.model
+    def _mark_not_received(self, documents):
+        """Settle the ambiguous sends of ``documents`` as never received by FBR, allowing a resend."""
+        self.search([
+            ('res_model', '=', documents._name), ('res_id', 'in', documents.ids), ('state', '=', 'ambiguous'),
+        ]).write({'state': 'failed', 'finished_at': fields.Datetime.now()})
+
+    @api.model
+    def _apply_retention(self):
+        """Delete settled keys older than fbr.idempotency_retention_days (0 keeps them).
+
+        In-flight and ambiguous keys are kept until they are settled. An
+        accepted invoice stays protected by its FBR status and the ledger.
+        """
+        retention_days = int(self.env['ir.config_parameter'].sudo().get_param('fbr.idempotency_retention_days', 30))
+        if not retention_days:
+            return
+        self.env.flush_all()
+        self.env.cr.execute("""
+            DELETE FROM fbr_idempotency_key
+             WHERE state IN ('posted', 'failed') AND finished_at < %s
+        """, [fields.Datetime.now() - timedelta(days=retention_days)])
+        if self.env.cr.rowcount:
+            _logger.info("Deleted %s FBR idempotency keys past retention", self.env.cr.rowcount)
+        self.invalidate_model()
+
+    @api.model
+    def _outcome_of(self, response):
+        try:
+            response_data = response.json() if response.text else {}
+        except ValueError:
+            return 'failed', None
+        accepted = response.status_code == 200 and response_data.get('validationResponse', {}).get('statusCode') == '00'
+        return ('posted', response_data) if accepted else ('failed', None)
@@ -0,0 +1,122 @@
+from odoo import models, api
+from odoo.tools import SQL
+import logging
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+# Steps run in this order; each one is resumable
+STEPS = ('rates', 'status_summary', 'catalog')
+
+PENDING_STEPS_PARAM = 'fbr.install_pending_steps'
+# Chunked steps: step -> (progress parameter, chunk method, what a chunk covers)
+CHUNKED_STEPS = {
+    'rates': ('fbr.install_rates_last_id', '_compute_rates_chunk', 'product rates'),
+    'status_summary': ('fbr.install_status_summary_last_id', '_rebuild_status_summary_chunk', 'FBR status summary'),
+}
+
+
+class FbrInstallPipeline(models.AbstractModel):
+    _name = 'fbr.install.pipeline'
+    _description = 'FBR Install and Upgrade Pipeline'
+
+    @api.model
+    def _schedule(self, steps=STEPS):
+        """Queue ``steps`` for the pipeline cron instead of running them in the install transaction."""
+        ICP = self.env['ir.config_parameter'].sudo()
+        pending = self._get_pending_steps()
+        pending += [step for step in steps if step not in pending]
+        ICP.set_param(PENDING_STEPS_PARAM, ','.join(step for step in STEPS if step in pending))
+        for step in CHUNKED_STEPS.keys() & set(steps):
+            ICP.set_param(CHUNKED_STEPS[step][0], 0)
+        _logger.info("FBR install pipeline scheduled: %s", ', '.join(steps))
+        self.env.ref('tt_fbr_iris_connector.ir_cron_fbr_install_pipeline')._trigger()
+
+    @api.model
+    def _get_pending_steps(self):
+        value = self.env['ir.config_parameter'].sudo().get_param(PENDING_STEPS_PARAM) or ''
+        return [step for step in value.split(',') if step in STEPS]
+
+    @api.model
+    def _done(self, step):
+        pending = [s for s in self._get_pending_steps() if s != step]
+        self.env['ir.config_parameter'].sudo().set_param(PENDING_STEPS_PARAM, ','.join(pending))
+
+    @api.model
+    def _compute_rates_chunk(self, last_id, chunk_size):
+        """Set fbr_rate_id of the next ``chunk_size`` product templates after ``last_id``.
+
+        Returns the last id handled, or None once every product is done.
+        """
+        cr = self.env.cr
+        cr.execute("""
+            SELECT max(id) FROM (
+                SELECT id FROM product_template WHERE id > %s ORDER BY id LIMIT %s
+            ) chunk
+        """, [last_id, chunk_size])
+        [upper] = cr.fetchone()
+        if upper is None:
+            return None
+        self.env['product.template']._fbr_update_rate_ids(SQL("chunk.id > %s AND chunk.id <= %s", last_id, upper))
+        return upper
+
+    @api.model
+    def _rebuild_status_summary_chunk(self, last_id, chunk_size):
+        """Rebuild the FBR status summary of the next ``chunk_size`` POS sessions after ``last_id``."""
+        return self.env['fbr.status.summary']._rebuild(last_id, chunk_size)
+
+    @api.model
+    def _run_chunked(self, step, deadline, auto_commit):
+        """Run a chunked step chunk by chunk, committing the progress after each chunk."""
+        param, method, label = CHUNKED_STEPS[step]
+        ICP = self.env['ir.config_parameter'].sudo()
+        chunk_size = int(ICP.get_param('fbr.install_chunk_size', 5000))
+        last_id = int(ICP.get_param(param, 0))
+        chunks = 0
+        while time.monotonic() < deadline:
+            upper = getattr(self, method)(last_id, chunk_size)
+            if upper is None:
+                self._done(step)
+                if auto_commit:
+                    self.env.cr.commit()
+                _logger.info("FBR install pipeline: %s done", label)
+                return True
+            last_id = upper
+            ICP.set_param(param, last_id)
+            if auto_commit:
+                self.env.cr.commit()
+            chunks += 1
+            _logger.info("FBR install pipeline: %s done up to id %s (%s chunks this run)", label, last_id, chunks)
+        return False
+
+    @api.model
+    def _run_catalog(self):
+        """Load the option catalog, unless deferred with fbr.install_load_catalog."""
+        ICP = self.env['ir.config_parameter'].sudo()
+        if ICP.get_param('fbr.install_load_catalog', 'True').lower() in ('1', 'true'):
+            self.env['product.template'].load_fbr_static_options()
+            _logger.info("FBR install pipeline: option catalog loaded")
+        else:
+            _logger.info("FBR install pipeline: option catalog load deferred, use Load FBR Options when ready")
+        self._done('catalog')
+        return True
+
+    @api.model
+    def _cron_run(self, time_budget=None):
+        """Run the pending steps within ``time_budget`` seconds, then trigger itself if work remains."""
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        time_budget = time_budget or int(
+            self.env['ir.config_parameter'].sudo().get_param('fbr.install_time_budget', 240))
+        deadline = time.monotonic() + time_budget
+        for step in self._get_pending_steps():
+            if step in CHUNKED_STEPS:
+                finished = self._run_chunked(step, deadline, auto_commit)
+            else:
+                finished = self._run_catalog()
+            if auto_commit:
+                self.env.cr.commit()
+            if not finished:
+                break
+        if self._get_pending_steps():
+            self.env.ref('tt_fbr_iris_connector.ir_cron_fbr_install_pipeline')._trigger()
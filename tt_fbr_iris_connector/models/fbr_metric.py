@@ -0,0 +1,19 @@
+from odoo import models, fields
+
+
+class FbrMetric(models.Model):
+    _name = 'fbr.metric'
+    _description = 'FBR Integration Counter'
+    _log_access = False
+    _order = 'metric, endpoint, label'
+    _rec_name = 'metric'
+
+    # Incremented by tools/fbr_metrics.py in raw SQL, by every process
+    metric = fields.Char(string='Metric', required=True, readonly=True)
+    endpoint = fields.Char(string='Endpoint', required=True, default='', readonly=True)
+    label = fields.Char(string='Label', required=True, default='', readonly=True)
+    value = fields.Float(string='Value', readonly=True)
+
+    _sql_constraints = [
+        ('metric_unique', 'unique(metric, endpoint, label)', 'One row per FBR metric series.'),
+    ]
@@ -0,0 +1,125 @@
+from odoo import models, fields, api
+from markupsafe import Markup, escape
+
+from ..tools import fbr_metrics
+
+FBR_STATUSES = ('draft', 'posted', 'failed')
+# Moves sent to FBR: customer invoices and credit notes
+FBR_MOVE_DOMAIN = [('move_type', 'in', ('out_invoice', 'out_refund'))]
+
+
+class FbrMetricsDashboard(models.TransientModel):
+    _name = 'fbr.metrics.dashboard'
+    _description = 'FBR Integration Metrics'
+
+    pos_draft_count = fields.Integer(string='POS Orders Pending', compute='_compute_metrics')
+    pos_posted_count = fields.Integer(string='POS Orders Posted', compute='_compute_metrics')
+    pos_failed_count = fields.Integer(string='POS Orders Failed', compute='_compute_metrics')
+    move_draft_count = fields.Integer(string='Invoices Pending', compute='_compute_metrics')
+    move_posted_count = fields.Integer(string='Invoices Posted', compute='_compute_metrics')
+    move_failed_count = fields.Integer(string='Invoices Failed', compute='_compute_metrics')
+    outbox_depth = fields.Integer(string='Outbox Depth', compute='_compute_metrics')
+    oldest_pending_age = fields.Integer(string='Oldest Pending Order (s)', compute='_compute_metrics')
+    gateway_status = fields.Char(string='Gateway Circuit', compute='_compute_metrics')
+    latency_html = fields.Html(string='Gateway Latency', compute='_compute_metrics', sanitize=False)
+    counters_html = fields.Html(string='Counters', compute='_compute_metrics', sanitize=False)
+
+    @api.model
+    def _count_by_fbr_status(self, model_name, domain=()):
+        groups = self.env[model_name].sudo()._read_group(list(domain), ['fbr_status'], ['__count'])
+        counts = dict.fromkeys(FBR_STATUSES, 0)
+        counts.update({status: count for status, count in groups if status})
+        return counts
+
+    @api.model
+    def _pos_counts_by_fbr_status(self):
+        """POS order counts from the status summary rather than from pos.order itself."""
+        [(posted, failed, pending)] = self.env['fbr.status.summary'].sudo()._read_group(
+            [], [], ['posted_count:sum', 'failed_count:sum', 'pending_count:sum'])
+        return {'posted': posted or 0, 'failed': failed or 0, 'draft': pending or 0}
+
+    @api.model
+    def _oldest_pending_age(self):
+        """Seconds the oldest pending paid, e-invoiced POS order has waited for FBR; failed orders are not pending."""
+        [(oldest,)] = self.env['fbr.status.summary'].sudo()._read_group(
+            [('oldest_pending_at', '!=', False)], [], ['oldest_pending_at:min'])
+        if not oldest:
+            return 0
+        return int((fields.Datetime.now() - oldest).total_seconds())
+
+    @api.model
+    def _outbox_depth(self):
+        return self.env['fbr.outbox'].sudo().search_count([('state', '=', 'pending')])
+
+    @api.model
+    def _get_metric_gauges(self):
+        """Database gauges for fbr_metrics.render_prometheus."""
+        documents = []
+        for model_name, counts in (('pos.order', self._pos_counts_by_fbr_status()),
+                                   ('account.move', self._count_by_fbr_status('account.move', FBR_MOVE_DOMAIN))):
+            documents += [
+                ({'model': model_name, 'fbr_status': status}, count)
+                for status, count in counts.items()
+            ]
+        return [
+            ('fbr_documents', 'Documents by FBR status.', documents),
+            ('fbr_outbox_pending', 'Pending entries in the FBR outbox.', [({}, self._outbox_depth())]),
+            ('fbr_oldest_pending_order_age_seconds', 'Age of the oldest paid POS order still pending for FBR.',
+             [({}, self._oldest_pending_age())]),
+            ('fbr_circuit_open', 'Whether the circuit breaker of an FBR gateway host is open.', [
+                ({'host': breaker.host}, int(breaker.state == 'open'))
+                for breaker in self.env['fbr.circuit.breaker'].sudo().search([])
+            ]),
+        ]
+
+    @api.depends_context('uid')
+    def _compute_metrics(self):
+        pos_counts = self._pos_counts_by_fbr_status()
+        move_counts = self._count_by_fbr_status('account.move', FBR_MOVE_DOMAIN)
+        outbox_depth = self._outbox_depth()
+        oldest_age = self._oldest_pending_age()
+        open_hosts = self.env['fbr.circuit.breaker'].sudo().search([('state', '=', 'open')]).mapped('host')
+        gateway_status = "Open: %s" % ", ".join(open_hosts) if open_hosts else "Closed"
+        fbr_metrics.flush(self.env.registry, force=True)
+        data = fbr_metrics.read(self.env.cr)
+
+        rows = []
+        for endpoint, histogram in sorted(data['latency'].items()):
+            p50 = fbr_metrics.latency_quantile(data, endpoint, 0.5)
+            p99 = fbr_metrics.latency_quantile(data, endpoint, 0.99)
+            mean = histogram['sum'] / histogram['count'] if histogram['count'] else 0.0
+            rows.append(Markup('<tr><td>%s</td><td>%s</td><td>%.3f</td><td>&lt;= %s</td><td>&lt;= %s</td></tr>') % (
+                endpoint, histogram['count'], mean, p50, p99))
+        latency_html = Markup(
+            '<table class="table table-sm"><thead><tr><th>Endpoint</th><th>Requests</th>'
+            '<th>Mean (s)</th><th>p50 (s)</th><th>p99 (s)</th></tr></thead><tbody>%s</tbody></table>'
+        ) % Markup().join(rows)
+
+        counters = [('HTTP %s %s' % (status, endpoint), count)
+                    for (endpoint, status), count in sorted(data['http_status'].items())]
+        counters += [('FBR statusCode %s' % status, count) for status, count in sorted(data['fbr_status'].items())]
+        counters += [('Retries (%s)' % source, count) for source, count in sorted(data['retries'].items())]
+        counters_html = Markup('<table class="table table-sm"><tbody>%s</tbody></table>') % Markup().join(
+            Markup('<tr><td>%s</td><td>%s</td></tr>') % (escape(label), count) for label, count in counters
+        )
+
+        for dashboard in self:
+            dashboard.pos_draft_count = pos_counts['draft']
+            dashboard.pos_posted_count = pos_counts['posted']
+            dashboard.pos_failed_count = pos_counts['failed']
+            dashboard.move_draft_count = move_counts['draft']
+            dashboard.move_posted_count = move_counts['posted']
+            dashboard.move_failed_count = move_counts['failed']
+            dashboard.outbox_depth = outbox_depth
+            dashboard.oldest_pending_age = oldest_age
+            dashboard.gateway_status = gateway_status
+            dashboard.latency_html = latency_html
+            dashboard.counters_html = counters_html
+
+    def action_refresh(self):
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'view_mode': 'form',
+            'target': 'inline',
+        }
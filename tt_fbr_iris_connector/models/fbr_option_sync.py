@@ -0,0 +1,39 @@
+from odoo import models, fields, api
+import hashlib
+import json
+
+
+class FbrOptionSync(models.Model):
+    _name = 'fbr.option.sync'
+    _description = 'FBR Option Catalog Sync State'
+    _rec_name = 'type'
+
+    type = fields.Selection(selection=lambda self: self.env['fbr.option']._fields['type'].selection,
+                            string='Type', required=True)
+    scope = fields.Char(string='Scope', default='', help='Parent code for catalogs fetched per parent, e.g. SRO items.')
+    last_sync = fields.Datetime(string='Last Sync')
+    content_hash = fields.Char(string='Content Hash')
+    record_count = fields.Integer(string='Records')
+
+    _sql_constraints = [
+        ('type_scope_unique', 'unique(type, scope)', 'Only one sync state per catalog type and scope.'),
+    ]
+
+    @api.model
+    def _find_state(self, opt_type, scope=''):
+        """Sync state of a catalog, or an empty recordset if it was never synced."""
+        return self.sudo().search([('type', '=', opt_type), ('scope', '=', scope or '')], limit=1)
+
+    @api.model
+    def _get_state(self, opt_type, scope=''):
+        """Sync state of a catalog, created on its first sync."""
+        return self._find_state(opt_type, scope) or self.sudo().create({'type': opt_type, 'scope': scope or ''})
+
+    @api.model
+    def _compute_hash(self, pairs):
+        """Order-independent digest of (code, name) pairs."""
+        return hashlib.sha1(json.dumps(sorted(pairs), separators=(',', ':')).encode()).hexdigest()
+
+    def _is_fresh(self, max_age_days):
+        self.ensure_one()
+        return bool(self.last_sync) and (fields.Datetime.now() - self.last_sync).days < max_age_days
@@ -0,0 +1,220 @@
+from odoo import models, fields, api
+from datetime import timedelta
+import threading
+import logging
+
+from ..tools import fbr_metrics
+from ..tools.fbr_errors import FbrDeferred
+from .fbr_idempotency import FbrAmbiguousSubmission, FbrSubmissionInProgress
+
+_logger = logging.getLogger(__name__)
+
+
+class FbrOutbox(models.Model):
+    _name = 'fbr.outbox'
+    _description = 'FBR Submission Outbox'
+    _order = 'next_attempt_at, id'
+
+    res_model = fields.Char(string='Document Model', required=True, readonly=True)
+    res_id = fields.Many2oneReference(string='Document ID', model_field='res_model', required=True, readonly=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='State', default='pending', required=True, index=True)
+    attempt_count = fields.Integer(string='Attempts', default=0, readonly=True)
+    next_attempt_at = fields.Datetime(string='Next Attempt', default=fields.Datetime.now, index=True)
+    processed_at = fields.Datetime(string='Processed At', readonly=True)
+    last_error = fields.Text(string='Last Error', readonly=True)
+
+    _sql_constraints = [
+        ('res_unique', 'unique(res_model, res_id)', 'A document can only be queued once for FBR.'),
+    ]
+
+    def _get_max_attempts(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param('fbr.outbox_max_attempts', 5))
+
+    def _get_batch_size(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param('fbr.outbox_batch_size', 50))
+
+    @api.model
+    def _enqueue(self, records):
+        """Queue documents for FBR posting and wake up the outbox cron.
+
+        Only writes to the outbox, so it is safe to call from the paid
+        transaction; the gateway is contacted by the cron in its own
+        transaction once this one commits.
+        """
+        if not records:
+            return self.browse()
+        Outbox = self.sudo()
+        existing = Outbox.search([('res_model', '=', records._name), ('res_id', 'in', records.ids)])
+        existing.write({
+            'state': 'pending',
+            'next_attempt_at': fields.Datetime.now(),
+            'last_error': False,
+        })
+        missing_ids = set(records.ids) - set(existing.mapped('res_id'))
+        entries = existing | Outbox.create([
+            {'res_model': records._name, 'res_id': res_id}
+            for res_id in sorted(missing_ids)
+        ])
+        self.env.ref('tt_fbr_iris_connector.ir_cron_fbr_outbox')._trigger()
+        return entries
+
+    def _claim_next(self):
+        """Lock the next due entry, skipping rows already claimed by another worker."""
+        self.env.cr.execute("""
+            SELECT id FROM fbr_outbox
+             WHERE state = 'pending' AND next_attempt_at <= (now() at time zone 'UTC')
+             ORDER BY next_attempt_at, id
+             LIMIT 1
+               FOR UPDATE SKIP LOCKED
+        """)
+        row = self.env.cr.fetchone()
+        return self.browse(row[0]) if row else self.browse()
+
+    def _process(self):
+        """Post the queued document. Failures are rescheduled with exponential backoff.
+
+        Returns False when posting must be deferred (rate limit, gateway down),
+        so the caller can stop draining.
+        """
+        self.ensure_one()
+        record = self.env[self.res_model].browse(self.res_id).exists()
+        if not record:
+            self.write({'state': 'done', 'processed_at': fields.Datetime.now(), 'last_error': 'Document no longer exists'})
+            return
+        if record.fbr_status == 'posted':
+            # Posted meanwhile, e.g. by the POS receipt screen within its deadline
+            self.write({'state': 'done', 'processed_at': fields.Datetime.now(), 'last_error': False})
+            return
+        if self.attempt_count:
+            fbr_metrics.count_retry('outbox')
+        try:
+            with self.env.cr.savepoint():
+                record._fbr_post_document()
+        except FbrSubmissionInProgress:
+            # Someone else is sending it; come back once their result is known
+            self.write({'next_attempt_at': fields.Datetime.now() + timedelta(minutes=1)})
+            return
+        except FbrAmbiguousSubmission as e:
+            _logger.warning("FBR outbox entry %s for %s needs reconciliation: %s", self.id, record.display_name, e)
+            record._fbr_mark_ambiguous(str(e))
+            self._record_ambiguous(str(e))
+            return
+        except FbrDeferred as e:
+            # Throttling or an open circuit is not a failure of the document, just wait
+            self.write({'next_attempt_at': fields.Datetime.now() + timedelta(seconds=e.retry_after)})
+            return False
+        except Exception as e:
+            _logger.warning("FBR outbox entry %s for %s failed: %s", self.id, record.display_name, e)
+            record._fbr_mark_failed(str(e))
+            self._record_failure(str(e))
+            return
+        self._record_done()
+
+    def _record_done(self):
+        self.write({
+            'state': 'done',
+            'attempt_count': self.attempt_count + 1,
+            'processed_at': fields.Datetime.now(),
+            'last_error': False,
+        })
+
+    def _record_failure(self, error):
+        """Reschedule with exponential backoff, or give up after fbr.outbox_max_attempts."""
+        attempts = self.attempt_count + 1
+        vals = {'attempt_count': attempts, 'last_error': error}
+        if attempts >= self._get_max_attempts():
+            vals['state'] = 'failed'
+        else:
+            vals['next_attempt_at'] = fields.Datetime.now() + timedelta(minutes=2 ** attempts)
+        self.write(vals)
+
+    def _record_ambiguous(self, error):
+        """Never resend blindly: check again later through the lookup if there is one, else park the entry."""
+        if self.env['fbr.idempotency.key'].sudo()._get_lookup_url():
+            self._record_failure(error)
+        else:
+            self.write({'state': 'failed', 'attempt_count': self.attempt_count + 1, 'last_error': error})
+
+    @api.model
+    def _claim_batch(self, limit, lease_seconds):
+        """Lease up to ``limit`` due entries to the caller for ``lease_seconds``.
+
+        The rows are locked with SKIP LOCKED and their next attempt pushed
+        past the lease, so once the caller commits no other drain process
+        or cron picks them up; entries of a process that dies come back by
+        themselves when the lease runs out.
+        """
+        self.env.cr.execute("""
+            UPDATE fbr_outbox
+               SET next_attempt_at = (now() at time zone 'UTC') + make_interval(secs => %s)
+             WHERE id IN (
+                    SELECT id FROM fbr_outbox
+                     WHERE state = 'pending' AND next_attempt_at <= (now() at time zone 'UTC')
+                     ORDER BY next_attempt_at, id
+                     LIMIT %s
+                       FOR UPDATE SKIP LOCKED
+                   )
+         RETURNING id
+        """, [lease_seconds, limit])
+        ids = [row[0] for row in self.env.cr.fetchall()]
+        self.invalidate_model(['next_attempt_at'])
+        return self.browse(sorted(ids))
+
+    def _drain(self, max_workers=None):
+        """Post the documents of the leased entries ``self`` concurrently and record the outcomes.
+
+        Returns the number of entries whose document got posted.
+        """
+        posted = 0
+        for _entry in self.filtered('attempt_count'):
+            fbr_metrics.count_retry('outbox')
+        for res_model, entries in self.grouped('res_model').items():
+            records = self.env[res_model].browse(entries.mapped('res_id')).exists()
+            results = records._fbr_post_bulk(max_workers) if records else {}
+            for entry in entries:
+                result = results.get(entry.res_id)
+                if result is None or result['status'] == 'posted' or (
+                        result['status'] == 'skipped' and 'retry_after' not in result):
+                    # Posted, already posted, gone, or nothing to send for its config
+                    entry._record_done()
+                    posted += bool(result and result['status'] == 'posted')
+                elif result.get('ambiguous'):
+                    entry._record_ambiguous(result['error'])
+                elif 'retry_after' in result:
+                    entry.write({'next_attempt_at': fields.Datetime.now() + timedelta(seconds=result['retry_after'])})
+                else:
+                    entry._record_failure(result['error'])
+        return posted
+
+    @api.model
+    def _cron_process_outbox(self, batch_size=None):
+        """Drain due outbox entries, one transaction per entry."""
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        batch_size = batch_size or self._get_batch_size()
+        self = self.with_context(fbr_traffic='background', fbr_rate_wait=float(
+            self.env['ir.config_parameter'].sudo().get_param('fbr.rate_limit_max_wait', 5)))
+        processed = 0
+        while processed < batch_size:
+            entry = self._claim_next()
+            if not entry:
+                break
+            throttled = entry._process() is False
+            processed += 1
+            if auto_commit:
+                self.env.cr.commit()
+            if throttled:
+                break
+        if processed:
+            _logger.info("FBR outbox processed %s entries", processed)
+        if processed >= batch_size:
+            # More work may be waiting, run again right away
+            self.env.ref('tt_fbr_iris_connector.ir_cron_fbr_outbox')._trigger()
+        return processed
+
+    def action_requeue(self):
+        self.write({'state': 'pending', 'next_attempt_at': fields.Datetime.now(), 'last_error': False})
+        self.env.ref('tt_fbr_iris_connector.ir_cron_fbr_outbox')._trigger()
@@ -0,0 +1,30 @@
+from odoo import models, fields
+
+
+class FbrRateLimit(models.Model):
+    _name = 'fbr.rate.limit'
+    _description = 'FBR Gateway Rate Limit Bucket'
+    _log_access = False
+    _order = 'key, budget'
+
+    # Maintained by tools/fbr_rate_limiter.py in raw SQL, shared by all workers
+    key = fields.Char(string='Token Hash', required=True, readonly=True)
+    budget = fields.Selection([
+        ('interactive', 'Interactive'),
+        ('background', 'Background'),
+    ], string='Budget', required=True, readonly=True)
+    tokens = fields.Float(string='Available Tokens', readonly=True)
+    capacity = fields.Float(string='Burst Capacity', readonly=True)
+    refill_rate = fields.Float(string='Current Rate (req/s)', readonly=True)
+    max_rate = fields.Float(string='Configured Rate (req/s)', readonly=True)
+    updated_at = fields.Datetime(string='Updated At', readonly=True)
+    blocked_until = fields.Datetime(string='Blocked Until', readonly=True)
+    throttled_count = fields.Integer(string='429 Responses', default=0, readonly=True)
+
+    _sql_constraints = [
+        ('key_budget_unique', 'unique(key, budget)', 'One bucket per token and budget.'),
+    ]
+
+    def action_reset(self):
+        for bucket in self:
+            bucket.write({'tokens': bucket.capacity, 'refill_rate': bucket.max_rate, 'blocked_until': False})
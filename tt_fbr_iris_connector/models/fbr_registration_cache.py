@@ -0,0 +1,94 @@
+from odoo import models, fields, api
+from datetime import timedelta
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class FbrRegistrationCache(models.Model):
+    _name = 'fbr.registration.cache'
+    _description = 'FBR Buyer Registration Cache'
+    _rec_name = 'ntn'
+
+    ntn = fields.Char(string='NTN', required=True, index=True)
+    registration_type = fields.Selection([
+        ('Unregistered', 'Unregistered'),
+        ('Registered', 'Registered'),
+    ], string='Registration Type')
+    found = fields.Boolean(string='Found', default=True,
+                           help='Unset when FBR returned no registration for this NTN (negative cache entry).')
+    checked_at = fields.Datetime(string='Checked At', required=True, default=fields.Datetime.now)
+    expires_at = fields.Datetime(string='Expires At', required=True, index=True)
+
+    _sql_constraints = [
+        ('ntn_unique', 'unique(ntn)', 'The NTN is already cached.'),
+    ]
+
+    def _get_ttl(self, found):
+        ICP = self.env['ir.config_parameter'].sudo()
+        if found:
+            return timedelta(hours=int(ICP.get_param('fbr.registration_cache_ttl_hours', 24 * 7)))
+        return timedelta(hours=int(ICP.get_param('fbr.registration_negative_ttl_hours', 24)))
+
+    @api.model
+    def _lookup(self, ntns):
+        """Fresh cache entries for ``ntns``, as a map of NTN to registration type (False if not found)."""
+        entries = self.sudo().search([('ntn', 'in', list(ntns)), ('expires_at', '>', fields.Datetime.now())])
+        return {entry.ntn: entry.registration_type if entry.found else False for entry in entries}
+
+    @api.model
+    def _store(self, results):
+        """Upsert lookup results given as a map of NTN to registration type (False if not found)."""
+        if not results:
+            return
+        Cache = self.sudo()
+        now = fields.Datetime.now()
+        existing = {entry.ntn: entry for entry in Cache.search([('ntn', 'in', list(results))])}
+        to_create = []
+        to_write = {}
+        for ntn, registration_type in results.items():
+            if ntn in existing:
+                to_write.setdefault(registration_type or False, Cache.browse())
+                to_write[registration_type or False] |= existing[ntn]
+            else:
+                to_create.append(dict(self._prepare_entry_vals(registration_type, now), ntn=ntn))
+        # One write per distinct result instead of one per NTN
+        for registration_type, entries in to_write.items():
+            entries.write(self._prepare_entry_vals(registration_type, now))
+        if to_create:
+            Cache.create(to_create)
+
+    def _prepare_entry_vals(self, registration_type, now):
+        return {
+            'registration_type': registration_type or False,
+            'found': bool(registration_type),
+            'checked_at': now,
+            'expires_at': now + self._get_ttl(bool(registration_type)),
+        }
+
+    @api.model
+    def _get_stale_ntns(self, limit=None):
+        """NTNs of partners whose cache entry is expired or missing."""
+        self.env.cr.execute("""
+            SELECT DISTINCT p.ntn
+              FROM res_partner p
+         LEFT JOIN fbr_registration_cache c ON c.ntn = p.ntn
+             WHERE p.ntn IS NOT NULL AND p.ntn != ''
+               AND (c.id IS NULL OR c.expires_at <= (now() at time zone 'UTC'))
+             LIMIT %s
+        """, [limit])
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    @api.model
+    def _cron_refresh_stale(self, limit=None):
+        """Re-check only NTNs whose cached registration is stale, on the background budget of the rate limiter."""
+        ICP = self.env['ir.config_parameter'].sudo()
+        limit = limit or int(ICP.get_param('fbr.registration_refresh_batch', 500))
+        ntns = self._get_stale_ntns(limit)
+        if not ntns:
+            return
+        partners = self.env['res.partner'].sudo().search([('ntn', 'in', ntns)])
+        partners.with_context(
+            fbr_traffic='background', fbr_rate_wait=float(ICP.get_param('fbr.rate_limit_max_wait', 5)),
+        ).check_fbr_registration(force=True)
+        _logger.info("Refreshed FBR registration of %s NTNs", len(ntns))
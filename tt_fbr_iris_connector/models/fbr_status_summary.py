@@ -0,0 +1,149 @@
+from odoo import models, fields, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Columns written by _refresh_keys, in SELECT order
+SUMMARY_COLUMNS = (
+    'session_id', 'config_id', 'company_id', 'currency_id', 'date',
+    'posted_count', 'failed_count', 'pending_count',
+    'posted_amount', 'failed_amount', 'pending_amount', 'oldest_pending_at',
+)
+
+
+class FbrStatusSummary(models.Model):
+    _name = 'fbr.status.summary'
+    _description = 'FBR Status per POS Session and Day'
+    _log_access = False
+    _order = 'date desc, config_id, session_id'
+    _rec_name = 'session_id'
+
+    # Maintained in SQL from fbr.status.summary.dirty, never written by users
+    session_id = fields.Many2one('pos.session', string='Session', required=True, readonly=True, ondelete='cascade')
+    config_id = fields.Many2one('pos.config', string='Point of Sale', readonly=True, index=True)
+    company_id = fields.Many2one('res.company', string='Company', readonly=True)
+    currency_id = fields.Many2one('res.currency', string='Currency', readonly=True)
+    date = fields.Date(string='Day', required=True, readonly=True, index=True)
+    posted_count = fields.Integer(string='Posted', readonly=True)
+    failed_count = fields.Integer(string='Failed', readonly=True)
+    pending_count = fields.Integer(string='Pending', readonly=True)
+    posted_amount = fields.Monetary(string='Posted Amount', readonly=True)
+    failed_amount = fields.Monetary(string='Failed Amount', readonly=True)
+    pending_amount = fields.Monetary(string='Pending Amount', readonly=True)
+    oldest_pending_at = fields.Datetime(string='Oldest Pending Order', readonly=True)
+
+    _sql_constraints = [
+        ('session_date_unique', 'unique(session_id, date)', 'One FBR summary per session and day.'),
+    ]
+
+    @api.model
+    def _refresh_keys(self, session_ids, dates):
+        """Recompute the summary rows of the given (session, day) pairs from their orders.
+
+        Reads only the orders of those sessions, through the session_id index.
+        Only paid orders of e-invoicing configs are counted; a day is a UTC day.
+        Pending orders are the ones neither posted nor failed, for the count,
+        the amount and the oldest order alike.
+        """
+        cr = self.env.cr
+        cr.execute("""
+            DELETE FROM fbr_status_summary s
+             USING unnest(%s::int[], %s::date[]) AS k(session_id, date)
+             WHERE s.session_id = k.session_id AND s.date = k.date
+        """, [session_ids, dates])
+        cr.execute("""
+            INSERT INTO fbr_status_summary (%s)
+            SELECT o.session_id, ps.config_id, o.company_id, rc.currency_id, o.date_order::date,
+                   count(*) FILTER (WHERE o.fbr_status = 'posted'),
+                   count(*) FILTER (WHERE o.fbr_status = 'failed'),
+                   count(*) FILTER (WHERE o.fbr_status IS DISTINCT FROM 'posted' AND o.fbr_status IS DISTINCT FROM 'failed'),
+                   coalesce(sum(o.amount_total) FILTER (WHERE o.fbr_status = 'posted'), 0),
+                   coalesce(sum(o.amount_total) FILTER (WHERE o.fbr_status = 'failed'), 0),
+                   coalesce(sum(o.amount_total) FILTER (WHERE o.fbr_status IS DISTINCT FROM 'posted'
+                                                          AND o.fbr_status IS DISTINCT FROM 'failed'), 0),
+                   min(o.date_order) FILTER (WHERE o.fbr_status IS DISTINCT FROM 'posted'
+                                                 AND o.fbr_status IS DISTINCT FROM 'failed')
+              FROM unnest(%%s::int[], %%s::date[]) AS k(session_id, date)
+              JOIN pos_order o ON o.session_id = k.session_id
+                              AND o.date_order >= k.date AND o.date_order < k.date + 1
+              JOIN pos_session ps ON ps.id = o.session_id
+              JOIN pos_config pc ON pc.id = ps.config_id
+              JOIN res_company rc ON rc.id = o.company_id
+             WHERE o.state IN ('paid', 'done', 'invoiced') AND pc.e_invoicing
+          GROUP BY o.session_id, ps.config_id, o.company_id, rc.currency_id, o.date_order::date
+        """ % ', '.join(SUMMARY_COLUMNS), [session_ids, dates])
+        self.invalidate_model()
+
+    @api.model
+    def _cron_refresh(self, batch_size=1000):
+        """Fold the queued (session, day) changes into the summary."""
+        Dirty = self.env['fbr.status.summary.dirty']
+        refreshed = 0
+        while True:
+            keys = Dirty._pop(batch_size)
+            if not keys:
+                break
+            self._refresh_keys([key[0] for key in keys], [key[1] for key in keys])
+            refreshed += len(keys)
+        if refreshed:
+            _logger.info("FBR status summary: refreshed %s session days", refreshed)
+        return refreshed
+
+    @api.model
+    def _rebuild(self, last_session_id, chunk_size):
+        """Recompute every day of the next ``chunk_size`` sessions after ``last_session_id``.
+
+        Returns the last session id handled, or None once all sessions are done.
+        """
+        cr = self.env.cr
+        cr.execute("""
+            SELECT id FROM pos_session WHERE id > %s ORDER BY id LIMIT %s
+        """, [last_session_id, chunk_size])
+        session_ids = [row[0] for row in cr.fetchall()]
+        if not session_ids:
+            return None
+        cr.execute("""
+            SELECT DISTINCT session_id, date_order::date FROM pos_order WHERE session_id = ANY(%s)
+        """, [session_ids])
+        keys = cr.fetchall()
+        if keys:
+            self._refresh_keys([key[0] for key in keys], [key[1] for key in keys])
+        return session_ids[-1]
+
+    def action_refresh(self):
+        self._cron_refresh()
+
+
+class FbrStatusSummaryDirty(models.Model):
+    _name = 'fbr.status.summary.dirty'
+    _description = 'FBR Status Summary Refresh Queue'
+    _log_access = False
+
+    # Append-only: writers never update a shared row, so concurrent
+    # orders of one session never conflict on the summary
+    session_id = fields.Integer(string='Session ID', required=True, readonly=True)
+    date = fields.Date(string='Day', required=True, readonly=True)
+
+    @api.model
+    def _push(self, orders):
+        """Queue the (session, day) keys of ``orders`` for the summary cron."""
+        if not orders:
+            return
+        self.env.cr.execute("""
+            INSERT INTO fbr_status_summary_dirty (session_id, date)
+            SELECT DISTINCT session_id, date_order::date FROM pos_order
+             WHERE id = ANY(%s) AND session_id IS NOT NULL AND date_order IS NOT NULL
+        """, [orders.ids])
+
+    @api.model
+    def _pop(self, limit):
+        """Take up to ``limit`` queued keys off the queue, oldest first."""
+        self.env.cr.execute("""
+            WITH taken AS (
+                DELETE FROM fbr_status_summary_dirty
+                 WHERE id IN (SELECT id FROM fbr_status_summary_dirty ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED)
+             RETURNING session_id, date
+            )
+            SELECT DISTINCT session_id, date FROM taken
+        """, [limit])
+        return self.env.cr.fetchall()
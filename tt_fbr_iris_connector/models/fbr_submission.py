@@ -0,0 +1,172 @@
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from datetime import timedelta
+import base64
+import json
+import logging
+import random
+import zlib
+
+from ..tools import fbr_metrics
+
+_logger = logging.getLogger(__name__)
+
+
+def _compress(data):
+    """zlib-compressed compact JSON (or raw text), base64-encoded for a Binary field."""
+    if not data:
+        return False
+    raw = data if isinstance(data, str) else json.dumps(data, separators=(',', ':'))
+    return base64.b64encode(zlib.compress(raw.encode(), 6))
+
+
+def _decompress(blob):
+    if not blob:
+        return ''
+    return zlib.decompress(base64.b64decode(blob)).decode()
+
+
+class FbrSubmission(models.Model):
+    _name = 'fbr.submission'
+    _description = 'FBR Submission Ledger'
+    _order = 'id desc'
+    _rec_name = 'invoice_ref'
+
+    res_model = fields.Char(string='Document Model', required=True, readonly=True, index=True)
+    res_id = fields.Many2oneReference(string='Document ID', model_field='res_model', required=True, readonly=True,
+                                      index=True)
+    invoice_ref = fields.Char(string='Invoice Reference', readonly=True, index=True)
+    url = fields.Char(string='Endpoint', readonly=True)
+    attempt = fields.Integer(string='Attempt', readonly=True)
+    status = fields.Selection([
+        ('posted', 'Posted'),
+        ('rejected', 'Rejected'),
+        ('rate_limited', 'Rate Limited'),
+        ('error', 'Transport Error'),
+    ], string='Status', required=True, readonly=True, index=True)
+    http_status = fields.Integer(string='HTTP Status', readonly=True)
+    fbr_status_code = fields.Char(string='FBR Status Code', readonly=True)
+    fbr_invoice_number = fields.Char(string='FBR Invoice Number', readonly=True)
+    error_message = fields.Text(string='Error', readonly=True)
+    started_at = fields.Datetime(string='Started At', readonly=True)
+    duration_ms = fields.Integer(string='Duration (ms)', readonly=True)
+    payload_blob = fields.Binary(string='Payload (compressed)', attachment=False, readonly=True)
+    response_blob = fields.Binary(string='Response (compressed)', attachment=False, readonly=True)
+    payload_json = fields.Text(string='Payload', compute='_compute_json')
+    response_json = fields.Text(string='Response', compute='_compute_json')
+    active = fields.Boolean(default=True, index=True)
+
+    @api.depends('payload_blob', 'response_blob')
+    def _compute_json(self):
+        for submission in self:
+            blobs = submission.with_context(bin_size=False)
+            submission.payload_json = _decompress(blobs.payload_blob)
+            submission.response_json = _decompress(blobs.response_blob)
+
+    def write(self, vals):
+        # Append-only: only archival may touch existing entries
+        if set(vals) - {'active'}:
+            raise UserError("FBR submissions cannot be modified.")
+        return super().write(vals)
+
+    @api.model
+    def _prepare_vals(self, document, url, payload, attempt, started_at, duration,
+                      response=None, response_data=None, error=None):
+        if response is None:
+            status = 'error'
+        elif response.status_code == 429:
+            status = 'rate_limited'
+        elif response.status_code == 200 and (response_data or {}).get('validationResponse', {}).get('statusCode') == '00':
+            status = 'posted'
+        else:
+            status = 'rejected'
+        raw_response = response_data or (response.text if response is not None else None)
+        response_data = response_data or {}
+        return {
+            'res_model': document._name,
+            'res_id': document.id,
+            'invoice_ref': payload.get('invoiceRefNo') or document.display_name,
+            'url': url,
+            'attempt': attempt,
+            'status': status,
+            'http_status': response.status_code if response is not None else 0,
+            'fbr_status_code': response_data.get('validationResponse', {}).get('statusCode') or False,
+            'fbr_invoice_number': response_data.get('invoiceNumber') or False,
+            'error_message': error or False,
+            'started_at': started_at,
+            'duration_ms': int(duration * 1000),
+            'payload_blob': _compress(payload),
+            'response_blob': _compress(raw_response),
+        }
+
+    @api.model
+    def _record(self, vals_list):
+        """Append ledger entries in their own transaction.
+
+        The entry survives a rollback of the document transaction, so the
+        ledger always shows what actually reached the gateway.
+        """
+        if not vals_list:
+            return
+        try:
+            with self.env.registry.cursor() as cr:
+                self.env(cr=cr, su=True)[self._name].create(vals_list)
+        except Exception:
+            _logger.exception("Could not record %s FBR submissions", len(vals_list))
+        # Every posting path ends here, so share its counters with the other processes
+        fbr_metrics.flush(self.env.registry)
+
+    @api.model
+    def _log_payload(self, label, data):
+        """DEBUG-log a sample of the exchanged JSON, controlled by fbr.payload_log_sample_rate."""
+        if not _logger.isEnabledFor(logging.DEBUG):
+            return
+        rate = float(self.env['ir.config_parameter'].sudo().get_param('fbr.payload_log_sample_rate', 0.1))
+        if random.random() < rate:
+            _logger.debug("%s: %s", label, data if isinstance(data, str) else json.dumps(data, separators=(',', ':')))
+
+    @api.model
+    def _latest_responses(self, res_model, res_ids):
+        """Decompressed response of the latest submission of each document, keyed by res_id."""
+        latest = {}
+        if not res_ids:
+            return latest
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (res_id) res_id, id
+              FROM fbr_submission
+             WHERE res_model = %s AND res_id = ANY(%s)
+          ORDER BY res_id, id DESC
+        """, [res_model, list(res_ids)])
+        ids_by_res = dict(self.env.cr.fetchall())
+        submissions = self.browse(ids_by_res.values()).with_context(bin_size=False)
+        submissions.fetch(['res_id', 'response_blob'])
+        for submission in submissions:
+            latest[submission.res_id] = _decompress(submission.response_blob)
+        return latest
+
+    @api.model
+    def _cron_apply_retention(self):
+        """Archive entries older than fbr.submission_archive_days, dropping their blobs, and delete
+        those older than fbr.submission_retention_days. A value of 0 disables the step.
+        Settled idempotency keys are pruned along, see fbr.idempotency.key."""
+        ICP = self.env['ir.config_parameter'].sudo()
+        archive_days = int(ICP.get_param('fbr.submission_archive_days', 30))
+        retention_days = int(ICP.get_param('fbr.submission_retention_days', 365))
+        now = fields.Datetime.now()
+        self.env.flush_all()
+        if archive_days:
+            self.env.cr.execute("""
+                UPDATE fbr_submission
+                   SET active = FALSE, payload_blob = NULL, response_blob = NULL
+                 WHERE active AND create_date < %s
+            """, [now - timedelta(days=archive_days)])
+            if self.env.cr.rowcount:
+                _logger.info("Archived %s FBR submissions", self.env.cr.rowcount)
+        if retention_days:
+            self.env.cr.execute(
+                "DELETE FROM fbr_submission WHERE create_date < %s", [now - timedelta(days=retention_days)]
+            )
+            if self.env.cr.rowcount:
+                _logger.info("Deleted %s FBR submissions past retention", self.env.cr.rowcount)
+        self.invalidate_model()
+        self.env['fbr.idempotency.key'].sudo()._apply_retention()
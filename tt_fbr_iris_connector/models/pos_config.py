@@ -1,5 +1,10 @@
 from odoo import fields, models
 
+from ..tools import fbr_cache_stamp
+
+# Fields feeding the cached AccountTax._fbr_tax_assignment map
+FBR_TAX_ASSIGNMENT_FIELDS = {'fbr_taxes_registered', 'fbr_taxes_unregistered'}
+
 class PosConfig(models.Model):
     _inherit = 'pos.config'
 
@@ -63,8 +68,20 @@ class PosConfig(models.Model):
         string='POS Service Fee Product',
         domain=[('default_code', '=', 'SERVICE_FEE')],
     )
+    fbr_receipt_deadline_ms = fields.Integer(
+        string='FBR Receipt Deadline (ms)',
+        default=1500,
+        help='How long the receipt screen waits for the FBR invoice number. Orders not posted in time '
+             'print as pending and are posted in the background; 0 always posts in the background.'
+    )
     e_invoicing = fields.Boolean(
         string='Enable E-Invoicing',
         default=False,
         help='Enable e-invoicing feature for this POS configuration.'
-    )
\ No newline at end of file
+    )
+
+    def write(self, vals):
+        res = super().write(vals)
+        if FBR_TAX_ASSIGNMENT_FIELDS.intersection(vals):
+            fbr_cache_stamp.bump(self.env, [fbr_cache_stamp.TAX_ASSIGNMENT])
+        return res
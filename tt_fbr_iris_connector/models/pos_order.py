@@ -1,81 +1,103 @@
 from odoo import models, fields, api
 from odoo.exceptions import UserError
+from odoo.osv import expression
+from odoo.tools.sql import create_index
 import requests
+from datetime import datetime, timedelta
 import json
-import threading
-from datetime import datetime
 import logging
+import time
+
+from ..tools import fbr_metrics, fbr_tax_engine
+from ..tools.fbr_client import FbrClient
+from ..tools.fbr_errors import FbrDeferred
+from ..tools.fbr_rate_limiter import FbrRateLimited, retry_after_of
+from .fbr_idempotency import FbrAmbiguousSubmission, ReplayedResponse
 
 _logger = logging.getLogger(__name__)
 
+# Keys every FBR item built by the POS client must carry
+FBR_ITEM_KEYS = {
+    'itemSNo', 'hsCode', 'productDescription', 'unitPrice', 'rate', 'uoM', 'quantity', 'totalValues',
+    'valueSalesExcludingST', 'fixedNotifiedValueOrRetailPrice', 'salesTaxApplicable', 'salesTaxWithheldAtSource',
+    'extraTax', 'furtherTax', 'sroScheduleNo', 'fedPayable', 'discount', 'saleType', 'sroItemSerialNo',
+}
+
+# Order fields feeding fbr.status.summary
+FBR_SUMMARY_FIELDS = {'fbr_status', 'state', 'amount_total', 'session_id', 'date_order'}
+
 class PosOrder(models.Model):
-    _inherit = 'pos.order'
+    _name = 'pos.order'
+    _inherit = ['pos.order', 'fbr.document.mixin']
 
-    fbr_invoice_number = fields.Char(string='FBR Invoice Number', readonly=True, default="3434")
+    fbr_invoice_number = fields.Char(string='FBR Invoice Number', readonly=True, copy=False)
     fbr_status = fields.Selection([
         ('draft', 'Draft'),
         ('posted', 'Posted to FBR'),
         ('failed', 'Failed'),
-    ], string='FBR Status', default='draft', copy=False)
+    ], string='FBR Status', default='draft', copy=False, index=True)
     fbr_error_message = fields.Text(string='FBR Error Message', readonly=True)
-    fbr_response = fields.Text(string='FBR Response', readonly=True)
+    fbr_pos_items = fields.Text(string='FBR Items from POS', readonly=True, copy=False,
+                                help='FBR scenario and items built by the POS client while ringing up the order.')
 
-    def _threaded_fbr_post(self, order_id, user_id):
-        try:
-            with self.env.registry.cursor() as cr:
-                env = api.Environment(cr, user_id, {})
-                order = env['pos.order'].browse(order_id)
-                order._post_to_fbr(max_retries=2)
-                cr.commit()
-        except Exception as e:
-            _logger.exception("FBR Posting failed in background thread: %s", str(e))
-            with self.env.registry.cursor() as cr:
-                env = api.Environment(cr, user_id, {})
-                order = env['pos.order'].browse(order_id)
-                order.write({
-                    'fbr_status': 'failed',
-                    'fbr_error_message': str(e),
-                    'fbr_response': ''
-                })
-                cr.commit()
+    @api.model
+    def _load_pos_data_fields(self, config_id):
+        fields_list = super()._load_pos_data_fields(config_id)
+        return fields_list + ['fbr_pos_items'] if fields_list else fields_list
+
+    def init(self):
+        """Partial indexes over the orders still waiting for FBR, a small slice of the table."""
+        create_index(self.env.cr, 'pos_order_fbr_unposted_date_index', self._table,
+                     ['date_order'], where="fbr_status IN ('draft', 'failed')")
+        create_index(self.env.cr, 'pos_order_fbr_unposted_session_index', self._table,
+                     ['session_id'], where="fbr_status IN ('draft', 'failed')")
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        orders = super().create(vals_list)
+        self.env['fbr.status.summary.dirty'].sudo()._push(orders)
+        return orders
+
+    def write(self, vals):
+        changed = FBR_SUMMARY_FIELDS.intersection(vals)
+        if changed & {'session_id', 'date_order'}:
+            # The orders leave their current session day
+            self.env['fbr.status.summary.dirty'].sudo()._push(self)
+        res = super().write(vals)
+        if changed:
+            self.flush_recordset(['session_id', 'date_order'])
+            self.env['fbr.status.summary.dirty'].sudo()._push(self)
+        return res
 
     def action_pos_order_paid(self):
         res = super(PosOrder, self).action_pos_order_paid()
-        for order in self:
-            if order.config_id.enable_fbr_integration is not None and order.config_id.e_invoicing:
-                try:
-                    order._post_to_fbr(max_retries=2)
-                except Exception as e:
-                    _logger.exception("FBR Posting failed: %s", str(e))
-                    order.write({
-                        'fbr_status': 'failed',
-                        'fbr_error_message': str(e),
-                        'fbr_response': ''
-                    })
-                    order._schedule_fbr_post()
+        to_post = self.filtered(
+            lambda o: o.config_id.enable_fbr_integration is not None and o.config_id.e_invoicing
+        )
+        if to_post:
+            # Only queue here, the outbox cron posts once the paid transaction commits
+            self.env['fbr.outbox']._enqueue(to_post)
         return res
 
-    def _schedule_fbr_post(self):
-        self.env.cr.postcommit.add(lambda: self._safe_post_to_fbr())
-
-    def _safe_post_to_fbr(self):
-        try:
-            with self.env.registry.cursor() as cr:
-                env = api.Environment(cr, self._uid, {})
-                order = env['pos.order'].browse(self.id)
-                order._post_to_fbr(max_retries=2)
-                cr.commit()
-        except Exception as e:
-            _logger.exception("Safe FBR post failed: %s", str(e))
-            with self.env.registry.cursor() as cr:
-                env = api.Environment(cr, self._uid, {})
-                order = env['pos.order'].browse(self.id)
-                order.write({
-                    'fbr_status': 'failed',
-                    'fbr_error_message': str(e),
-                    'fbr_response': ''
-                })
-                cr.commit()
+    def _fbr_post_document(self):
+        """Single attempt used by the outbox and the retry sweeper, which own the backoff."""
+        self.ensure_one()
+        self._post_to_fbr(max_retries=0)
+
+    def _fbr_sweep_domain(self):
+        """Failed orders, plus paid orders still unsent after the grace period, unless queued in the outbox."""
+        grace = int(self.env['ir.config_parameter'].sudo().get_param('fbr.sweep_draft_grace', 15))
+        draft_due = [
+            ('fbr_status', '=', 'draft'),
+            ('state', 'in', ['paid', 'done', 'invoiced']),
+            ('config_id.e_invoicing', '=', True),
+            ('date_order', '<=', fields.Datetime.now() - timedelta(minutes=grace)),
+            '|', ('fbr_next_retry_at', '=', False), ('fbr_next_retry_at', '<=', fields.Datetime.now()),
+        ]
+        return expression.AND([
+            expression.OR([super()._fbr_sweep_domain(), draft_due]),
+            [('fbr_outbox_ids', 'not any', [('state', '=', 'pending')])],
+        ])
 
     def _get_fbr_config(self):
         self.ensure_one()
@@ -92,15 +114,22 @@ class PosOrder(models.Model):
         }
 
     def _get_scenario_id(self):
+        """Scenario of the order from its first product and its buyer.
+
+        The scenario sent by the POS client is never trusted: when it differs
+        it is replaced by the server one.
+        """
         self.ensure_one()
-        first_line = self.lines[0] if self.lines else None
-        if first_line:
-            product = first_line.product_id
-            scenario_id = product.scenario_id
-            if scenario_id == 'SN001':
-                return 'SN002' if not self.partner_id.vat else scenario_id
-            return scenario_id or ('SN002' if not self.partner_id.vat else 'SN001')  # Default scenario
-        return 'SN002' if not self.partner_id.vat else 'SN001'  # Default if no lines
+        registered = bool(self.partner_id.vat)
+        scenario_id = self.lines[:1].product_id.scenario_id
+        if scenario_id == 'SN001' and not registered:
+            scenario_id = 'SN002'
+        scenario_id = scenario_id or ('SN001' if registered else 'SN002')  # Default scenario
+        client_scenario_id = self._fbr_client_data().get('scenarioId')
+        if client_scenario_id and client_scenario_id != scenario_id:
+            _logger.info("FBR scenario %s sent by the POS for %s does not match its lines, using %s",
+                         client_scenario_id, self.name, scenario_id)
+        return scenario_id
 
     def _post_to_fbr(self, max_retries=2):
         self.ensure_one()
@@ -108,149 +137,301 @@ class PosOrder(models.Model):
             return
 
         fbr_config = self._get_fbr_config()
-        scenario_id = self._get_scenario_id()
-
-        buyer_ntn_cnic = self.partner_id.vat or ''
-        buyer_name = self.partner_id.name or 'Walking Customer'
-        buyer_province = self.partner_id.state_id.name or 'Punjab'
-        buyer_address = self.partner_id.street or 'Faisalabad'
-        buyer_registration_type = 'Registered' if self.partner_id.vat else 'Unregistered'
-
-        total_invoice_amount = round(self.amount_total + fbr_config['pos_server_fee'], 2)
-
-        payload = {
-            "invoiceType": "Sale Invoice",
-            "invoiceDate": fields.Date.today().strftime('%Y-%m-%d'),
-            "invoiceRefNo": self.name,
-            "sellerBusinessName": fbr_config['seller_business_name'],
-            "sellerProvince": fbr_config['seller_province'],
-            "sellerAddress": fbr_config['seller_address'],
-            "sellerNTNCNIC": self.config_id.seller_ntn_cnic or '',
-            "buyerNTNCNIC": buyer_ntn_cnic,
-            "buyerBusinessName": buyer_name,
-            "buyerProvince": buyer_province,
-            "buyerAddress": buyer_address,
-            "buyerRegistrationType": buyer_registration_type,
-            "paymentMode": self.payment_ids[0].payment_method_id.name if self.payment_ids else 'Cash',
-            "totalInvoiceAmount": total_invoice_amount,
-            "totalSalesTax": round(self.amount_tax, 2),
-            "posServerFee": round(fbr_config['pos_server_fee'], 2),
-            "items": self._prepare_fbr_payload(fbr_config['annexure_id']).get("Items", []),
-            "scenarioId": scenario_id,  # Always include scenarioId
-        }
-
-        headers = {
-            "Authorization": f"{fbr_config['token']}",
-            "Content-Type": "application/json"
-        }
+        payload = self._prepare_fbr_invoice_payloads()[self.id]
 
-        for attempt in range(max_retries + 1):
-            try:
-                _logger.info("FBR Payload: %s", json.dumps(payload, indent=2))
-                response = requests.post(fbr_config['server_url'], json=payload, headers=headers, timeout=10)
-                _logger.info("FBR Raw Response: %s", response.text)
-
-                response_data = response.json() if response.text else {'Message': 'No response data'}
-
-                if response.status_code == 200 and response_data.get('validationResponse', {}).get('statusCode') == '00':
-                    self.write({
-                        'fbr_invoice_number': response_data.get('invoiceNumber', ''),
-                        'fbr_status': 'posted',
-                        'fbr_error_message': '',
-                        'fbr_response': json.dumps(response_data, indent=2)
-                    })
-                    return
-                else:
-                    error_message = response_data.get('Message') or response_data.get('validationResponse', {}).get('message', 'Unknown Error')
+        client = FbrClient.from_env(self.env, fbr_config['token'])
+        Submission = self.env['fbr.submission']
+        IdempotencyKey = self.env['fbr.idempotency.key'].sudo()
+        submissions = []
+        try:
+            for attempt in range(max_retries + 1):
+                Submission._log_payload("FBR Payload", payload)
+                started_at = fields.Datetime.now()
+                start = time.monotonic()
+                try:
+                    response = IdempotencyKey._send(self, client, fbr_config['server_url'], payload)
+                    response_data = response.json() if response.text else {'Message': 'No response data'}
+                except FbrAmbiguousSubmission as e:
+                    # FBR may hold this invoice already: never resend it from here
+                    if e.sent:
+                        submissions.append(Submission._prepare_vals(
+                            self, fbr_config['server_url'], payload, attempt + 1, started_at,
+                            time.monotonic() - start, error=str(e)))
+                    self._fbr_mark_ambiguous(str(e))
+                    raise
+                except requests.exceptions.RequestException as e:
+                    error_message = f"Request error (Attempt {attempt + 1}/{max_retries + 1}): {str(e)}"
+                    submissions.append(Submission._prepare_vals(
+                        self, fbr_config['server_url'], payload, attempt + 1, started_at,
+                        time.monotonic() - start, error=error_message))
                     if attempt < max_retries:
-                        _logger.warning("FBR post attempt %d failed: %s. Retrying...", attempt + 1, error_message)
+                        _logger.warning(error_message + ". Retrying...")
+                        fbr_metrics.count_retry('pos.order')
                         continue
                     self.write({
                         'fbr_status': 'failed',
                         'fbr_error_message': error_message,
-                        'fbr_response': json.dumps(response_data, indent=2)
                     })
-                    raise UserError(f"FBR posting failed after {max_retries + 1} attempts: {error_message}")
-            except requests.exceptions.RequestException as e:
-                error_message = f"Request error (Attempt {attempt + 1}/{max_retries + 1}): {str(e)}"
+                    raise UserError(error_message)
+
+                Submission._log_payload("FBR Response", response.text)
+                status_code = response_data.get('validationResponse', {}).get('statusCode')
+                fbr_metrics.count_fbr_status(status_code)
+                error_message = '' if response.status_code == 200 and status_code == '00' else (
+                    response_data.get('Message') or response_data.get('validationResponse', {}).get('message', 'Unknown Error'))
+                if not isinstance(response, ReplayedResponse):
+                    submissions.append(Submission._prepare_vals(
+                        self, fbr_config['server_url'], payload, attempt + 1, started_at, time.monotonic() - start,
+                        response=response, response_data=response_data, error=error_message))
+                if not error_message:
+                    self._fbr_mark_posted(response_data)
+                    self._fbr_notify_status()
+                    return
+                if response.status_code == 429:
+                    # The shared limiter has learned the delay; let the caller reschedule
+                    raise FbrRateLimited(retry_after_of(response))
                 if attempt < max_retries:
-                    _logger.warning(error_message + ". Retrying...")
+                    _logger.warning("FBR post attempt %d failed: %s. Retrying...", attempt + 1, error_message)
+                    fbr_metrics.count_retry('pos.order')
                     continue
                 self.write({
                     'fbr_status': 'failed',
                     'fbr_error_message': error_message,
-                    'fbr_response': ''
                 })
-                raise UserError(error_message)
-            
-    def _prepare_fbr_payload(self, annexure_id):
-        lines = []
-        for line in self.lines:
-            product = line.product_id
-            if product == self.config_id.pos_service_fee_product_id:
-                continue
-
-            hs_code = product.fbr_hs_code.code or ''
-            uom = product.fbr_uom_id.name or 'Pcs'
-            unit_price = line.price_unit
-            quantity = line.qty
-            discount = line.discount or 0.0
-
-            # Line base value
-            value_sales_excluding_st = unit_price * quantity * (1 - discount / 100)
-            total_values = value_sales_excluding_st
-
-            # Use exactly the taxes applied on this POS line (after fiscal position)
-            line_taxes = line.tax_ids_after_fiscal_position
-
-            sales_tax = line_taxes.filtered(lambda t: t.fbr_tax_type == 'sales_tax')
-            extra_tax = line_taxes.filtered(lambda t: t.fbr_tax_type == 'extra_tax')
-            further_tax = line_taxes.filtered(lambda t: t.fbr_tax_type == 'further_tax')
-            fed_tax = line_taxes.filtered(lambda t: t.fbr_tax_type == 'fed_payable')
-            withholding_tax = line_taxes.filtered(lambda t: t.fbr_tax_type == 'withholding_tax')
-
-            # Calculate amounts
-            sales_tax_applicable = value_sales_excluding_st * (sales_tax.amount / 100) if sales_tax else 0.0
-            extra_tax_applicable = value_sales_excluding_st * (extra_tax.amount / 100) if extra_tax else 0.0
-            further_tax_applicable = value_sales_excluding_st * (further_tax.amount / 100) if further_tax else 0.0
-            fed_payable = 0.0
-            if fed_tax and fed_tax.amount_type == 'fixed':
-                fed_payable = fed_tax.amount * quantity
-            elif fed_tax and fed_tax.amount_type == 'percent':
-                fed_payable = value_sales_excluding_st * (fed_tax.amount / 100)
-            withholding_tax_applicable = value_sales_excluding_st * (withholding_tax.amount / 100) if withholding_tax else 0.0
-
-            total_values += (sales_tax_applicable + extra_tax_applicable +
-                            further_tax_applicable + fed_payable +
-                            withholding_tax_applicable)
-
-            rate_display = f"{int(sales_tax.amount)}%" if sales_tax and sales_tax.amount > 0 else "0%"
-            
-
-            lines.append({
-                "itemSNo": len(lines) + 1,
-                "hsCode": hs_code,
-                "productDescription": product.name or 'Test Item',
-                "unitPrice": round(unit_price, 2),
-                "rate": rate_display,
-                "uoM": uom,
-                "quantity": quantity,
-                "totalValues": round(total_values, 2),
-                "valueSalesExcludingST": round(value_sales_excluding_st, 2),
-                "fixedNotifiedValueOrRetailPrice": round(value_sales_excluding_st, 2),
-                "salesTaxApplicable": round(sales_tax_applicable, 2),
-                "salesTaxWithheldAtSource": round(withholding_tax_applicable, 2),
-                "extraTax": round(extra_tax_applicable, 2),
-                "furtherTax": round(further_tax_applicable, 2),
-                "sroScheduleNo": product.fbr_sro_id.name or '',
-                "fedPayable": round(fed_payable, 2),
-                "discount": round(discount, 2),
-                "saleType": product.fbr_sale_type_id.name or '',
-                "sroItemSerialNo": product.fbr_sro_item_id.name
-            })
+                raise UserError(f"FBR posting failed after {max_retries + 1} attempts: {error_message}")
+        finally:
+            Submission._record(submissions)
+
+    def _prepare_fbr_invoice_payloads(self):
+        """Build the complete FBR invoice payload of every order in ``self``, keyed by order id."""
+        items_by_order = self._prepare_fbr_items()
+        self.partner_id.state_id.mapped('name')
+        self.payment_ids.payment_method_id.mapped('name')
+        invoice_date = fields.Date.today().strftime('%Y-%m-%d')
+
+        payloads = {}
+        for order in self:
+            fbr_config = order._get_fbr_config()
+            partner = order.partner_id
+            total_invoice_amount = round(order.amount_total + fbr_config['pos_server_fee'], 2)
+            payloads[order.id] = {
+                "invoiceType": "Sale Invoice",
+                "invoiceDate": invoice_date,
+                "invoiceRefNo": order.name,
+                "sellerBusinessName": fbr_config['seller_business_name'],
+                "sellerProvince": fbr_config['seller_province'],
+                "sellerAddress": fbr_config['seller_address'],
+                "sellerNTNCNIC": order.config_id.seller_ntn_cnic or '',
+                "buyerNTNCNIC": partner.vat or '',
+                "buyerBusinessName": partner.name or 'Walking Customer',
+                "buyerProvince": partner.state_id.name or 'Punjab',
+                "buyerAddress": partner.street or 'Faisalabad',
+                "buyerRegistrationType": 'Registered' if partner.vat else 'Unregistered',
+                "paymentMode": order.payment_ids[0].payment_method_id.name if order.payment_ids else 'Cash',
+                "totalInvoiceAmount": total_invoice_amount,
+                "totalSalesTax": round(order.amount_tax, 2),
+                "posServerFee": round(fbr_config['pos_server_fee'], 2),
+                "items": items_by_order[order.id],
+                "scenarioId": order._get_scenario_id(),  # Always include scenarioId
+            }
+        return payloads
+
+    def _prefetch_fbr_lines(self):
+        """Load the lines, products and taxes of ``self`` in a fixed number of queries.
+
+        fbr.option values are not read here, they come from the cached
+        catalog (see ``fbr.option._resolve``).
+
+        Returns the lines and a map of tax id to its ``(fbr_tax_type, amount, amount_type)``,
+        as expected by :func:`fbr_tax_engine.build_tax_matrix`.
+        """
+        lines = self.lines
+        lines.fetch(['order_id', 'product_id', 'price_unit', 'qty', 'discount', 'tax_ids'])
+        templates = lines.product_id.product_tmpl_id
+        templates.fetch([
+            'name', 'scenario_id', 'fbr_hs_code', 'fbr_uom_id',
+            'fbr_sro_id', 'fbr_sale_type_id', 'fbr_sro_item_id',
+        ])
+        taxes = lines.tax_ids_after_fiscal_position
+        taxes.fetch(['fbr_tax_type', 'amount', 'amount_type'])
+        tax_info = {tax.id: (tax.fbr_tax_type, tax.amount, tax.amount_type) for tax in taxes}
+        return lines, tax_info
+
+    def _fbr_client_data(self):
+        """The ``{'scenarioId', 'items'}`` sent by the POS client, or an empty dict."""
+        self.ensure_one()
+        try:
+            data = json.loads(self.fbr_pos_items or '{}')
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _fbr_item_lines(self):
+        """Lines of every order in ``self`` that become FBR items, keyed by order id, and the tax
+        info of :meth:`_prefetch_fbr_lines`. The POS service fee line is not an item.
+        """
+        lines, tax_info = self._prefetch_fbr_lines()
+        lines_by_order = {order.id: [] for order in self}
+        for line in lines:
+            if line.product_id != line.order_id.config_id.pos_service_fee_product_id:
+                lines_by_order[line.order_id.id].append(line)
+        return lines_by_order, tax_info
 
-        return {'Items': lines}
+    @api.model
+    def _fbr_item_labels(self, product, sales_tax_rate):
+        """Text values of the FBR item of ``product``, codes coming from the cached fbr.option catalog."""
+        Option = self.env['fbr.option']
+        return {
+            "hsCode": Option._resolve('hscode', product.fbr_hs_code.id)[0] or '',
+            "productDescription": product.name or 'Test Item',
+            "rate": f"{int(sales_tax_rate)}%" if sales_tax_rate > 0 else "0%",
+            "uoM": Option._resolve('uom', product.fbr_uom_id.id)[1] or 'Pcs',
+            "sroScheduleNo": Option._resolve('sro', product.fbr_sro_id.id)[1] or '',
+            "saleType": Option._resolve('sale_type', product.fbr_sale_type_id.id)[1] or '',
+            "sroItemSerialNo": Option._resolve('sro_item', product.fbr_sro_item_id.id)[1],
+        }
+
+    def _fbr_validated_client_items(self, lines, tax_info):
+        """The client-built items of the order if they agree with its item ``lines``, else None.
+
+        A cheap check against the loaded lines, without computing the
+        document: one item per line, with the line's codes, quantity, unit
+        price and discount, and amounts matching the line's FBR tax rates
+        within a few cents of rounding. Only the orders failing it get their
+        items built on the server.
+        """
+        self.ensure_one()
+        items = self._fbr_client_data().get('items')
+        if not isinstance(items, list) or len(items) != len(lines):
+            return None
+        tax_matrix = fbr_tax_engine.build_tax_matrix(
+            [line.tax_ids_after_fiscal_position.ids for line in lines],
+            tax_info,
+            apply_further_tax=not self.partner_id.vat,
+        )
+        tax_columns = ('salesTaxApplicable', 'extraTax', 'furtherTax', 'fedPayable', 'salesTaxWithheldAtSource')
+        percent_columns = (fbr_tax_engine.SALES_TAX, fbr_tax_engine.EXTRA_TAX, fbr_tax_engine.FURTHER_TAX,
+                           fbr_tax_engine.FED_PERCENT, fbr_tax_engine.WITHHOLDING_TAX)
+        for index, (item, line, rates) in enumerate(zip(items, lines, tax_matrix)):
+            if not isinstance(item, dict) or not FBR_ITEM_KEYS <= item.keys():
+                return None
+            labels = self._fbr_item_labels(line.product_id, rates[fbr_tax_engine.SALES_TAX])
+            if any(str(item[key] or '') != str(value or '') for key, value in labels.items()):
+                return None
+            base = line.price_unit * line.qty * (1 - (line.discount or 0.0) / 100)
+            taxes = (base * sum(rates[column] for column in percent_columns) / 100
+                     + line.qty * rates[fbr_tax_engine.FED_FIXED])
+            try:
+                amounts = {key: float(item[key]) for key in ('itemSNo', 'quantity', 'unitPrice', 'discount',
+                                                             'valueSalesExcludingST', 'totalValues') + tax_columns}
+            except (TypeError, ValueError):
+                return None
+            # Each column is rounded to cents on the client, their sums may be off by a few
+            checks = (
+                (amounts['itemSNo'], index + 1, 0),
+                (amounts['quantity'], line.qty, 1e-6),
+                (amounts['unitPrice'], line.price_unit, 0.01),
+                (amounts['discount'], line.discount or 0.0, 0.01),
+                (amounts['valueSalesExcludingST'], base, 0.01),
+                (amounts['salesTaxApplicable'], base * rates[fbr_tax_engine.SALES_TAX] / 100, 0.01),
+                (sum(amounts[key] for key in tax_columns), taxes, 0.05),
+                (amounts['totalValues'], base + taxes, 0.05),
+            )
+            if any(abs(value - expected) > tolerance for value, expected, tolerance in checks):
+                return None
+        return items
+
+    def _prepare_fbr_items(self):
+        """FBR item list of every order in ``self``, keyed by order id.
+
+        Uses the items built by the POS client, as printed on its receipt,
+        when they agree with the order lines, and builds them on the server
+        otherwise.
+        """
+        lines_by_order, tax_info = self._fbr_item_lines()
+        items_by_order = {}
+        for order in self.filtered('fbr_pos_items'):
+            items = order._fbr_validated_client_items(lines_by_order[order.id], tax_info)
+            if items is None:
+                _logger.info("FBR items sent by the POS for %s do not match its lines, using the server ones", order.name)
+            else:
+                items_by_order[order.id] = items
+        to_build = self.filtered(lambda order: order.id not in items_by_order)
+        items_by_order.update(to_build._build_fbr_items(lines_by_order, tax_info))
+        return items_by_order
+
+    def _build_fbr_items(self, lines_by_order=None, tax_info=None):
+        """Build the FBR item list of every order in ``self`` from products and taxes, keyed by order id.
+
+        ``lines_by_order`` and ``tax_info`` are those of :meth:`_fbr_item_lines`,
+        loaded here when not given.
+        """
+        if lines_by_order is None:
+            lines_by_order, tax_info = self._fbr_item_lines()
+
+        items_by_order = {}
+        for order in self:
+            order_lines = lines_by_order[order.id]
+            # Further tax only applies to unregistered buyers
+            tax_matrix = fbr_tax_engine.build_tax_matrix(
+                [line.tax_ids_after_fiscal_position.ids for line in order_lines],
+                tax_info,
+                apply_further_tax=not order.partner_id.vat,
+            )
+            amounts, _totals = fbr_tax_engine.compute_document(
+                [line.price_unit for line in order_lines],
+                [line.qty for line in order_lines],
+                [line.discount or 0.0 for line in order_lines],
+                tax_matrix,
+            )
+            items = []
+            for index, line in enumerate(order_lines):
+                labels = self._fbr_item_labels(line.product_id, tax_matrix[index][fbr_tax_engine.SALES_TAX])
+                items.append({
+                    "itemSNo": index + 1,
+                    "hsCode": labels['hsCode'],
+                    "productDescription": labels['productDescription'],
+                    "unitPrice": round(line.price_unit, 2),
+                    "rate": labels['rate'],
+                    "uoM": labels['uoM'],
+                    "quantity": line.qty,
+                    "totalValues": amounts['total_values'][index],
+                    "valueSalesExcludingST": amounts['value_sales_excluding_st'][index],
+                    "fixedNotifiedValueOrRetailPrice": amounts['value_sales_excluding_st'][index],
+                    "salesTaxApplicable": amounts['sales_tax_applicable'][index],
+                    "salesTaxWithheldAtSource": amounts['withholding_tax_applicable'][index],
+                    "extraTax": amounts['extra_tax_applicable'][index],
+                    "furtherTax": amounts['further_tax_applicable'][index],
+                    "sroScheduleNo": labels['sroScheduleNo'],
+                    "fedPayable": amounts['fed_payable'][index],
+                    "discount": round(line.discount or 0.0, 2),
+                    "saleType": labels['saleType'],
+                    "sroItemSerialNo": labels['sroItemSerialNo'],
+                })
+            items_by_order[order.id] = items
+        return items_by_order
+
+    def _fbr_prepare_bulk_jobs(self):
+        jobs, errors = {}, {}
+        # Like _post_to_fbr, orders of configs without e-invoicing are silently left out
+        to_post = self.filtered(lambda o: o.config_id.enable_fbr_integration is not None and o.config_id.e_invoicing)
+        try:
+            payloads = to_post._prepare_fbr_invoice_payloads()
+        except Exception:
+            # Find the culprits one by one so the rest of the batch still goes out
+            payloads = {}
+            for order in to_post:
+                try:
+                    payloads.update(order._prepare_fbr_invoice_payloads())
+                except Exception as e:
+                    errors[order.id] = str(e)
+        for order in to_post.filtered(lambda o: o.id in payloads):
+            jobs[order.id] = (order._get_fbr_config(), payloads[order.id])
+        return jobs, errors
 
+    def _prepare_fbr_payload(self, annexure_id):
+        self.ensure_one()
+        return {'Items': self._prepare_fbr_items()[self.id]}
 
     def _add_pos_service_fee(self):
         """Add POS Service Fee to order if fbr_pos_server_fee is set and e_invoicing is enabled."""
@@ -301,7 +482,78 @@ class PosOrder(models.Model):
 
     def action_retry_fbr_post(self):
         for order in self:
-            order._post_to_fbr(max_retries=2)
+            try:
+                order._post_to_fbr(max_retries=2)
+            except FbrDeferred as e:
+                raise UserError(str(e))
+
+    def _fbr_status_data(self):
+        return {
+            'id': self.id,
+            'uuid': self.uuid,
+            'fbr_status': self.fbr_status,
+            'fbr_invoice_number': self.fbr_invoice_number or '',
+            'fbr_error_message': self.fbr_error_message or '',
+        }
+
+    def _fbr_notify_status(self):
+        """Push the FBR status of these orders to the open POS sessions of their configs."""
+        for config, orders in self.grouped('config_id').items():
+            config._notify(('FBR_STATUS', {'orders': [order._fbr_status_data() for order in orders]}))
+
+    @api.model
+    def get_fbr_status(self, order_ids=None, uuids=None):
+        """FBR status and number of many orders, by id or uuid, in a single query."""
+        if not order_ids and not uuids:
+            return []
+        domain = expression.OR([
+            [('id', 'in', order_ids or [])],
+            [('uuid', 'in', uuids or [])],
+        ])
+        orders = self.search_fetch(domain, ['uuid', 'fbr_status', 'fbr_invoice_number', 'fbr_error_message'])
+        return [order._fbr_status_data() for order in orders]
+
+    @api.model
+    def post_fbr_within_deadline(self, order_id):
+        """Try to post a just paid order before its receipt prints.
+
+        The POS waits at most the fbr_receipt_deadline_ms of its config for
+        the answer, then prints the receipt as pending. Here the deadline
+        only bounds the time before the invoice reaches the gateway: no send
+        starts past it and connecting is cut at it, after which the order is
+        left queued in the outbox. A send on the wire finishes under the
+        normal timeouts, and its FBR number is pushed to the POS over the
+        bus once accepted, since cutting it short would leave FBR's answer
+        unknown.
+
+        A send that still ends ambiguously, e.g. on the read timeout, may
+        have been accepted by FBR, so such an order is not retried by the
+        outbox like an ordinary failure: it is flagged for reconciliation
+        and its outbox entry waits for the gateway lookup, or for an
+        operator when there is none.
+        """
+        order = self.browse(order_id).exists()
+        if not order:
+            return {}
+        deadline = order.config_id.fbr_receipt_deadline_ms
+        if order.fbr_status == 'posted' or not order.config_id.e_invoicing or deadline <= 0:
+            return order._fbr_status_data()
+        try:
+            with self.env.cr.savepoint():
+                order.with_context(
+                    fbr_deadline=time.monotonic() + deadline / 1000.0,
+                )._post_to_fbr(max_retries=0)
+        except FbrAmbiguousSubmission as e:
+            # The savepoint dropped the flag set by _post_to_fbr
+            order.invalidate_recordset()
+            order._fbr_mark_ambiguous(str(e))
+            order.sudo().fbr_outbox_ids.filtered(lambda entry: entry.state == 'pending')._record_ambiguous(str(e))
+            _logger.warning("FBR posting of %s ended ambiguously, parked for reconciliation: %s", order.name, e)
+        except Exception as e:
+            # Whatever the reason, the outbox owns the order from here on
+            order.invalidate_recordset()
+            _logger.info("FBR posting of %s not sent within %d ms, left to the outbox: %s", order.name, deadline, e)
+        return order._fbr_status_data()
 
     @api.model
     def send_order_to_fbr(self, order_id):
@@ -1,20 +1,21 @@
-from odoo import models, fields, api
+from odoo import models, api
 
 class ProductProduct(models.Model):
     _inherit = 'product.product'
 
-    @api.depends("taxes_id", "taxes_id.fbr_tax_type", "taxes_id.fbr_rate_id")
-    def _compute_fbr_rate_id(self):
-        for rec in self:
-            sales_tax = rec.taxes_id.filtered(
-                lambda t: t.fbr_tax_type == 'sales_tax' and t.fbr_rate_id
-            )
-            rec.fbr_rate_id = sales_tax[:1].fbr_rate_id if sales_tax else False
-
     @api.onchange("taxes_id")
     def _onchange_taxes_id_set_fbr_rate(self):
         for rec in self:
             sales_tax = rec.taxes_id.filtered(
                 lambda t: t.fbr_tax_type == 'sales_tax' and t.fbr_rate_id
             )
-            rec.fbr_rate_id = sales_tax[:1].fbr_rate_id if sales_tax else False
\ No newline at end of file
+            rec.fbr_rate_id = sales_tax[:1].fbr_rate_id if sales_tax else False
+
+    @api.model
+    def _load_pos_data_fields(self, config_id):
+        fields_list = super()._load_pos_data_fields(config_id)
+        if not fields_list:
+            return fields_list
+        return fields_list + [
+            'fbr_pos_hs_code', 'fbr_pos_uom', 'fbr_pos_sale_type', 'fbr_pos_sro', 'fbr_pos_sro_item', 'scenario_id',
+        ]
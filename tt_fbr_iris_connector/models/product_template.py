@@ -1,12 +1,22 @@
 from odoo import models, fields, api
-import requests
 import logging
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from odoo.osv import expression
-from datetime import datetime, timedelta
+from odoo.tools import SQL, ormcache
+from odoo.tools.sql import create_index
+
+from ..tools import fbr_cache_stamp
+from ..tools.fbr_catalog_fetcher import FbrCatalogFetcher
+from ..tools.fbr_client import FbrClient
 
 _logger = logging.getLogger(__name__)
 
+# Catalog types dereferenced while building payloads, loaded at worker start
+PRELOADED_TYPES = ('hscode', 'uom', 'sale_type', 'rate', 'sro', 'sro_item', 'sro_item_general')
+
+# Per-process counters of fbr.option lookups; a miss is a catalog (re)load from SQL
+_lookup_stats = {'lookups': 0, 'misses': 0}
+
 class FbrOption(models.Model):
     _name = "fbr.option"
     _description = "FBR API Option Cache"
@@ -26,23 +36,172 @@ class FbrOption(models.Model):
     ], required=True, index=True)
     buyer_ntn = fields.Char(string="Buyer NTN")
     parent_sro_id = fields.Many2one('fbr.option', string="Parent SRO Schedule", domain=[('type', '=', 'sro')])
+    active = fields.Boolean(string="Active", default=True)
     last_updated = fields.Datetime(string="Last Updated", default=fields.Datetime.now)
 
-    @api.depends('name', 'code')
-    def _compute_display_name(self):
+    complete_name = fields.Char(string="Complete Name", compute="_compute_complete_name", store=True)
+
+    def init(self):
+        """Index code prefixes and description trigrams per type for typeahead search."""
+        cr = self.env.cr
+        create_index(cr, 'fbr_option_type_code_prefix_index', self._table,
+                     ['type', 'code text_pattern_ops'])
+        if not self.env.registry.has_trigram:
+            try:
+                with cr.savepoint(flush=False):
+                    cr.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            except Exception:
+                _logger.warning("pg_trgm is not available, fbr.option description search will not be indexed")
+                return
+        create_index(cr, 'fbr_option_hscode_name_trgm_index', self._table,
+                     ['(name::text) gin_trgm_ops'], method='gin', where="type = 'hscode'")
+
+    @api.depends('type', 'name', 'code')
+    def _compute_complete_name(self):
         for record in self:
             if record.type == 'hscode':
-                record.display_name = f"{record.code} - {record.name[:70]}" if record.code else record.name
+                record.complete_name = f"{record.code} - {record.name[:70]}" if record.code else record.name
             else:
-                record.display_name = record.name
+                record.complete_name = record.name
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self._clear_catalog_cache(set(records.mapped('type')))
+        return records
+
+    def write(self, vals):
+        opt_types = set(self.mapped('type')) if {'code', 'name', 'type', 'active'} & set(vals) else set()
+        res = super().write(vals)
+        if opt_types:
+            self._clear_catalog_cache(opt_types | set(self.mapped('type')))
+        return res
+
+    def unlink(self):
+        opt_types = set(self.mapped('type'))
+        res = super().unlink()
+        self._clear_catalog_cache(opt_types)
+        return res
+
+    @api.model
+    def _clear_catalog_cache(self, opt_types):
+        """Drop the cached catalogs of ``opt_types`` in every worker, by bumping their stamps.
+
+        A catalog sync (``fbr_catalog_sync`` context key) does it once per
+        synced set of options instead of once per written batch.
+        """
+        if not self.env.context.get('fbr_catalog_sync'):
+            fbr_cache_stamp.bump(self.env, [fbr_cache_stamp.catalog_scope(opt_type) for opt_type in opt_types])
+
+    def _rename(self, names, now):
+        """Rename and reactivate many options in one UPDATE; ``names`` maps option id to its new name."""
+        ids = list(names)
+        self.flush_model(['name', 'active', 'last_updated'])
+        self.env.cr.execute("""
+            UPDATE fbr_option o
+               SET name = r.name, active = TRUE, last_updated = %s,
+                   write_uid = %s, write_date = now() at time zone 'UTC'
+              FROM unnest(%s::int[], %s::varchar[]) AS r(id, name)
+             WHERE o.id = r.id
+        """, [now, self.env.uid, ids, [names[option_id] for option_id in ids]])
+        options = self.browse(ids)
+        options.invalidate_recordset(['name', 'active', 'last_updated', 'write_uid', 'write_date'])
+        # Recompute complete_name and drop the cached catalog like write() would
+        options.modified(['name', 'active'])
+        self._clear_catalog_cache(set(options.mapped('type')))
+
+    def _register_hook(self):
+        """Warm the lookup cache of the hot catalog types when the worker loads the registry."""
+        super()._register_hook()
+        if self.env['ir.config_parameter'].sudo().get_param('fbr.option_cache_preload', 'True').lower() not in ('1', 'true'):
+            return
+        # Loads done ahead of any lookup are not misses, keep them out of the stats
+        misses = _lookup_stats['misses']
+        for opt_type in PRELOADED_TYPES:
+            self._get_catalog(opt_type)
+        _lookup_stats['misses'] = misses
+
+    @api.model
+    def _get_catalog(self, opt_type):
+        """All options of a type as ``{'by_id': {id: (code, name)}, 'by_code': {code: id}}``.
+
+        Cached per worker under the stamp of the type, bumped whenever its
+        options are written.
+        """
+        stamp = fbr_cache_stamp.get(self.env, fbr_cache_stamp.catalog_scope(opt_type))
+        return self._get_catalog_cached(stamp, opt_type)
+
+    @api.model
+    @ormcache('stamp', 'opt_type')
+    def _get_catalog_cached(self, stamp, opt_type):
+        _lookup_stats['misses'] += 1
+        options = self.sudo().with_context(active_test=False).search_fetch(
+            [('type', '=', opt_type)], ['code', 'name', 'active'], order='active, id')
+        by_id = {}
+        by_code = {}
+        for option in options:
+            by_id[option.id] = (option.code, option.name)
+            # Active rows come last and win when an archived code was reused
+            by_code[option.code] = option.id
+        return {'by_id': by_id, 'by_code': by_code}
+
+    @api.model
+    def _resolve(self, opt_type, option_id):
+        """``(code, name)`` of an option by id, or ``(False, False)``."""
+        if not option_id:
+            return (False, False)
+        _lookup_stats['lookups'] += 1
+        return self._get_catalog(opt_type)['by_id'].get(option_id, (False, False))
+
+    @api.model
+    def _resolve_code(self, opt_type, code):
+        """Id of the option with ``code``, or False."""
+        _lookup_stats['lookups'] += 1
+        return self._get_catalog(opt_type)['by_code'].get(code, False)
+
+    @api.model
+    def _get_lookup_stats(self):
+        lookups, misses = _lookup_stats['lookups'], _lookup_stats['misses']
+        return {'lookups': lookups, 'hits': max(lookups - misses, 0), 'misses': misses}
+
+    @api.depends('complete_name')
+    def _compute_display_name(self):
+        for record in self:
+            record.display_name = record.complete_name
 
     @api.model
     def name_search(self, name='', args=None, operator='ilike', limit=100):
+        """Rank exact code matches first, then code prefixes, then description matches.
+
+        Each step is a separate indexed query, so typeahead over the full
+        HS code catalog never falls back to a sequential scan.
+        """
         args = args or []
-        domain = ['|', ('name', operator, name), ('code', operator, name)]
-        domain = expression.AND([domain, args])
-        records = self.search_fetch(domain, ['display_name'], limit=limit)
-        return [(record.id, record.display_name) for record in records]
+        if not name or operator not in ('ilike', 'like'):
+            domain = ['|', ('name', operator, name), ('code', operator, name)] if name else []
+            records = self.search_fetch(expression.AND([domain, args]), ['complete_name'], limit=limit)
+            return [(record.id, record.display_name) for record in records]
+
+        prefix = name.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        steps = [
+            ([('code', '=', name)], 'id'),
+            ([('code', '=like', prefix)], 'code'),
+            ([('name', operator, name)], 'code'),
+        ]
+        results = []
+        found_ids = []
+        for domain, order in steps:
+            if limit and len(results) >= limit:
+                break
+            if found_ids:
+                domain = expression.AND([domain, [('id', 'not in', found_ids)]])
+            records = self.search_fetch(
+                expression.AND([domain, args]), ['complete_name'], order=order,
+                limit=limit - len(results) if limit else None,
+            )
+            found_ids += records.ids
+            results += [(record.id, record.display_name) for record in records]
+        return results
 
 class ProductTemplate(models.Model):
     _inherit = 'product.template'
@@ -56,6 +215,12 @@ class ProductTemplate(models.Model):
     fbr_sro_id = fields.Many2one("fbr.option", string="FBR SRO Schedule", ondelete="set null", domain=[("type", "=", "sro")])
     fbr_sro_item_id = fields.Many2one("fbr.option", string="FBR SRO Item", ondelete="set null", domain=[("type", "=", "sro_item")])
     fbr_general_sro_item_id = fields.Many2one("fbr.option", string="FBR General SRO Item", ondelete="set null", domain=[("type", "=", "sro_item_general")])
+    # Plain FBR values for the POS client, resolved from the cached catalog
+    fbr_pos_hs_code = fields.Char(string="FBR HS Code (POS)", compute="_compute_fbr_pos_values")
+    fbr_pos_uom = fields.Char(string="FBR UOM (POS)", compute="_compute_fbr_pos_values")
+    fbr_pos_sale_type = fields.Char(string="FBR Sale Type (POS)", compute="_compute_fbr_pos_values")
+    fbr_pos_sro = fields.Char(string="FBR SRO Schedule (POS)", compute="_compute_fbr_pos_values")
+    fbr_pos_sro_item = fields.Char(string="FBR SRO Item (POS)", compute="_compute_fbr_pos_values")
 
     scenario_id = fields.Selection(
         selection=[
@@ -94,32 +259,92 @@ class ProductTemplate(models.Model):
         required=True,
     )
 
-    @api.depends("taxes_id", "taxes_id.fbr_tax_type", "taxes_id.fbr_rate_id")
+    # Changes on the taxes themselves are applied in bulk by AccountTax.write
+    # through _fbr_update_rate_ids, not by a per-product ORM recompute
+    @api.depends("taxes_id")
     def _compute_fbr_rate_id(self):
         for rec in self:
             sales_tax = rec.taxes_id.filtered(lambda t: t.fbr_tax_type == 'sales_tax' and t.fbr_rate_id)
             rec.fbr_rate_id = sales_tax[:1].fbr_rate_id if sales_tax else False
 
+    @api.model
+    def _fbr_update_rate_ids(self, condition):
+        """Recompute fbr_rate_id in one UPDATE for the templates matching ``condition``.
+
+        ``condition`` is an SQL expression on the template alias ``chunk``.
+        Applies the rule of _compute_fbr_rate_id: the rate of the first active
+        sales tax, in tax order, that has one. Returns the number of templates
+        whose rate changed.
+        """
+        self.env.flush_all()
+        self.env.cr.execute(SQL("""
+            UPDATE product_template pt
+               SET fbr_rate_id = rate.fbr_rate_id
+              FROM product_template chunk
+         LEFT JOIN LATERAL (
+                    SELECT tax.fbr_rate_id
+                      FROM product_taxes_rel rel
+                      JOIN account_tax tax ON tax.id = rel.tax_id
+                     WHERE rel.prod_id = chunk.id
+                       AND tax.active
+                       AND tax.fbr_tax_type = 'sales_tax'
+                       AND tax.fbr_rate_id IS NOT NULL
+                  ORDER BY tax.sequence, tax.id
+                     LIMIT 1
+                   ) rate ON TRUE
+             WHERE pt.id = chunk.id
+               AND %s
+               AND pt.fbr_rate_id IS DISTINCT FROM rate.fbr_rate_id
+        """, condition))
+        updated = self.env.cr.rowcount
+        if updated:
+            self.invalidate_model(['fbr_rate_id'])
+            self.env['product.product'].invalidate_model(['fbr_rate_id'])
+        return updated
+
+    @api.model
+    def _fbr_update_rate_ids_for_taxes(self, tax_ids):
+        return self._fbr_update_rate_ids(SQL(
+            "chunk.id IN (SELECT prod_id FROM product_taxes_rel WHERE tax_id = ANY(%s))", list(tax_ids)))
+
+    @api.depends("fbr_hs_code", "fbr_uom_id", "fbr_sale_type_id", "fbr_sro_id", "fbr_sro_item_id")
+    def _compute_fbr_pos_values(self):
+        Option = self.env['fbr.option']
+        for rec in self:
+            rec.fbr_pos_hs_code = Option._resolve('hscode', rec.fbr_hs_code.id)[0] or ''
+            rec.fbr_pos_uom = Option._resolve('uom', rec.fbr_uom_id.id)[1] or ''
+            rec.fbr_pos_sale_type = Option._resolve('sale_type', rec.fbr_sale_type_id.id)[1] or ''
+            rec.fbr_pos_sro = Option._resolve('sro', rec.fbr_sro_id.id)[1] or ''
+            rec.fbr_pos_sro_item = Option._resolve('sro_item', rec.fbr_sro_item_id.id)[1] or ''
+
     @api.onchange("taxes_id")
     def _onchange_taxes_id_set_fbr_rate(self):
         for rec in self:
             sales_tax = rec.taxes_id.filtered(lambda t: t.fbr_tax_type == 'sales_tax' and t.fbr_rate_id)
             rec.fbr_rate_id = sales_tax[:1].fbr_rate_id if sales_tax else False
 
-    def _call_fbr_api(self, url, company):
-        """Make an API call with the given company context."""
+    def _get_fbr_client(self, company):
+        """Pooled gateway client for the company's bearer token, or None if not configured."""
         if not company:
             _logger.error("No valid company found for API call.")
-            return []
+            return None
         token = company.fbr_bearer_token
-        # print(token)
         if not token:
             _logger.warning(f"⚠️ FBR Bearer Token not found for company {company.name}.")
+            return None
+        return FbrClient.from_env(self.env, token)
+
+    def _call_fbr_api(self, url, company, client=None):
+        """Make an API call with the given company context.
+
+        Pass a prebuilt ``client`` when calling from worker threads so the
+        ORM is not touched outside the request cursor.
+        """
+        client = client or self._get_fbr_client(company)
+        if not client:
             return []
         try:
-            # Ensure Bearer prefix
-            headers = {"Authorization": f"{token}"}
-            res = requests.get(url, headers=headers, timeout=5)
+            res = client.get(url)
             if res.status_code == 200:
                 return res.json()
             else:
@@ -129,41 +354,91 @@ class ProductTemplate(models.Model):
         return []
 
 
-    def _update_fbr_options(self, records, opt_type, code_key, name_key, parent_sro_id=None):
-        Option = self.env["fbr.option"].sudo()  # Use sudo to bypass access issues
+    def _update_fbr_options(self, records, opt_type, code_key, name_key, parent_sro_id=None, archive_missing=True):
+        """Diff ``records`` against the stored catalog and apply inserts, renames and archiving in bulk.
+
+        ``records`` must be the complete set for the type (or for
+        ``parent_sro_id``) when ``archive_missing`` is set, as codes absent
+        from it are archived. Unchanged content is detected from the hash
+        kept in fbr.option.sync and skipped without reading the catalog.
+        """
+        # Use sudo to bypass access issues; the catalog cache is dropped once below
+        Option = self.env["fbr.option"].sudo().with_context(active_test=False, fbr_catalog_sync=True)
         _logger.debug(f"Updating FBR options for type: {opt_type}")
-        
-        # Fetch existing records in bulk
-        existing_records = Option.search([("type", "=", opt_type)])
-        existing_codes = set(existing_records.mapped("code"))
-        
-        # Prepare new records for bulk creation
-        new_records = []
-        for rec in records:
-            code = str(rec.get(code_key))
+
+        incoming = {}
+        for rec in records or []:
+            code = rec.get(code_key)
             name = rec.get(name_key)
-            if code and name and code not in existing_codes:
-                vals = {
-                    "code": code,
-                    "name": name,
-                    "type": opt_type,
-                    "last_updated": fields.Datetime.now(),
-                }
+            if code not in (None, '') and name:
+                incoming[str(code)] = name
+
+        now = fields.Datetime.now()
+        if archive_missing and not incoming:
+            # An empty answer is a broken call, never a catalog without entries
+            _logger.warning(f"{opt_type} options: empty set received, keeping the stored catalog")
+            return
+        sync_state = None
+        if archive_missing:
+            sync_state = self.env['fbr.option.sync']._get_state(opt_type, parent_sro_id.code if parent_sro_id else '')
+            content_hash = sync_state._compute_hash(list(incoming.items()))
+            if sync_state.content_hash == content_hash:
+                sync_state.last_sync = now
+                _logger.info(f"{opt_type} catalog unchanged, skipping")
+                return
+
+        domain = [("type", "=", opt_type)]
+        if parent_sro_id:
+            domain.append(("parent_sro_id", "=", parent_sro_id.id))
+        existing = {
+            option.code: option
+            for option in Option.search_fetch(domain, ["code", "name", "active"])
+        }
+
+        new_records = []
+        to_reactivate = Option.browse()
+        renames = {}
+        for code, name in incoming.items():
+            option = existing.get(code)
+            if not option:
+                vals = {"code": code, "name": name, "type": opt_type, "last_updated": now}
                 if parent_sro_id:
                     vals['parent_sro_id'] = parent_sro_id.id
                 new_records.append(vals)
-        
-        # Bulk create new records
+                continue
+            if not option.active:
+                to_reactivate |= option
+            if option.name != name:
+                renames[option.id] = name
+
         if new_records:
             Option.create(new_records)
-            _logger.info(f"Added {len(new_records)} new {opt_type} options")
+        if renames:
+            Option._rename(renames, now)
+        if to_reactivate:
+            to_reactivate.filtered(lambda o: not o.active).write({"active": True, "last_updated": now})
+        to_archive = Option.browse()
+        if archive_missing:
+            to_archive = Option.browse([
+                option.id for code, option in existing.items() if option.active and code not in incoming
+            ])
+            if to_archive:
+                to_archive.write({"active": False, "last_updated": now})
+            sync_state.write({
+                'last_sync': now,
+                'content_hash': content_hash,
+                'record_count': len(incoming),
+            })
+        if new_records or renames or to_reactivate or to_archive:
+            self.env['fbr.option'].with_context(fbr_catalog_sync=False)._clear_catalog_cache([opt_type])
+        _logger.info(f"{opt_type} options: {len(new_records)} added, {len(renames)} renamed, "
+                     f"{len(to_reactivate)} restored, {len(to_archive)} archived")
 
     def _check_cache_validity(self, opt_type, max_age_days=7):
         """Check if cached data is recent enough to skip API call."""
-        Option = self.env["fbr.option"].sudo()
-        last_updated = Option.search([("type", "=", opt_type)], limit=1).last_updated
-        if last_updated and (datetime.now() - last_updated).days < max_age_days:
-            _logger.info(f"Using cached {opt_type} data (last updated: {last_updated})")
+        sync_state = self.env['fbr.option.sync']._find_state(opt_type)
+        if sync_state and sync_state._is_fresh(max_age_days):
+            _logger.info(f"Using cached {opt_type} data (last synced: {sync_state.last_sync})")
             return True
         return False
 
@@ -171,7 +446,11 @@ class ProductTemplate(models.Model):
     def load_fbr_static_options(self):
         """Load static dropdown data from FBR API into fbr.option table with optimizations."""
         _logger.info("Starting FBR static options load...")
-        
+        # Every type and SRO is synced on its own and drops only its own cached catalog
+        self._load_fbr_static_options()
+
+    @api.model
+    def _load_fbr_static_options(self):
         # Get the company context, default to the user's company or first accessible company
         company = self.env.company
         if not company or company.id not in self.env.user.company_ids.ids:
@@ -190,10 +469,18 @@ class ProductTemplate(models.Model):
             ("sro_item_general", "https://gw.fbr.gov.pk/pdi/v1/sroitemcode", "srO_ITEM_ID", "srO_ITEM_DESC"),
         ]
 
+        # Resolve credentials up front, worker threads only do HTTP
+        client = self._get_fbr_client(company)
+        if not client:
+            return
+        max_workers = int(self.env['ir.config_parameter'].sudo().get_param('fbr.catalog_max_workers', 10))
+        fetcher = FbrCatalogFetcher(client, fields.Date.today(),
+                                    company.fbr_default_origination_supplier or "1", max_workers=max_workers)
+
         # Parallelize static API calls
         with ThreadPoolExecutor(max_workers=6) as executor:
             future_to_type = {
-                executor.submit(self._call_fbr_api, endpoint, company): (opt_type, code_key, name_key)
+                executor.submit(fetcher.get_list, endpoint): (opt_type, code_key, name_key)
                 for opt_type, endpoint, code_key, name_key in static_endpoints
                 if not self._check_cache_validity(opt_type)
             }
@@ -202,50 +489,46 @@ class ProductTemplate(models.Model):
                 opt_type, code_key, name_key = future_to_type[future]
                 try:
                     data = future.result()
+                    if data is None:
+                        # Keep the stored catalog rather than archiving it on a failed call
+                        continue
                     self._update_fbr_options(data, opt_type, code_key, name_key)
                     _logger.info(f"{opt_type.capitalize()} loaded")
                 except Exception as e:
                     _logger.error(f"Failed to load {opt_type}: {e}")
 
-        # Handle dependent options (rates and SRO schedules)
-                # --- Handle dependent options (Rates & SRO Schedules) ---
-        date = fields.Date.today().strftime("%d-%b-%Y")
-        origination_supplier = company.fbr_default_origination_supplier or "1"
-
+        # --- Handle dependent options (Rates, SRO Schedules & SRO Items) ---
         # Always get sale_types (either from DB or API)
         sale_types = self.env["fbr.option"].sudo().search([("type", "=", "sale_type")])
         if not sale_types:
-            api_sale_types = self._call_fbr_api("https://gw.fbr.gov.pk/pdi/v1/transtypecode", company)
-            self._update_fbr_options(api_sale_types, "sale_type", "transactioN_TYPE_ID", "transactioN_DESC")
+            api_sale_types = fetcher.get_list("https://gw.fbr.gov.pk/pdi/v1/transtypecode")
+            if api_sale_types:
+                self._update_fbr_options(api_sale_types, "sale_type", "transactioN_TYPE_ID", "transactioN_DESC")
             sale_types = self.env["fbr.option"].sudo().search([("type", "=", "sale_type")])
 
-        rate_futures = []
-        sro_futures = []
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            # Fetch rates for each sale type
-            for sale in sale_types:
-                rate_url = f"https://gw.fbr.gov.pk/pdi/v2/SaleTypeToRate?date={date}&transTypeId={sale.code}&originationSupplier={origination_supplier}"
-                rate_futures.append(executor.submit(self._call_fbr_api, rate_url, company))
-
-            # Process rate results & fetch SRO schedules
-            for future in as_completed(rate_futures):
-                rates = future.result() or []
-                self._update_fbr_options(rates, "rate", "ratE_ID", "ratE_DESC")
-                for rate in rates:
-                    rate_id = rate.get("ratE_ID")
-                    if not rate_id:
-                        continue
-                    sro_url = f"https://gw.fbr.gov.pk/pdi/v1/SroSchedule?rate_id={rate_id}&date={date}&origination_supplier_csv={origination_supplier}"
-                    sro_data = self._call_fbr_api(sro_url, company)
-                    if not sro_data:  # 404 or empty response
-                        _logger.debug(f"No SRO schedule found for rate_id={rate_id}")
-                        continue
-                    self._update_fbr_options(sro_data, "sro", "srO_ID", "srO_DESC")
-            # Process SRO schedules
-            for future in as_completed(sro_futures):
-                sros = future.result()
-                self._update_fbr_options(sros, "sro", "srO_ID", "srO_DESC")
+        catalog = fetcher.fetch(sale_types.mapped("code"))
+        _logger.info(f"Fetched {len(catalog.rates)} rates, {len(catalog.sros)} SRO schedules "
+                     f"and {len(catalog.sro_items)} SRO item lists in {catalog.calls} calls")
 
+        # A failed call leaves the set incomplete, so only archive from complete sets
+        self._update_fbr_options(
+            [{"code": code, "name": name} for code, name in catalog.rates.items()],
+            "rate", "code", "name", archive_missing='rate' not in catalog.failed,
+        )
+        self._update_fbr_options(
+            [{"code": code, "name": name} for code, name in catalog.sros.items()],
+            "sro", "code", "name", archive_missing=not catalog.failed,
+        )
+        sro_options = {
+            option.code: option
+            for option in self.env["fbr.option"].sudo().search_fetch([("type", "=", "sro")], ["code"])
+        }
+        for sro_code, items in catalog.sro_items.items():
+            if sro_code in sro_options:
+                self._update_fbr_options(
+                    [{"code": code, "name": name} for code, name in items.items()],
+                    "sro_item", "code", "name", parent_sro_id=sro_options[sro_code],
+                )
 
         _logger.info("All static and dependent options loaded successfully!")
 
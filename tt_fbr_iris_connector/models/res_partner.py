@@ -1,6 +1,11 @@
 from odoo import models, fields, api
-import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from ..tools.fbr_client import FbrClient
+from ..tools.fbr_errors import FbrDeferred
+from ..tools.fbr_rate_limiter import retry_after_of
 
 _logger = logging.getLogger(__name__)
 
@@ -37,38 +42,98 @@ class ResPartner(models.Model):
         string='FBR Registration Type',
         help='Type of registration with the Federal Board of Revenue (FBR).',readonly=True
     )
-    def check_fbr_registration(self):
-        token = self.env.company.fbr_bearer_token
-        if not token:
-            _logger.warning("⚠️ FBR Bearer Token not found in company settings.")
-            return []
-        url = "https://gw.fbr.gov.pk/dist/v1/Get_Reg_Type"
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-        
-        for partner in self:
-            if not partner.ntn:
-                _logger.warning(f"Partner {partner.name} has no NTN to check with FBR.")
-                continue
-            
-            payload = {"Registration_No": partner.ntn}
-            try:
-                _logger.info(f"Calling FBR API for NTN: {partner.ntn}")
-                response = requests.post(url, json=payload, headers=headers, timeout=10)
-                if response.status_code == 200:
-                    data = response.json()
-                    reg_type = data.get("REGISTRATION_TYPE", "").lower()
-                    if reg_type == "registered":
-                        partner.fbr_registration_type = 'Registered'
-                    elif reg_type == "unregistered":
-                        partner.fbr_registration_type = 'Unregistered'
-                    else:
-                        partner.fbr_registration_type = False
-                    _logger.info(f"Updated FBR registration type for {partner.ntn}: {partner.fbr_registration_type}")
-                else:
-                    _logger.error(f"FBR API call failed with code {response.status_code}: {response.text}")
-            except Exception as e:
-                _logger.exception(f"Exception during FBR API call for NTN {partner.ntn}: {e}")
+    def _fetch_fbr_registration(self, client, url, ntn):
+        """Look up one NTN on the gateway; runs in worker threads and must not touch the ORM.
+
+        Returns 'Registered', 'Unregistered', False when FBR has no
+        registration for it, or None on a transient error (not cached).
+        Raises FbrDeferred when the rate limiter, the circuit breaker or a
+        429 holds the lookup back.
+        """
+        try:
+            _logger.info(f"Calling FBR API for NTN: {ntn}")
+            response = client.post(url, {"Registration_No": ntn})
+            if response.status_code == 429:
+                raise FbrDeferred(retry_after_of(response))
+            if response.status_code == 200:
+                reg_type = response.json().get("REGISTRATION_TYPE", "").lower()
+                if reg_type == "registered":
+                    return 'Registered'
+                if reg_type == "unregistered":
+                    return 'Unregistered'
+                return False
+            if response.status_code == 404:
+                return False
+            _logger.error(f"FBR API call failed with code {response.status_code}: {response.text}")
+        except FbrDeferred:
+            raise
+        except Exception as e:
+            _logger.exception(f"Exception during FBR API call for NTN {ntn}: {e}")
+        return None
+
+    def check_fbr_registration(self, force=False):
+        """Update the FBR registration type of the partners in ``self``.
+
+        Served from fbr.registration.cache when fresh; the remaining NTNs are
+        looked up concurrently and the results written back in one batch.
+        Checking several NTNs draws from the background budget of the rate
+        limiter, unless the caller set ``fbr_traffic``. NTNs whose lookup
+        is deferred are left uncached and the refresh cron is triggered
+        for when the gateway accepts calls again.
+        """
+        for partner in self.filtered(lambda p: not p.ntn):
+            _logger.warning(f"Partner {partner.name} has no NTN to check with FBR.")
+        partners = self.filtered('ntn')
+        if not partners:
+            return {}
+        Cache = self.env['fbr.registration.cache']
+        ntns = set(partners.mapped('ntn'))
+        results = {} if force else Cache._lookup(ntns)
+
+        missing = ntns - set(results)
+        if missing:
+            token = self.env.company.fbr_bearer_token
+            if not token:
+                _logger.warning("⚠️ FBR Bearer Token not found in company settings.")
+            else:
+                url = "https://gw.fbr.gov.pk/dist/v1/Get_Reg_Type"
+                ICP = self.env['ir.config_parameter'].sudo()
+                lookup = self
+                if len(missing) > 1 and 'fbr_traffic' not in self.env.context:
+                    # A bulk check must not eat the budget of cashiers and invoice posting
+                    lookup = self.with_context(fbr_traffic='background',
+                                               fbr_rate_wait=float(ICP.get_param('fbr.rate_limit_max_wait', 5)))
+                client = FbrClient.from_env(lookup.env, token)
+                max_workers = int(ICP.get_param('fbr.registration_max_workers', 8))
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    futures = {ntn: executor.submit(self._fetch_fbr_registration, client, url, ntn) for ntn in missing}
+                fetched = {}
+                retry_after = None
+                for ntn, future in futures.items():
+                    try:
+                        reg_type = future.result()
+                    except FbrDeferred as e:
+                        retry_after = max(retry_after or 0.0, e.retry_after)
+                        continue
+                    if reg_type is not None:
+                        fetched[ntn] = reg_type
+                Cache._store(fetched)
+                results.update(fetched)
+                if retry_after is not None:
+                    _logger.warning("FBR registration lookup deferred for %.0f seconds, rescheduling", retry_after)
+                    self.env.ref('tt_fbr_iris_connector.ir_cron_fbr_registration_refresh')._trigger(
+                        at=fields.Datetime.now() + timedelta(seconds=retry_after))
+
+        # One write per registration type instead of one per partner
+        by_type = {}
+        for partner in partners:
+            if partner.ntn in results and partner.fbr_registration_type != (results[partner.ntn] or False):
+                by_type.setdefault(results[partner.ntn] or False, []).append(partner.id)
+        for registration_type, partner_ids in by_type.items():
+            self.browse(partner_ids).write({'fbr_registration_type': registration_type})
+        _logger.info("Updated FBR registration type of %s partners", sum(len(ids) for ids in by_type.values()))
+        return results
 
+    def action_verify_fbr_registration(self):
+        self.check_fbr_registration(force=True)
+        return True
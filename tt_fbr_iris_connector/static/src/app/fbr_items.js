@@ -0,0 +1,115 @@
+/** @odoo-module **/
+
+import { PosOrder } from "@point_of_sale/app/models/pos_order";
+import { PosOrderline } from "@point_of_sale/app/models/pos_order_line";
+import { PaymentScreen } from "@point_of_sale/app/screens/payment_screen/payment_screen";
+import { patch } from "@web/core/utils/patch";
+
+// Same rules as tools/fbr_tax_engine.py, the server checks the result against the order lines
+const TAX_COLUMNS = ["sales_tax", "extra_tax", "further_tax", "fed_percent", "fed_fixed", "withholding_tax"];
+
+function round2(value) {
+    return Math.round(value * 100) / 100;
+}
+
+function classifyTax(tax) {
+    if (tax.fbr_tax_type === "fed_payable") {
+        return tax.amount_type === "fixed" ? "fed_fixed" : tax.amount_type === "percent" ? "fed_percent" : null;
+    }
+    return TAX_COLUMNS.includes(tax.fbr_tax_type) ? tax.fbr_tax_type : null;
+}
+
+patch(PosOrderline.prototype, {
+    /**
+     * FBR rate of each tax column; only the first tax of each FBR type counts.
+     */
+    getFbrTaxRates(applyFurtherTax) {
+        const rates = Object.fromEntries(TAX_COLUMNS.map((column) => [column, 0]));
+        const seen = new Set();
+        for (const tax of this.tax_ids || []) {
+            const column = classifyTax(tax);
+            if (!column) {
+                continue;
+            }
+            const kind = column === "fed_fixed" ? "fed_percent" : column;
+            if (seen.has(kind)) {
+                continue;
+            }
+            seen.add(kind);
+            rates[column] = tax.amount;
+        }
+        if (!applyFurtherTax) {
+            rates.further_tax = 0;
+        }
+        return rates;
+    },
+
+    getFbrItem(serial, applyFurtherTax) {
+        const product = this.product_id;
+        const rates = this.getFbrTaxRates(applyFurtherTax);
+        const discount = this.discount || 0;
+        const base = this.price_unit * this.qty * (1 - discount / 100);
+        const sales = (base * rates.sales_tax) / 100;
+        const extra = (base * rates.extra_tax) / 100;
+        const further = (base * rates.further_tax) / 100;
+        const fed = (base * rates.fed_percent) / 100 + this.qty * rates.fed_fixed;
+        const withholding = (base * rates.withholding_tax) / 100;
+        return {
+            itemSNo: serial,
+            hsCode: product.fbr_pos_hs_code || "",
+            productDescription: product.name || "Test Item",
+            unitPrice: round2(this.price_unit),
+            rate: rates.sales_tax > 0 ? `${Math.trunc(rates.sales_tax)}%` : "0%",
+            uoM: product.fbr_pos_uom || "Pcs",
+            quantity: this.qty,
+            totalValues: round2(base + sales + extra + further + fed + withholding),
+            valueSalesExcludingST: round2(base),
+            fixedNotifiedValueOrRetailPrice: round2(base),
+            salesTaxApplicable: round2(sales),
+            salesTaxWithheldAtSource: round2(withholding),
+            extraTax: round2(extra),
+            furtherTax: round2(further),
+            sroScheduleNo: product.fbr_pos_sro || "",
+            fedPayable: round2(fed),
+            discount: round2(discount),
+            saleType: product.fbr_pos_sale_type || "",
+            sroItemSerialNo: product.fbr_pos_sro_item || "",
+        };
+    },
+});
+
+patch(PosOrder.prototype, {
+    getFbrScenarioId() {
+        const registered = Boolean(this.partner_id?.vat);
+        const scenario = this.lines[0]?.product_id?.scenario_id;
+        if (scenario === "SN001") {
+            return registered ? scenario : "SN002";
+        }
+        return scenario || (registered ? "SN001" : "SN002");
+    },
+
+    /**
+     * Scenario and FBR items of the order, as the server would build them.
+     */
+    getFbrClientData() {
+        const fee = this.config.pos_service_fee_product_id;
+        const feeId = fee?.id ?? fee;
+        const applyFurtherTax = !this.partner_id?.vat;
+        const lines = this.lines.filter((line) => !feeId || line.product_id?.id !== feeId);
+        return {
+            scenarioId: this.getFbrScenarioId(),
+            items: lines.map((line, index) => line.getFbrItem(index + 1, applyFurtherTax)),
+        };
+    },
+});
+
+patch(PaymentScreen.prototype, {
+    async validateOrder(isForceValidate) {
+        const order = this.currentOrder;
+        if (this.pos.config.e_invoicing && order) {
+            // Sent with the order sync, so the server only has to check them
+            order.fbr_pos_items = JSON.stringify(order.getFbrClientData());
+        }
+        return super.validateOrder(...arguments);
+    },
+});
@@ -0,0 +1,92 @@
+/** @odoo-module **/
+
+import { PosStore } from "@point_of_sale/app/store/pos_store";
+import { PaymentScreen } from "@point_of_sale/app/screens/payment_screen/payment_screen";
+import { patch } from "@web/core/utils/patch";
+import { _t } from "@web/core/l10n/translation";
+
+patch(PosStore.prototype, {
+    async setup() {
+        await super.setup(...arguments);
+        // FBR numbers of queued orders arrive later, pushed by the server once posted
+        this.data.connectWebSocket("FBR_STATUS", (payload) => this.applyFbrStatus(payload.orders || []));
+        this.syncFbrStatus();
+    },
+
+    applyFbrStatus(statuses, notify = true) {
+        const orders = this.models["pos.order"].getAll();
+        for (const status of statuses) {
+            const order = orders.find((o) => o.uuid === status.uuid || o.id === status.id);
+            if (
+                !order ||
+                (order.fbr_status === status.fbr_status &&
+                    order.fbr_invoice_number === status.fbr_invoice_number)
+            ) {
+                continue;
+            }
+            order.fbr_invoice_number = status.fbr_invoice_number;
+            order.fbr_status = status.fbr_status;
+            if (notify && status.fbr_status === "posted" && status.fbr_invoice_number) {
+                this.notification.add(
+                    _t("FBR invoice %(number)s received for %(order)s, the receipt can be reprinted.", {
+                        number: status.fbr_invoice_number,
+                        order: order.pos_reference || order.name,
+                    }),
+                    { type: "info" }
+                );
+            }
+        }
+    },
+
+    /**
+     * Give FBR up to the config deadline to number a just synced order, so
+     * its receipt prints the number; otherwise it prints as pending and the
+     * number is pushed later. The local timer bounds the wait even when the
+     * network itself is slow; the server lets a send already on the wire
+     * finish, and its late answer is notified like a pushed one.
+     */
+    async postFbrWithinDeadline(order) {
+        const deadline = this.config.fbr_receipt_deadline_ms;
+        if (
+            !this.config.e_invoicing ||
+            !deadline ||
+            typeof order.id !== "number" ||
+            order.fbr_status === "posted"
+        ) {
+            return;
+        }
+        let late = false;
+        const posting = this.data
+            .call("pos.order", "post_fbr_within_deadline", [order.id])
+            .then((status) => this.applyFbrStatus([status], late))
+            .catch((error) => console.warn("Could not post the order to FBR", error));
+        await Promise.race([posting, new Promise((resolve) => setTimeout(resolve, deadline + 500))]);
+        late = true;
+    },
+
+    /**
+     * Fetch the FBR state of every synced order still waiting for its number, in one RPC.
+     */
+    async syncFbrStatus() {
+        const uuids = this.models["pos.order"]
+            .getAll()
+            .filter((order) => typeof order.id === "number" && order.fbr_status !== "posted")
+            .map((order) => order.uuid);
+        if (!uuids.length) {
+            return;
+        }
+        try {
+            const statuses = await this.data.call("pos.order", "get_fbr_status", [], { uuids });
+            this.applyFbrStatus(statuses);
+        } catch (error) {
+            console.warn("Could not sync FBR status", error);
+        }
+    },
+});
+
+patch(PaymentScreen.prototype, {
+    async afterOrderValidation() {
+        await this.pos.postFbrWithinDeadline(this.currentOrder);
+        return super.afterOrderValidation(...arguments);
+    },
+});
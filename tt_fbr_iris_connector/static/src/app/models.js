@@ -13,6 +13,7 @@ patch(PosOrder.prototype, {
     export_for_printing() {
         const result = super.export_for_printing(...arguments);
         result.fbr_invoice_number = this.fbr_invoice_number;
+        result.fbr_pending = Boolean(this.config.e_invoicing && !this.fbr_invoice_number);
 
         // Add partner (customer) data
         if (this.get_partner()) {
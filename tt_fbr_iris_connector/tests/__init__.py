@@ -0,0 +1,16 @@
+from . import test_fbr_benchmarks
+from . import test_fbr_bulk_posting
+from . import test_fbr_cache_stamp
+from . import test_fbr_circuit_breaker
+from . import test_fbr_drain
+from . import test_fbr_idempotency
+from . import test_fbr_install_pipeline
+from . import test_fbr_option_sync
+from . import test_fbr_outbox
+from . import test_fbr_pos_items
+from . import test_fbr_rate_limiter
+from . import test_fbr_receipt_deadline
+from . import test_fbr_retry_sweep
+from . import test_fbr_status_summary
+from . import test_fbr_status_sync
+from . import test_fbr_tax_engine
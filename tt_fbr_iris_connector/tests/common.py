@@ -0,0 +1,209 @@
+import json
+from unittest.mock import patch
+
+import requests
+
+from odoo import fields
+from odoo.addons.point_of_sale.tests.common import TestPointOfSaleCommon
+
+from ..tools import fbr_circuit_breaker
+
+
+def gateway_response(status_code=200, data=None, headers=None):
+    """A ``requests.Response`` as the FBR gateway would return it."""
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(data).encode() if data is not None else b''
+    response.headers.update(headers or {})
+    return response
+
+
+def accepted_data(invoice_number):
+    return {'invoiceNumber': invoice_number, 'validationResponse': {'statusCode': '00', 'status': 'Valid'}}
+
+
+def rejected_data(message='Invalid HS code'):
+    return {'validationResponse': {'statusCode': '01', 'status': 'Invalid', 'message': message}}
+
+
+class FbrDataGenerator:
+    """Synthetic FBR data: taxes, partners, products, orders and option catalogs."""
+
+    def __init__(self, env, company):
+        self.env = env
+        self.company = company
+        self._seq = 0
+
+    def _next(self):
+        self._seq += 1
+        return self._seq
+
+    def option_catalog_records(self, count, opt_type='hscode', code_key='hS_CODE', name_key='description',
+                               renamed=0):
+        """API-shaped records as returned by the gateway, ``renamed`` of them with a new description."""
+        return [
+            {
+                code_key: f"{opt_type[:2].upper()}{index:07d}",
+                name_key: f"{opt_type} item {index}" + (" (revised)" if index < renamed else ""),
+            }
+            for index in range(count)
+        ]
+
+    def create_options(self, count, opt_type):
+        return self.env['fbr.option'].create([
+            {'code': f"{opt_type[:2].upper()}{index:07d}", 'name': f"{opt_type} item {index}", 'type': opt_type}
+            for index in range(count)
+        ])
+
+    def create_taxes(self):
+        rate = self.env['fbr.option'].create({'code': '413', 'name': '18%', 'type': 'rate'})
+        Tax = self.env['account.tax']
+
+        def tax(name, fbr_tax_type, amount, amount_type='percent', **vals):
+            return Tax.create(dict(vals, name=f"{name} {self._next()}", amount=amount, amount_type=amount_type,
+                                   fbr_tax_type=fbr_tax_type, type_tax_use='sale', company_id=self.company.id))
+
+        return {
+            'sales_tax': tax('GST', 'sales_tax', 18, fbr_rate_id=rate.id),
+            'extra_tax': tax('Extra', 'extra_tax', 3),
+            'further_tax': tax('Further', 'further_tax', 4),
+            'fed_payable': tax('FED', 'fed_payable', 45, amount_type='fixed'),
+        }
+
+    def create_partner(self, registered=False):
+        index = self._next()
+        return self.env['res.partner'].create({
+            'name': f"FBR Buyer {index}",
+            'ntn': f"{index:07d}" if registered else False,
+            'vat': f"{index:07d}" if registered else False,
+            'fbr_registration_type': 'Registered' if registered else 'Unregistered',
+            'region': 'Punjab',
+        })
+
+    def create_products(self, count, taxes):
+        uom = self.env['fbr.option'].create({'code': '13', 'name': 'Numbers, pieces, units', 'type': 'uom'})
+        sale_type = self.env['fbr.option'].create({'code': '75', 'name': 'Goods at standard rate', 'type': 'sale_type'})
+        hs_codes = self.create_options(max(count // 4, 1), 'hscode')
+        tax_sets = [
+            taxes['sales_tax'],
+            taxes['sales_tax'] | taxes['further_tax'],
+            taxes['sales_tax'] | taxes['extra_tax'],
+            taxes['sales_tax'] | taxes['fed_payable'],
+        ]
+        return self.env['product.product'].create([
+            {
+                'name': f"FBR Product {index}",
+                'list_price': 10 + index % 90,
+                'available_in_pos': True,
+                'taxes_id': [(6, 0, tax_sets[index % len(tax_sets)].ids)],
+                'fbr_hs_code': hs_codes[index % len(hs_codes)].id,
+                'fbr_uom_id': uom.id,
+                'fbr_sale_type_id': sale_type.id,
+            }
+            for index in range(count)
+        ])
+
+    def create_pos_order(self, session, partner, products, line_count):
+        lines = []
+        for index in range(line_count):
+            product = products[index % len(products)]
+            lines.append((0, 0, {
+                'product_id': product.id,
+                'price_unit': product.list_price,
+                'qty': 1 + index % 3,
+                'discount': 0.0,
+                'tax_ids': [(6, 0, product.taxes_id.ids)],
+                'price_subtotal': product.list_price * (1 + index % 3),
+                'price_subtotal_incl': product.list_price * (1 + index % 3),
+            }))
+        return self.env['pos.order'].create({
+            'session_id': session.id,
+            'partner_id': partner.id,
+            'lines': lines,
+            'amount_tax': 0.0,
+            'amount_total': 0.0,
+            'amount_paid': 0.0,
+            'amount_return': 0.0,
+        })
+
+    def create_invoice(self, partner, products, line_count):
+        return self.env['account.move'].create({
+            'move_type': 'out_invoice',
+            'partner_id': partner.id,
+            'invoice_date': fields.Date.today(),
+            'company_id': self.company.id,
+            'invoice_line_ids': [
+                (0, 0, {
+                    'product_id': products[index % len(products)].id,
+                    'quantity': 1 + index % 3,
+                    'price_unit': products[index % len(products)].list_price,
+                    'tax_ids': [(6, 0, products[index % len(products)].taxes_id.ids)],
+                })
+                for index in range(line_count)
+            ],
+        })
+
+
+class FbrCommon(TestPointOfSaleCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.company = cls.env.company
+        cls.company.write({
+            'enable_fbr_integration': True,
+            'fbr_token_url': 'https://gw.fbr.gov.pk/di_data/v1/di/postinvoicedata_sb',
+            'fbr_bearer_token': 'test-token',
+            'seller_ntn_cnic': '1234567',
+        })
+        cls.pos_config.write({
+            'e_invoicing': True,
+            'enable_fbr_integration': True,
+            'fbr_token_url': 'https://gw.fbr.gov.pk/di_data/v1/di/postinvoicedata_sb',
+            'fbr_bearer_token': 'test-token',
+        })
+        cls.fbr_data = FbrDataGenerator(cls.env, cls.company)
+
+
+class FbrGatewayCommon(FbrCommon):
+    """Behaviour tests around the gateway, which is never reached: patch ``requests.Session.request``."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.startClassPatcher(patch.object(requests.Session, 'request', side_effect=AssertionError("network access")))
+        cls.taxes = cls.fbr_data.create_taxes()
+        cls.products = cls.fbr_data.create_products(8, cls.taxes)
+        cls.partner = cls.fbr_data.create_partner()
+
+    def setUp(self):
+        super().setUp()
+        # Limiter, breaker, idempotency keys and ledger use cursors of their own: keep them in the test transaction
+        self.registry.enter_test_mode(self.cr)
+        self.addCleanup(self.registry.leave_test_mode)
+        self.addCleanup(fbr_circuit_breaker.forget, self.registry)
+
+    def patch_gateway(self, *responses, by_ref=None):
+        """Answer gateway calls with ``responses`` in turn, the last one repeating, or answer each post
+        with ``by_ref[invoiceRefNo]``. An exception instance is raised instead. Returns the calls made."""
+        calls = []
+
+        def request(session, method, url, **kwargs):
+            calls.append((method, url, kwargs))
+            if by_ref is not None:
+                response = by_ref[json.loads(kwargs['data'])['invoiceRefNo']]
+            else:
+                response = responses[min(len(calls), len(responses)) - 1]
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        self.startPatcher(patch.object(requests.Session, 'request', autospec=True, side_effect=request))
+        return calls
+
+    def create_pos_orders(self, count, line_count=3):
+        self.pos_config.open_ui()
+        return self.env['pos.order'].concat(*(
+            self.fbr_data.create_pos_order(self.pos_config.current_session_id, self.partner, self.products, line_count)
+            for _index in range(count)
+        ))
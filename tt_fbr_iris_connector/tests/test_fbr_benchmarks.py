@@ -0,0 +1,143 @@
+"""Offline micro-benchmarks of the FBR hot paths.
+
+Not part of the standard run, select them with::
+
+    odoo-bin -d <db> -i tt_fbr_iris_connector --test-tags fbr_benchmark
+
+Results (time, queries and peak memory per call at several scales) are
+written as JSON to ``$FBR_BENCHMARK_OUTPUT``, or ``fbr_benchmarks.json`` in
+the temporary directory, so releases can be compared.
+"""
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from unittest.mock import patch
+
+import requests
+
+from odoo import release
+from odoo.tests import tagged
+
+from .common import FbrCommon
+
+LINE_SCALES = (10, 100, 500)
+CATALOG_SCALES = (1000, 10000)
+RUNS = 3
+
+
+@tagged('post_install', '-at_install', '-standard', 'fbr_benchmark')
+class TestFbrBenchmarks(FbrCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.results = []
+        # The suite must never reach the gateway
+        cls.startClassPatcher(patch.object(requests.Session, 'request', side_effect=AssertionError("network access")))
+        cls.taxes = cls.fbr_data.create_taxes()
+        cls.products = cls.fbr_data.create_products(50, cls.taxes)
+        cls.partner = cls.fbr_data.create_partner()
+        cls.pos_config.open_ui()
+        cls.session = cls.pos_config.current_session_id
+
+    @classmethod
+    def tearDownClass(cls):
+        output = os.environ.get('FBR_BENCHMARK_OUTPUT') or os.path.join(tempfile.gettempdir(), 'fbr_benchmarks.json')
+        with open(output, 'w') as f:
+            json.dump({
+                'odoo_version': release.version,
+                'module_version': cls.env['ir.module.module'].search([('name', '=', 'tt_fbr_iris_connector')]).installed_version,
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'results': cls.results,
+            }, f, indent=2)
+        super().tearDownClass()
+
+    def _measure(self, name, scale, func, setup=None):
+        """Record median time, queries and peak memory of ``func`` on a cold ORM cache."""
+        timings = []
+        queries = []
+        for _run in range(RUNS):
+            if setup:
+                setup()
+            # Pending writes of the setup must not be counted against func
+            self.env.flush_all()
+            self.env.invalidate_all()
+            count_before = self.env.cr.sql_log_count
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+            queries.append(self.env.cr.sql_log_count - count_before)
+
+        if setup:
+            setup()
+        self.env.flush_all()
+        self.env.invalidate_all()
+        tracemalloc.start()
+        func()
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.results.append({
+            'benchmark': name,
+            'scale': scale,
+            'time_ms': round(statistics.median(timings) * 1000, 3),
+            'queries': int(statistics.median(queries)),
+            'peak_memory_kb': round(peak / 1024, 1),
+        })
+
+    def test_pos_prepare_fbr_payload(self):
+        for scale in LINE_SCALES:
+            order = self.fbr_data.create_pos_order(self.session, self.partner, self.products, scale)
+            self._measure('pos.order._prepare_fbr_payload', scale, lambda: order._prepare_fbr_payload('3'))
+
+    def test_pos_prepare_fbr_invoice_payloads_batch(self):
+        orders = self.env['pos.order']
+        for _index in range(20):
+            orders |= self.fbr_data.create_pos_order(self.session, self.partner, self.products, 25)
+        self._measure('pos.order._prepare_fbr_invoice_payloads[20x25]', 500, orders._prepare_fbr_invoice_payloads)
+
+    def test_account_move_prepare_fbr_invoice_data(self):
+        for scale in LINE_SCALES:
+            move = self.fbr_data.create_invoice(self.partner, self.products, scale)
+            self._measure('account.move._prepare_fbr_invoice_data', scale, move._prepare_fbr_invoice_data)
+
+    def test_account_move_compute_tax_amounts(self):
+        for scale in LINE_SCALES:
+            move = self.fbr_data.create_invoice(self.partner, self.products, scale)
+
+            def per_line():
+                for line in move.invoice_line_ids:
+                    move._compute_tax_amounts(line, line.price_unit, line.quantity, line.discount)
+
+            self._measure('account.move._compute_tax_amounts', scale, per_line)
+            self._measure('account.move._compute_fbr_document_amounts', scale,
+                          lambda: move._compute_fbr_document_amounts(move.invoice_line_ids))
+
+    def test_product_update_fbr_options(self):
+        Template = self.env['product.template']
+        for scale in CATALOG_SCALES:
+            opt_type = 'sro_item_general'
+            fresh = self.fbr_data.option_catalog_records(scale, opt_type, 'srO_ITEM_ID', 'srO_ITEM_DESC')
+            changed = self.fbr_data.option_catalog_records(scale, opt_type, 'srO_ITEM_ID', 'srO_ITEM_DESC',
+                                                           renamed=scale // 100)
+
+            def reset():
+                self.env['fbr.option'].with_context(active_test=False).search([('type', '=', opt_type)]).unlink()
+                self.env['fbr.option.sync'].search([('type', '=', opt_type)]).unlink()
+
+            def load_fresh():
+                reset()
+                Template._update_fbr_options(fresh, opt_type, 'srO_ITEM_ID', 'srO_ITEM_DESC')
+
+            self._measure('product.template._update_fbr_options[insert]', scale,
+                          lambda: Template._update_fbr_options(fresh, opt_type, 'srO_ITEM_ID', 'srO_ITEM_DESC'),
+                          setup=reset)
+            self._measure('product.template._update_fbr_options[unchanged]', scale,
+                          lambda: Template._update_fbr_options(fresh, opt_type, 'srO_ITEM_ID', 'srO_ITEM_DESC'),
+                          setup=load_fresh)
+            self._measure('product.template._update_fbr_options[1% renamed]', scale,
+                          lambda: Template._update_fbr_options(changed, opt_type, 'srO_ITEM_ID', 'srO_ITEM_DESC'),
+                          setup=load_fresh)
@@ -0,0 +1,63 @@
+import requests
+
+from odoo.tests import tagged
+
+from .common import FbrGatewayCommon, accepted_data, gateway_response, rejected_data
+
+
+@tagged('post_install', '-at_install')
+class TestFbrBulkPosting(FbrGatewayCommon):
+
+    def test_bulk_outcomes(self):
+        accepted, rejected, already_posted = self.create_pos_orders(3)
+        already_posted.write({'fbr_status': 'posted', 'fbr_invoice_number': 'FBR-OLD'})
+        calls = self.patch_gateway(by_ref={
+            accepted.name: gateway_response(200, accepted_data('FBR-1')),
+            rejected.name: gateway_response(200, rejected_data()),
+        })
+
+        results = (accepted | rejected | already_posted)._fbr_post_bulk()
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(results[accepted.id], {'status': 'posted', 'invoice_number': 'FBR-1', 'error': ''})
+        self.assertEqual(accepted.fbr_status, 'posted')
+        self.assertEqual(results[rejected.id]['status'], 'failed')
+        self.assertEqual(results[rejected.id]['error'], 'Invalid HS code')
+        self.assertEqual(rejected.fbr_status, 'failed')
+        self.assertEqual(results[already_posted.id]['status'], 'skipped')
+        self.assertEqual(len(accepted.fbr_submission_ids) + len(rejected.fbr_submission_ids), 2)
+
+        # Accepted invoices are replayed from their idempotency key, never posted twice
+        accepted.fbr_status = 'failed'
+        self.assertEqual(accepted._fbr_post_bulk()[accepted.id]['status'], 'posted')
+        self.assertEqual(len(calls), 2)
+
+    def test_bulk_defers_throttled_documents_like_the_outbox(self):
+        bulk_order, single_order = self.create_pos_orders(2)
+        self.patch_gateway(gateway_response(429, {'Message': 'Too many requests'}, {'Retry-After': '30'}))
+
+        result = bulk_order._fbr_post_bulk()[bulk_order.id]
+        self.assertEqual(result['status'], 'deferred')
+        self.assertEqual(result['retry_after'], 30)
+        self.assertEqual(bulk_order.fbr_status, 'draft', "a throttled document is not an FBR failure")
+        self.assertTrue(bulk_order.fbr_next_retry_at)
+
+        # The 429 blocked the token: the single-document path defers without calling the gateway
+        entry = self.env['fbr.outbox']._enqueue(single_order)
+        self.assertIs(entry._process(), False)
+        self.assertEqual(single_order.fbr_status, 'draft')
+        self.assertEqual(entry.state, 'pending')
+
+    def test_bulk_flags_ambiguous_sends(self):
+        self.env['ir.config_parameter'].sudo().set_param('fbr.invoice_lookup_url', '')
+        order = self.create_pos_orders(1)
+        calls = self.patch_gateway(requests.exceptions.ReadTimeout("read timed out"))
+
+        result = order._fbr_post_bulk()[order.id]
+        self.assertTrue(result['ambiguous'])
+        self.assertEqual(result['status'], 'failed')
+        self.assertTrue(order.fbr_needs_reconciliation)
+
+        # Without a lookup nothing is sent again until an operator settles it
+        self.assertTrue(order._fbr_post_bulk()[order.id]['ambiguous'])
+        self.assertEqual(len(calls), 1)
@@ -0,0 +1,70 @@
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from .common import FbrCommon
+from ..tools import fbr_cache_stamp
+
+
+@tagged('post_install', '-at_install')
+class TestFbrCacheStamp(FbrCommon):
+
+    def setUp(self):
+        super().setUp()
+        # The cached assignment and catalogs must never go through a full registry cache clear
+        self.clear_cache = self.startPatcher(patch.object(type(self.registry), 'clear_cache'))
+
+    def _stamp(self, scope):
+        return fbr_cache_stamp.get(self.env, scope)
+
+    def test_tax_assignment_follows_relevant_writes_only(self):
+        Tax = self.env['account.tax']
+        assignment = Tax._fbr_tax_assignment(self.company.id, False, 'Unregistered')
+        stamp = self._stamp(fbr_cache_stamp.TAX_ASSIGNMENT)
+
+        sales_tax = Tax.create({'name': 'FBR cache GST', 'amount': 18, 'fbr_tax_type': 'sales_tax',
+                                'type_tax_use': 'sale', 'company_id': self.company.id})
+        sales_tax.write({'sequence': 1, 'description': 'GST'})
+        self.assertEqual(self._stamp(fbr_cache_stamp.TAX_ASSIGNMENT), stamp)
+        self.assertEqual(Tax._fbr_tax_assignment(self.company.id, False, 'Unregistered'), assignment)
+
+        further_tax = Tax.create({'name': 'FBR cache Further', 'amount': 4, 'fbr_tax_type': 'further_tax',
+                                  'type_tax_use': 'sale', 'company_id': self.company.id, 'sequence': 0})
+        self.assertNotEqual(self._stamp(fbr_cache_stamp.TAX_ASSIGNMENT), stamp)
+        self.assertEqual(Tax._fbr_tax_assignment(self.company.id, False, 'Unregistered'), (further_tax.id,))
+
+        # Taxes set on a POS config are part of the assignment whatever their type
+        self.pos_config.fbr_taxes_unregistered = sales_tax
+        self.assertEqual(Tax._fbr_tax_assignment(self.company.id, self.pos_config.id, 'Unregistered'),
+                         (sales_tax.id,))
+        stamp = self._stamp(fbr_cache_stamp.TAX_ASSIGNMENT)
+        sales_tax.unlink()
+        self.assertNotEqual(self._stamp(fbr_cache_stamp.TAX_ASSIGNMENT), stamp)
+        self.assertEqual(Tax._fbr_tax_assignment(self.company.id, self.pos_config.id, 'Unregistered'),
+                         (further_tax.id,))
+        self.clear_cache.assert_not_called()
+
+    def test_option_writes_bump_their_catalog_only(self):
+        Option = self.env['fbr.option']
+        hs_code = self.fbr_data.create_options(1, 'hscode')
+        self.assertEqual(Option._resolve_code('hscode', hs_code.code), hs_code.id)
+        hscode_stamp = self._stamp(fbr_cache_stamp.catalog_scope('hscode'))
+        uom_stamp = self._stamp(fbr_cache_stamp.catalog_scope('uom'))
+
+        hs_code.last_updated = hs_code.last_updated
+        self.assertEqual(self._stamp(fbr_cache_stamp.catalog_scope('hscode')), hscode_stamp)
+
+        hs_code.code = f'{hs_code.code}9'
+        self.assertNotEqual(self._stamp(fbr_cache_stamp.catalog_scope('hscode')), hscode_stamp)
+        self.assertEqual(self._stamp(fbr_cache_stamp.catalog_scope('uom')), uom_stamp)
+        self.assertEqual(Option._resolve_code('hscode', hs_code.code), hs_code.id)
+        self.clear_cache.assert_not_called()
+
+    def test_stamps_are_not_reused_after_a_rollback(self):
+        scope = fbr_cache_stamp.catalog_scope('uom')
+        with self.assertRaises(ZeroDivisionError), self.env.cr.savepoint():
+            fbr_cache_stamp.bump(self.env, [scope])
+            rolled_back = self._stamp(scope)
+            1 / 0
+        fbr_cache_stamp.bump(self.env, [scope])
+        self.assertGreater(self._stamp(scope), rolled_back)
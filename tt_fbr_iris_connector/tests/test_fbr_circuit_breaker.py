@@ -0,0 +1,91 @@
+from unittest.mock import Mock
+
+from odoo.tests import tagged
+
+from .common import FbrGatewayCommon, gateway_response
+from ..tools import fbr_circuit_breaker
+from ..tools.fbr_circuit_breaker import FbrCircuitBreaker, FbrCircuitOpen
+from ..tools.fbr_client import FbrClient
+from ..tools.fbr_rate_limiter import FbrRateLimited
+
+
+@tagged('post_install', '-at_install')
+class TestFbrCircuitBreaker(FbrGatewayCommon):
+
+    host = 'breaker.test.invalid'
+
+    def _breaker(self):
+        return FbrCircuitBreaker(self.registry, failure_threshold=2, open_seconds=60, slow_call_seconds=5,
+                                 trial_seconds=30)
+
+    def _open_and_expire(self, breaker):
+        breaker.record(self.host, False, 0.1, "HTTP 503")
+        breaker.record(self.host, False, 0.1, "HTTP 503")
+        self.cr.execute("UPDATE fbr_circuit_breaker SET open_until = open_until - interval '2 minutes' WHERE host = %s",
+                        [self.host])
+        fbr_circuit_breaker.forget(self.registry, self.host)
+
+    def _state(self):
+        self.cr.execute("SELECT state, consecutive_failures, half_open_until IS NOT NULL FROM fbr_circuit_breaker "
+                        "WHERE host = %s", [self.host])
+        return self.cr.fetchone()
+
+    def test_opens_and_closes(self):
+        breaker = self._breaker()
+
+        self.assertFalse(breaker.before_call(self.host))
+        breaker.record(self.host, False, 0.1, "HTTP 503")
+        breaker.before_call(self.host)
+        # A slow answer counts as a failure too
+        breaker.record(self.host, True, 6.0)
+        with self.assertRaises(FbrCircuitOpen) as caught:
+            breaker.before_call(self.host)
+        self.assertGreater(caught.exception.retry_after, 50)
+
+        # Past open_until a trial call goes through, and its success closes the breaker
+        self.cr.execute("UPDATE fbr_circuit_breaker SET open_until = open_until - interval '2 minutes' WHERE host = %s",
+                        [self.host])
+        fbr_circuit_breaker.forget(self.registry, self.host)
+        self.assertTrue(breaker.before_call(self.host))
+        breaker.record(self.host, True, 0.1)
+        self.assertFalse(breaker.before_call(self.host))
+        self.assertEqual(self._state(), ('closed', 0, False))
+
+    def test_single_trial_while_half_open(self):
+        breaker = self._breaker()
+        self._open_and_expire(breaker)
+
+        self.assertTrue(breaker.before_call(self.host))
+        # Other workers, with or without a cached state, are kept out until the trial ends
+        with self.assertRaises(FbrCircuitOpen) as caught:
+            breaker.before_call(self.host)
+        self.assertGreater(caught.exception.retry_after, 20)
+        fbr_circuit_breaker.forget(self.registry, self.host)
+        with self.assertRaises(FbrCircuitOpen):
+            self._breaker().before_call(self.host)
+
+        # A failed trial opens the breaker again for a full period
+        breaker.record(self.host, False, 0.1, "HTTP 503")
+        self.assertEqual(self._state(), ('open', 3, False))
+        with self.assertRaises(FbrCircuitOpen) as caught:
+            breaker.before_call(self.host)
+        self.assertGreater(caught.exception.retry_after, 50)
+
+    def test_trial_released_when_nothing_was_sent(self):
+        breaker = self._breaker()
+        self._open_and_expire(breaker)
+        limiter = Mock()
+        limiter.acquire.side_effect = FbrRateLimited(5)
+        client = FbrClient('test-token', limiter=limiter, breaker=breaker)
+        calls = self.patch_gateway(gateway_response(200, {}))
+
+        with self.assertRaises(FbrRateLimited):
+            client.post(f'https://{self.host}/post', {'invoiceRefNo': 'TRIAL-1'})
+        self.assertFalse(calls)
+        self.assertEqual(self._state(), ('open', 2, False))
+
+        # The next caller gets the trial, and its answer closes the breaker
+        limiter.acquire.side_effect = None
+        client.post(f'https://{self.host}/post', {'invoiceRefNo': 'TRIAL-2'})
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self._state(), ('closed', 0, False))
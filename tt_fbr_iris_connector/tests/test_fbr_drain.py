@@ -0,0 +1,43 @@
+import argparse
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests import tagged
+from odoo.tools import config
+
+from .common import FbrGatewayCommon, accepted_data, gateway_response
+from ..cli.fbr_drain import CONNECTION_HEADROOM, FbrDrain
+
+
+@tagged('post_install', '-at_install')
+class TestFbrDrain(FbrGatewayCommon):
+
+    def _parse(self, *args, db_maxconn=20):
+        # The options of the running server must not change
+        with patch.object(config, 'parse_config'), patch.dict(config.options, {'db_maxconn': db_maxconn}):
+            return FbrDrain()._parse(list(args))
+
+    def test_workers_fit_the_connection_pool(self):
+        max_workers = 20 - CONNECTION_HEADROOM
+        self.assertEqual(self._parse('--workers', '48').workers, max_workers)
+        self.assertEqual(self._parse().workers, max_workers)
+        self.assertEqual(self._parse('--workers', '8').workers, 8)
+        self.assertEqual(self._parse('--workers', '0').workers, 1)
+        self.assertEqual(self._parse('--workers', '8', db_maxconn=2).workers, 1)
+
+    def test_drain_once_posts_a_leased_batch(self):
+        orders = self.create_pos_orders(2)
+        entries = self.env['fbr.outbox']._enqueue(orders)
+        entries.write({'next_attempt_at': fields.Datetime.now() - timedelta(minutes=1)})
+        self.env.flush_all()
+        self.patch_gateway(by_ref={
+            order.name: gateway_response(200, accepted_data(f'FBR-{order.id}')) for order in orders
+        })
+        opts = argparse.Namespace(batch_size=10, lease=300, workers=2)
+
+        self.assertEqual(FbrDrain()._drain_once(self.registry, opts), 2)
+        self.env.invalidate_all()
+        self.assertEqual(entries.mapped('state'), ['done', 'done'])
+        self.assertEqual(orders.mapped('fbr_status'), ['posted', 'posted'])
+        self.assertEqual(FbrDrain()._drain_once(self.registry, opts), 0)
@@ -0,0 +1,177 @@
+import json
+from datetime import timedelta
+from unittest.mock import Mock
+
+import requests
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import FbrGatewayCommon
+from ..models.fbr_idempotency import FbrAmbiguousSubmission, mark_sending
+
+
+@tagged('post_install', '-at_install')
+class TestFbrIdempotency(FbrGatewayCommon):
+
+    def _payload(self, ref):
+        return {'invoiceRefNo': ref, 'sellerNTNCNIC': '1234567'}
+
+    def _key(self, key):
+        # Keys are written in raw SQL on cursors of their own
+        self.env['fbr.idempotency.key'].invalidate_model()
+        return self.env['fbr.idempotency.key'].sudo().search([('key', '=', key)])
+
+    def _age(self, key, seconds):
+        self.cr.execute("""
+            UPDATE fbr_idempotency_key
+               SET started_at = started_at - make_interval(secs => %s)
+             WHERE key = %s
+        """, [seconds, key])
+
+    def test_acquire_decisions(self):
+        IdempotencyKey = self.env['fbr.idempotency.key'].sudo()
+        key = IdempotencyKey._key_of(self._payload('IDEM-1'))
+        entries = {key: self.partner}
+        self.assertEqual(IdempotencyKey._acquire(entries), {key: ('send', None)})
+        self.assertEqual(IdempotencyKey._acquire(entries), {key: ('busy', None)})
+
+        IdempotencyKey._release({key: ('failed', None)})
+        self.assertEqual(IdempotencyKey._acquire(entries), {key: ('send', None)})
+
+        IdempotencyKey._release({key: ('ambiguous', None)})
+        self.assertEqual(IdempotencyKey._acquire(entries), {key: ('reconcile', None)})
+
+        IdempotencyKey._release({key: ('posted', {'invoiceNumber': 'FBR-1', 'items': [{'hsCode': '0101.2100'}]})})
+        self.assertEqual(self._key(key).invoice_number, 'FBR-1')
+        self.assertEqual(IdempotencyKey._acquire(entries), {key: ('done', IdempotencyKey._accepted_data('FBR-1'))})
+
+    def test_stale_key_is_resent_only_if_never_sending(self):
+        IdempotencyKey = self.env['fbr.idempotency.key'].sudo()
+        timeout = IdempotencyKey._get_inflight_timeout()
+
+        # The worker died before reaching the gateway: safe to send
+        key = IdempotencyKey._key_of(self._payload('IDEM-STALE-1'))
+        IdempotencyKey._acquire({key: self.partner})
+        self._age(key, timeout + 60)
+        self.assertEqual(IdempotencyKey._acquire({key: self.partner}), {key: ('send', None)})
+
+        # The worker died while posting: FBR may have the invoice
+        key = IdempotencyKey._key_of(self._payload('IDEM-STALE-2'))
+        IdempotencyKey._acquire({key: self.partner})
+        mark_sending(self.registry, [key])
+        self.assertEqual(IdempotencyKey._acquire({key: self.partner}), {key: ('busy', None)})
+        self._age(key, timeout + 60)
+        self.assertEqual(IdempotencyKey._acquire({key: self.partner}), {key: ('reconcile', None)})
+
+    def test_send_marks_the_key_before_posting(self):
+        IdempotencyKey = self.env['fbr.idempotency.key'].sudo()
+        payload = self._payload('IDEM-MARK')
+        key = IdempotencyKey._key_of(payload)
+        states = []
+        client = Mock()
+        client.post.side_effect = lambda url, data: states.append(self._key(key).state) or Mock(
+            status_code=200, text='{}', json=Mock(return_value={}))
+        IdempotencyKey._send(self.partner, client, 'https://gw.fbr.gov.pk/post', payload)
+        self.assertEqual(states, ['sending'])
+        self.assertEqual(self._key(key).state, 'failed')
+
+    def test_ambiguous_send_is_never_repeated_without_lookup(self):
+        IdempotencyKey = self.env['fbr.idempotency.key'].sudo()
+        self.env['ir.config_parameter'].sudo().set_param('fbr.invoice_lookup_url', '')
+        payload = self._payload('IDEM-2')
+        key = IdempotencyKey._key_of(payload)
+        client = Mock()
+        client.post.side_effect = requests.exceptions.ReadTimeout("read timed out")
+
+        with self.assertRaises(FbrAmbiguousSubmission) as caught:
+            IdempotencyKey._send(self.partner, client, 'https://gw.fbr.gov.pk/post', payload)
+        self.assertTrue(caught.exception.sent)
+        self.assertEqual(self._key(key).state, 'ambiguous')
+
+        with self.assertRaises(FbrAmbiguousSubmission) as caught:
+            IdempotencyKey._send(self.partner, client, 'https://gw.fbr.gov.pk/post', payload)
+        self.assertFalse(caught.exception.sent)
+        self.assertEqual(client.post.call_count, 1, "an ambiguous send must not be repeated")
+        self.assertEqual(self._key(key).state, 'ambiguous')
+
+        IdempotencyKey._mark_not_received(self.partner)
+        self.env.flush_all()
+        self.assertEqual(self._key(key).state, 'failed')
+        self.assertEqual(IdempotencyKey._acquire({key: self.partner}), {key: ('send', None)})
+
+    def test_lookup_settles_ambiguous_send(self):
+        IdempotencyKey = self.env['fbr.idempotency.key'].sudo()
+        self.env['ir.config_parameter'].sudo().set_param('fbr.invoice_lookup_url', 'https://gw.fbr.gov.pk/lookup')
+        accepted = {'invoiceNumber': 'FBR-3', 'validationResponse': {'statusCode': '00'}}
+        client = Mock()
+        client.post.return_value = Mock(status_code=200, text=json.dumps(accepted), json=Mock(return_value=accepted))
+
+        # FBR does not have it: sent again
+        payload = self._payload('IDEM-3')
+        key = IdempotencyKey._key_of(payload)
+        IdempotencyKey._acquire({key: self.partner})
+        IdempotencyKey._release({key: ('ambiguous', None)})
+        client.get.return_value = Mock(status_code=404, text='')
+        response = IdempotencyKey._send(self.partner, client, 'https://gw.fbr.gov.pk/post', payload)
+        self.assertEqual(response.json(), accepted)
+        self.assertEqual(client.post.call_count, 1)
+        self.assertEqual(self._key(key).state, 'posted')
+
+        # FBR has it: replayed, not sent
+        payload = self._payload('IDEM-4')
+        key = IdempotencyKey._key_of(payload)
+        IdempotencyKey._acquire({key: self.partner})
+        IdempotencyKey._release({key: ('ambiguous', None)})
+        client.get.return_value = Mock(status_code=200, text=json.dumps(accepted), json=Mock(return_value=accepted))
+        response = IdempotencyKey._send(self.partner, client, 'https://gw.fbr.gov.pk/post', payload)
+        self.assertEqual(response.json(), IdempotencyKey._accepted_data('FBR-3'))
+        self.assertEqual(client.post.call_count, 1)
+
+        # The lookup cannot tell: still not sent
+        payload = self._payload('IDEM-5')
+        key = IdempotencyKey._key_of(payload)
+        IdempotencyKey._acquire({key: self.partner})
+        IdempotencyKey._release({key: ('ambiguous', None)})
+        client.get.return_value = Mock(status_code=503, text='')
+        with self.assertRaises(FbrAmbiguousSubmission):
+            IdempotencyKey._send(self.partner, client, 'https://gw.fbr.gov.pk/post', payload)
+        self.assertEqual(client.post.call_count, 1)
+        self.assertEqual(self._key(key).state, 'ambiguous')
+
+    def test_reconcile_finds_archived_ledger_entries(self):
+        IdempotencyKey = self.env['fbr.idempotency.key'].sudo()
+        self.env['ir.config_parameter'].sudo().set_param('fbr.invoice_lookup_url', '')
+        payload = self._payload('IDEM-6')
+        self.env['fbr.submission'].sudo().create({
+            'res_model': self.partner._name, 'res_id': self.partner.id, 'invoice_ref': 'IDEM-6',
+            'status': 'posted', 'fbr_invoice_number': 'FBR-6',
+        }).active = False
+
+        client = Mock()
+        self.assertEqual(IdempotencyKey._reconcile(client, payload), IdempotencyKey._accepted_data('FBR-6'))
+        client.get.assert_not_called()
+
+    def test_retention_keeps_unsettled_keys(self):
+        IdempotencyKey = self.env['fbr.idempotency.key'].sudo()
+        self.env['ir.config_parameter'].sudo().set_param('fbr.idempotency_retention_days', 30)
+        keys = {state: IdempotencyKey._key_of(self._payload(f'IDEM-RET-{state}'))
+                for state in ('posted', 'failed', 'ambiguous', 'recent')}
+        for key in keys.values():
+            IdempotencyKey._acquire({key: self.partner})
+        IdempotencyKey._release({
+            keys['posted']: ('posted', {'invoiceNumber': 'FBR-7'}),
+            keys['failed']: ('failed', None),
+            keys['ambiguous']: ('ambiguous', None),
+            keys['recent']: ('posted', {'invoiceNumber': 'FBR-8'}),
+        })
+        self.cr.execute("UPDATE fbr_idempotency_key SET finished_at = %s WHERE key = ANY(%s)",
+                        [fields.Datetime.now() - timedelta(days=31),
+                         [keys['posted'], keys['failed'], keys['ambiguous']]])
+
+        self.env['fbr.submission'].sudo()._cron_apply_retention()
+
+        self.assertFalse(self._key(keys['posted']))
+        self.assertFalse(self._key(keys['failed']))
+        self.assertEqual(self._key(keys['ambiguous']).state, 'ambiguous')
+        self.assertEqual(self._key(keys['recent']).invoice_number, 'FBR-8')
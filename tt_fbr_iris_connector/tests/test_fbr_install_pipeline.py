@@ -0,0 +1,60 @@
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from .common import FbrGatewayCommon
+from ..models.fbr_install import PENDING_STEPS_PARAM
+
+
+@tagged('post_install', '-at_install')
+class TestFbrInstallPipeline(FbrGatewayCommon):
+
+    def setUp(self):
+        super().setUp()
+        self.ICP = self.env['ir.config_parameter'].sudo()
+        self.ICP.set_param(PENDING_STEPS_PARAM, '')
+        self.ICP.set_param('fbr.install_chunk_size', 2)
+        self.Pipeline = self.env['fbr.install.pipeline']
+        self.templates = self.products.product_tmpl_id.sorted('id')
+        self.rate = self.taxes['sales_tax'].fbr_rate_id
+
+    def _clear_rates(self):
+        self.env.flush_all()
+        self.env.cr.execute("UPDATE product_template SET fbr_rate_id = NULL WHERE id IN %s",
+                            [tuple(self.templates.ids)])
+        self.templates.invalidate_recordset(['fbr_rate_id'])
+
+    def test_rates_are_computed_in_chunks(self):
+        self._clear_rates()
+        self.Pipeline._schedule(('rates',))
+        self.assertEqual(self.Pipeline._get_pending_steps(), ['rates'])
+
+        self.Pipeline._cron_run()
+
+        self.assertEqual(self.Pipeline._get_pending_steps(), [])
+        self.assertEqual(self.templates.fbr_rate_id, self.rate)
+        self.assertTrue(all(self.templates.mapped('fbr_rate_id')))
+
+    def test_rates_step_resumes_after_its_last_chunk(self):
+        self._clear_rates()
+        self.Pipeline._schedule(('rates',))
+        done, todo = self.templates[:4], self.templates[4:]
+        # Progress committed by an interrupted run
+        self.ICP.set_param('fbr.install_rates_last_id', done[-1].id)
+
+        self.Pipeline._cron_run()
+
+        self.assertFalse(any(done.mapped('fbr_rate_id')))
+        self.assertTrue(all(todo.mapped('fbr_rate_id')))
+
+    def test_steps_run_in_order_and_the_catalog_can_be_deferred(self):
+        self.ICP.set_param('fbr.install_load_catalog', 'False')
+        self.Pipeline._schedule(('catalog',))
+        self.Pipeline._schedule(('rates',))
+        self.assertEqual(self.Pipeline._get_pending_steps(), ['rates', 'catalog'])
+
+        with patch.object(self.registry['product.template'], 'load_fbr_static_options') as load:
+            self.Pipeline._cron_run()
+
+        load.assert_not_called()
+        self.assertEqual(self.Pipeline._get_pending_steps(), [])
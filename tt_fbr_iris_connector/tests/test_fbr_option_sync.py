@@ -0,0 +1,33 @@
+from odoo.tests import tagged
+
+from .common import FbrCommon
+
+
+@tagged('post_install', '-at_install')
+class TestFbrOptionSync(FbrCommon):
+
+    def test_update_fbr_options_archives_missing_codes_only(self):
+        Template = self.env['product.template']
+        Option = self.env['fbr.option'].with_context(active_test=False)
+        opt_type = 'sro_item_general'
+        records = self.fbr_data.option_catalog_records(4, opt_type, 'srO_ITEM_ID', 'srO_ITEM_DESC')
+
+        Template._update_fbr_options(records, opt_type, 'srO_ITEM_ID', 'srO_ITEM_DESC')
+        options = Option.search([('type', '=', opt_type)])
+        self.assertEqual(len(options), 4)
+        self.assertTrue(all(options.mapped('active')))
+
+        # An empty answer never empties the catalog
+        Template._update_fbr_options([], opt_type, 'srO_ITEM_ID', 'srO_ITEM_DESC')
+        self.assertTrue(all(options.mapped('active')))
+
+        renamed = self.fbr_data.option_catalog_records(4, opt_type, 'srO_ITEM_ID', 'srO_ITEM_DESC', renamed=1)[:3]
+        Template._update_fbr_options(renamed, opt_type, 'srO_ITEM_ID', 'srO_ITEM_DESC')
+        by_code = {option.code: option for option in Option.search([('type', '=', opt_type)])}
+        self.assertEqual(len(by_code), 4)
+        self.assertFalse(by_code[records[3]['srO_ITEM_ID']].active)
+        self.assertEqual(by_code[records[0]['srO_ITEM_ID']].name, renamed[0]['srO_ITEM_DESC'])
+
+        # Codes coming back are reactivated
+        Template._update_fbr_options(records, opt_type, 'srO_ITEM_ID', 'srO_ITEM_DESC')
+        self.assertTrue(by_code[records[3]['srO_ITEM_ID']].active)
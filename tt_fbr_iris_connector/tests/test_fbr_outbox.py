@@ -0,0 +1,121 @@
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import FbrGatewayCommon, accepted_data, gateway_response, rejected_data
+
+
+@tagged('post_install', '-at_install')
+class TestFbrOutbox(FbrGatewayCommon):
+
+    def setUp(self):
+        super().setUp()
+        ICP = self.env['ir.config_parameter'].sudo()
+        ICP.set_param('fbr.outbox_max_attempts', 2)
+        ICP.set_param('fbr.invoice_lookup_url', '')
+        self.Outbox = self.env['fbr.outbox']
+
+    def _enqueue_due(self, orders):
+        # The claim compares with the database clock, which stands still within the test transaction
+        entries = self.Outbox._enqueue(orders)
+        entries.write({'next_attempt_at': fields.Datetime.now() - timedelta(minutes=1)})
+        self.env.flush_all()
+        return entries
+
+    def assertDueIn(self, entry, delta):
+        expected = fields.Datetime.now() + delta
+        self.assertAlmostEqual(entry.next_attempt_at, expected, delta=timedelta(seconds=30))
+
+    def test_enqueue_is_idempotent(self):
+        order = self.create_pos_orders(1)
+        entry = self.Outbox._enqueue(order)
+        entry.write({'state': 'failed', 'last_error': 'Invalid HS code'})
+
+        self.assertEqual(self.Outbox._enqueue(order), entry)
+        self.assertEqual(entry.state, 'pending')
+        self.assertFalse(entry.last_error)
+
+    def test_claim_takes_due_entries_only(self):
+        due, later = self._enqueue_due(self.create_pos_orders(2))
+        later.next_attempt_at = fields.Datetime.now() + timedelta(minutes=5)
+        self.env.flush_all()
+
+        self.assertEqual(self.Outbox._claim_next(), due)
+        due.state = 'done'
+        self.env.flush_all()
+        self.assertFalse(self.Outbox._claim_next())
+
+    def test_claimed_batch_is_leased(self):
+        entries = self._enqueue_due(self.create_pos_orders(3))
+
+        leased = self.Outbox._claim_batch(2, 300)
+        self.assertEqual(leased, entries[:2])
+        for entry in leased:
+            self.assertDueIn(entry, timedelta(seconds=300))
+        # Leased entries are out of reach of every other claimer until the lease runs out
+        self.assertEqual(self.Outbox._claim_batch(5, 300), entries[2])
+        self.assertFalse(self.Outbox._claim_next())
+
+    def test_failures_back_off_then_give_up(self):
+        order = self.create_pos_orders(1)
+        entry = self._enqueue_due(order)
+        self.patch_gateway(gateway_response(200, rejected_data()))
+
+        entry._process()
+        self.assertEqual((entry.state, entry.attempt_count), ('pending', 1))
+        self.assertEqual(entry.last_error, 'Invalid HS code')
+        self.assertDueIn(entry, timedelta(minutes=2))
+        self.assertEqual(order.fbr_status, 'failed')
+
+        entry._process()
+        self.assertEqual((entry.state, entry.attempt_count), ('failed', 2))
+
+    def test_accepted_and_throttled_documents(self):
+        accepted, throttled = self.create_pos_orders(2)
+        accepted_entry, throttled_entry = self._enqueue_due(accepted | throttled)
+
+        self.patch_gateway(gateway_response(200, accepted_data('FBR-O1')))
+        accepted_entry._process()
+        self.assertEqual((accepted_entry.state, accepted_entry.attempt_count), ('done', 1))
+        self.assertEqual(accepted.fbr_invoice_number, 'FBR-O1')
+
+        self.patch_gateway(gateway_response(429, {'Message': 'Too many requests'}, {'Retry-After': '30'}))
+        self.assertIs(throttled_entry._process(), False)
+        self.assertEqual((throttled_entry.state, throttled_entry.attempt_count), ('pending', 0))
+        self.assertDueIn(throttled_entry, timedelta(seconds=30))
+        self.assertEqual(throttled.fbr_status, 'draft')
+
+    def test_ambiguous_entry_is_parked_without_a_lookup(self):
+        entry = self._enqueue_due(self.create_pos_orders(1))
+
+        entry._record_ambiguous('read timed out')
+        self.assertEqual((entry.state, entry.attempt_count), ('failed', 1))
+        self.assertEqual(entry.last_error, 'read timed out')
+
+    def test_ambiguous_entry_is_checked_again_with_a_lookup(self):
+        self.env['ir.config_parameter'].sudo().set_param('fbr.invoice_lookup_url', 'https://gw.fbr.gov.pk/lookup')
+        entry = self._enqueue_due(self.create_pos_orders(1))
+
+        entry._record_ambiguous('read timed out')
+        self.assertEqual((entry.state, entry.attempt_count), ('pending', 1))
+        self.assertDueIn(entry, timedelta(minutes=2))
+
+    def test_drain_records_each_outcome(self):
+        accepted, rejected, gone = self.create_pos_orders(3)
+        entries = self._enqueue_due(accepted | rejected | gone)
+        self.patch_gateway(by_ref={
+            accepted.name: gateway_response(200, accepted_data('FBR-O2')),
+            rejected.name: gateway_response(200, rejected_data()),
+        })
+        gone_entry = entries.filtered(lambda entry: entry.res_id == gone.id)
+        gone_entry.res_id = max(self.env['pos.order'].search([]).ids) + 1000
+        self.env.flush_all()
+
+        leased = self.Outbox._claim_batch(10, 300)
+        self.assertEqual(leased._drain(), 1)
+        by_order = {entry.res_id: entry for entry in leased}
+        self.assertEqual(by_order[accepted.id].state, 'done')
+        self.assertEqual(by_order[rejected.id].state, 'pending')
+        self.assertEqual(by_order[rejected.id].attempt_count, 1)
+        self.assertEqual(gone_entry.state, 'done')
@@ -0,0 +1,68 @@
+import json
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from .common import FbrGatewayCommon
+from ..tools import fbr_tax_engine
+
+
+@tagged('post_install', '-at_install')
+class TestFbrPosItems(FbrGatewayCommon):
+
+    def setUp(self):
+        super().setUp()
+        self.order = self.create_pos_orders(1, line_count=6)
+        self.expected = self.order._build_fbr_items()[self.order.id]
+
+    def _send(self, items, scenario_id=None):
+        data = {'items': items}
+        if scenario_id:
+            data['scenarioId'] = scenario_id
+        self.order.fbr_pos_items = json.dumps(data)
+
+    def _validated(self):
+        lines_by_order, tax_info = self.order._fbr_item_lines()
+        return self.order._fbr_validated_client_items(lines_by_order[self.order.id], tax_info)
+
+    def test_client_items_used_without_building_the_server_ones(self):
+        self._send(self.expected)
+        with patch.object(fbr_tax_engine, 'compute_document', side_effect=AssertionError("items built")):
+            self.assertEqual(self._validated(), self.expected)
+            self.assertEqual(self.order._prepare_fbr_items()[self.order.id], self.expected)
+
+    def test_client_items_rejected_on_any_mismatch(self):
+        tampered = [
+            ('hsCode', '9999.9999'),
+            ('uoM', 'KG'),
+            ('saleType', 'Exempt goods'),
+            ('rate', '5%'),
+            ('sroScheduleNo', 'SRO 1/2024'),
+            ('productDescription', 'Something else'),
+            ('quantity', self.expected[1]['quantity'] + 1),
+            ('unitPrice', self.expected[1]['unitPrice'] + 1),
+            ('itemSNo', 7),
+        ]
+        for key, value in tampered:
+            items = json.loads(json.dumps(self.expected))
+            items[1][key] = value
+            self._send(items)
+            self.assertIsNone(self._validated(), key)
+            self.assertEqual(self.order._prepare_fbr_items()[self.order.id], self.expected, key)
+
+        # Internally consistent amounts that do not follow the order's taxes
+        items = json.loads(json.dumps(self.expected))
+        items[0]['salesTaxApplicable'] = 0.0
+        items[0]['totalValues'] -= self.expected[0]['salesTaxApplicable']
+        self._send(items)
+        self.assertIsNone(self._validated())
+
+        self._send(self.expected[:-1])
+        self.assertIsNone(self._validated())
+
+    def test_client_scenario_is_replaced_by_the_server_one(self):
+        self._send(self.expected)
+        scenario_id = self.order._get_scenario_id()
+        other = 'SN001' if scenario_id != 'SN001' else 'SN002'
+        self._send(self.expected, scenario_id=other)
+        self.assertEqual(self.order._get_scenario_id(), scenario_id)
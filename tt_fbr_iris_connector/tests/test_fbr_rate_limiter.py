@@ -0,0 +1,94 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+import psycopg2
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import FbrGatewayCommon, gateway_response
+from ..tools.fbr_client import FbrClient
+from ..tools.fbr_rate_limiter import BACKGROUND, INTERACTIVE, FbrRateLimited, FbrRateLimiter
+
+
+@tagged('post_install', '-at_install')
+class TestFbrRateLimiter(FbrGatewayCommon):
+
+    def test_grants_then_refuses(self):
+        limiter = FbrRateLimiter(self.registry, 'limiter-grant', capacity=2, rate=0.01)
+        limiter.acquire()
+        limiter.acquire()
+        with self.assertRaises(FbrRateLimited) as caught:
+            limiter.acquire()
+        self.assertGreater(caught.exception.retry_after, 50)
+        # Each traffic class has a bucket of its own
+        FbrRateLimiter(self.registry, 'limiter-grant', BACKGROUND, capacity=1, rate=0.01).acquire()
+
+    def test_waits_within_max_wait(self):
+        limiter = FbrRateLimiter(self.registry, 'limiter-wait', capacity=1, rate=20, max_wait=1.0)
+        limiter.acquire()
+        with patch('time.sleep') as sleep, \
+                patch.object(FbrRateLimiter, '_take', side_effect=[(False, 0.05), (True, 0.0)]):
+            limiter.acquire()
+        sleep.assert_called_once_with(0.05)
+
+    def test_penalize_blocks_the_token(self):
+        limiter = FbrRateLimiter(self.registry, 'limiter-429', capacity=5, rate=5)
+        limiter.acquire()
+        limiter.penalize(30)
+        with self.assertRaises(FbrRateLimited) as caught:
+            limiter.acquire()
+        self.assertGreater(caught.exception.retry_after, 25)
+        self.cr.execute("SELECT refill_rate, throttled_count FROM fbr_rate_limit WHERE key = %s", [limiter.key])
+        refill_rate, throttled = self.cr.fetchone()
+        self.assertLess(refill_rate, 5)
+        self.assertEqual(throttled, 1)
+
+    def test_fails_closed(self):
+        unavailable = patch.object(FbrRateLimiter, '_take', side_effect=psycopg2.OperationalError("down"))
+        with unavailable:
+            with self.assertRaises(FbrRateLimited):
+                FbrRateLimiter(self.registry, 'limiter-down').acquire()
+            with self.assertRaises(FbrRateLimited):
+                FbrRateLimiter(self.registry, 'limiter-down', BACKGROUND, fail_open=True).acquire()
+            # Only interactive traffic may be let through, and only when configured
+            FbrRateLimiter(self.registry, 'limiter-down', fail_open=True).acquire()
+
+    # Registration lookups
+
+    def _buckets(self, client):
+        self.cr.execute("SELECT budget FROM fbr_rate_limit WHERE key = %s", [client.limiter.key])
+        return {budget for budget, in self.cr.fetchall()}
+
+    def test_tokens_with_or_without_scheme_share_bucket_and_session(self):
+        raw = FbrClient.from_env(self.env, ' test-token ')
+        prefixed = FbrClient.from_env(self.env, 'Bearer test-token')
+        self.assertEqual(raw.authorization, 'Bearer test-token')
+        self.assertEqual(raw.limiter.key, prefixed.limiter.key)
+        self.assertIs(raw.session, prefixed.session)
+
+    def test_registration_refresh_is_background_and_rescheduled_when_deferred(self):
+        partners = self.fbr_data.create_partner(registered=True) | self.fbr_data.create_partner(registered=True)
+        calls = self.patch_gateway(gateway_response(429, {'Message': 'Too many requests'}, {'Retry-After': '30'}))
+        cron = self.env.ref('tt_fbr_iris_connector.ir_cron_fbr_registration_refresh')
+        triggers = self.env['ir.cron.trigger'].search([('cron_id', '=', cron.id)])
+
+        self.env['fbr.registration.cache']._cron_refresh_stale()
+
+        self.assertTrue(calls)
+        self.assertFalse(self.env['fbr.registration.cache']._lookup(partners.mapped('ntn')),
+                         "a deferred lookup must not be cached as unregistered")
+        self.assertEqual(partners.mapped('fbr_registration_type'), ['Registered', 'Registered'])
+        new_triggers = self.env['ir.cron.trigger'].search([('cron_id', '=', cron.id)]) - triggers
+        self.assertTrue(new_triggers)
+        self.assertGreater(min(new_triggers.mapped('call_at')), fields.Datetime.now() + timedelta(seconds=25))
+        self.assertEqual(self._buckets(FbrClient.from_env(self.env, 'test-token')), {BACKGROUND})
+
+    def test_single_registration_check_is_interactive(self):
+        partner = self.fbr_data.create_partner(registered=True)
+        self.patch_gateway(gateway_response(200, {'REGISTRATION_TYPE': 'unregistered'}))
+
+        self.assertEqual(partner.check_fbr_registration(force=True), {partner.ntn: 'Unregistered'})
+        self.assertEqual(partner.fbr_registration_type, 'Unregistered')
+        self.assertEqual(self.env['fbr.registration.cache']._lookup([partner.ntn]), {partner.ntn: 'Unregistered'})
+        self.assertEqual(self._buckets(FbrClient.from_env(self.env, 'test-token')), {INTERACTIVE})
@@ -0,0 +1,54 @@
+from unittest.mock import patch
+
+import requests
+
+from odoo.tests import tagged
+
+from .common import FbrGatewayCommon, accepted_data, gateway_response
+
+
+@tagged('post_install', '-at_install')
+class TestFbrReceiptDeadline(FbrGatewayCommon):
+
+    def setUp(self):
+        super().setUp()
+        ICP = self.env['ir.config_parameter'].sudo()
+        ICP.set_param('fbr.http_adaptive_timeout', 'False')
+        ICP.set_param('fbr.http_read_timeout', 10)
+        ICP.set_param('fbr.invoice_lookup_url', '')
+        self.pos_config.fbr_receipt_deadline_ms = 1500
+        self.notify = self.startPatcher(patch.object(self.registry['pos.config'], '_notify', autospec=True))
+        self.order = self.create_pos_orders(1)
+        self.entry = self.env['fbr.outbox']._enqueue(self.order)
+
+    def test_send_on_the_wire_is_not_cut_by_the_deadline(self):
+        calls = self.patch_gateway(gateway_response(200, accepted_data('FBR-D1')))
+
+        status = self.env['pos.order'].post_fbr_within_deadline(self.order.id)
+
+        connect_timeout, read_timeout = calls[0][2]['timeout']
+        self.assertLessEqual(connect_timeout, 1.5)
+        self.assertEqual(read_timeout, 10.0, "the deadline must not cut the read of a sent invoice")
+        self.assertEqual(status['fbr_status'], 'posted')
+        self.assertEqual(status['fbr_invoice_number'], 'FBR-D1')
+        # The POS stopped waiting at its deadline: the number reaches it over the bus
+        (config, (message, payload)), _kwargs = self.notify.call_args
+        self.assertEqual(message, 'FBR_STATUS')
+        self.assertEqual(payload['orders'][0]['fbr_invoice_number'], 'FBR-D1')
+
+    def test_unsent_order_is_left_to_the_outbox(self):
+        self.patch_gateway(requests.exceptions.ConnectTimeout("connect timed out"))
+
+        status = self.env['pos.order'].post_fbr_within_deadline(self.order.id)
+
+        self.assertEqual(status['fbr_status'], 'draft')
+        self.assertFalse(self.order.fbr_needs_reconciliation)
+        self.assertEqual(self.entry.state, 'pending')
+
+    def test_ambiguous_send_is_parked(self):
+        self.patch_gateway(requests.exceptions.ReadTimeout("read timed out"))
+
+        self.env['pos.order'].post_fbr_within_deadline(self.order.id)
+
+        self.assertTrue(self.order.fbr_needs_reconciliation)
+        self.assertNotEqual(self.entry.state, 'pending', "the outbox must not resend an ambiguous invoice")
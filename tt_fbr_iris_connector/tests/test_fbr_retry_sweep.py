@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import FbrGatewayCommon, accepted_data, gateway_response, rejected_data
+
+
+@tagged('post_install', '-at_install')
+class TestFbrRetrySweep(FbrGatewayCommon):
+
+    def setUp(self):
+        super().setUp()
+        ICP = self.env['ir.config_parameter'].sudo()
+        ICP.set_param('fbr.invoice_lookup_url', '')
+        ICP.set_param('fbr.sweep_base_backoff', 60)
+
+    def _sweep(self):
+        self.env.flush_all()
+        result = self.env['pos.order']._cron_fbr_retry_sweep(max_workers=2, time_budget=60)
+        # Every document is posted in a cursor of its own
+        self.env.invalidate_all()
+        return result
+
+    def test_sweep_posts_and_backs_off(self):
+        accepted, rejected = self.create_pos_orders(2)
+        (accepted | rejected).write({'fbr_status': 'failed', 'fbr_attempt_count': 2})
+        calls = self.patch_gateway(by_ref={
+            accepted.name: gateway_response(200, accepted_data('FBR-S1')),
+            rejected.name: gateway_response(200, rejected_data()),
+        })
+
+        self.assertEqual(self._sweep(), {'posted': 1, 'failed': 1})
+        self.assertEqual(accepted.fbr_status, 'posted')
+        self.assertEqual((accepted.fbr_attempt_count, accepted.fbr_next_retry_at), (0, False))
+        self.assertEqual((rejected.fbr_status, rejected.fbr_attempt_count), ('failed', 3))
+        self.assertAlmostEqual(rejected.fbr_next_retry_at, fields.Datetime.now() + timedelta(seconds=240),
+                               delta=timedelta(seconds=30))
+
+        # Backed off documents wait for their turn
+        self.assertEqual(self._sweep(), {'posted': 0, 'failed': 0})
+        self.assertEqual(len(calls), 2)
+
+    def test_sweep_leaves_queued_and_unreconciled_documents_alone(self):
+        queued, ambiguous = self.create_pos_orders(2)
+        (queued | ambiguous).write({'fbr_status': 'failed'})
+        self.env['fbr.outbox']._enqueue(queued)
+        ambiguous.fbr_needs_reconciliation = True
+        self.patch_gateway(gateway_response(200, accepted_data('FBR-S2')))
+
+        self.assertEqual(self._sweep(), {'posted': 0, 'failed': 0})
+        self.assertEqual((queued | ambiguous).mapped('fbr_status'), ['failed', 'failed'])
+
+    def test_throttled_document_is_deferred(self):
+        order = self.create_pos_orders(1)
+        order.fbr_status = 'failed'
+        self.patch_gateway(gateway_response(429, {'Message': 'Too many requests'}, {'Retry-After': '30'}))
+
+        self.assertEqual(self._sweep(), {'posted': 0, 'failed': 1})
+        self.assertEqual(order.fbr_attempt_count, 0, "a throttled document is not a failed attempt")
+        self.assertAlmostEqual(order.fbr_next_retry_at, fields.Datetime.now() + timedelta(seconds=30),
+                               delta=timedelta(seconds=30))
@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from odoo.tests import tagged
+
+from .common import FbrGatewayCommon
+
+
+@tagged('post_install', '-at_install')
+class TestFbrStatusSummary(FbrGatewayCommon):
+
+    def test_oldest_pending_uses_the_pending_predicate(self):
+        failed, pending, posted = self.create_pos_orders(3)
+        day = datetime(2026, 3, 2)
+        failed.write({'state': 'paid', 'fbr_status': 'failed', 'date_order': day.replace(hour=8)})
+        pending.write({'state': 'paid', 'fbr_status': 'draft', 'date_order': day.replace(hour=10)})
+        posted.write({'state': 'paid', 'fbr_status': 'posted', 'date_order': day.replace(hour=7)})
+        self.env.flush_all()
+
+        Summary = self.env['fbr.status.summary']
+        Summary._refresh_keys([pending.session_id.id], [day.date()])
+        summary = Summary.search([('session_id', '=', pending.session_id.id), ('date', '=', day.date())])
+
+        self.assertEqual((summary.posted_count, summary.failed_count, summary.pending_count), (1, 1, 1))
+        self.assertEqual(summary.pending_amount, pending.amount_total)
+        self.assertEqual(summary.oldest_pending_at, pending.date_order, "a failed order is not pending")
+
+        pending.write({'fbr_status': 'posted'})
+        self.env.flush_all()
+        Summary._refresh_keys([pending.session_id.id], [day.date()])
+        summary = Summary.search([('session_id', '=', pending.session_id.id), ('date', '=', day.date())])
+        self.assertEqual(summary.pending_count, 0)
+        self.assertFalse(summary.oldest_pending_at)
@@ -0,0 +1,36 @@
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from .common import FbrGatewayCommon
+
+
+@tagged('post_install', '-at_install')
+class TestFbrStatusSync(FbrGatewayCommon):
+
+    def test_status_of_many_orders_by_id_or_uuid(self):
+        by_id, by_uuid, other = self.create_pos_orders(3)
+        by_uuid.write({'fbr_status': 'posted', 'fbr_invoice_number': 'FBR-U1'})
+
+        statuses = self.env['pos.order'].get_fbr_status(order_ids=[by_id.id], uuids=[by_uuid.uuid])
+
+        self.assertEqual(sorted(statuses, key=lambda status: status['id']), [
+            {'id': by_id.id, 'uuid': by_id.uuid, 'fbr_status': 'draft', 'fbr_invoice_number': '',
+             'fbr_error_message': ''},
+            {'id': by_uuid.id, 'uuid': by_uuid.uuid, 'fbr_status': 'posted', 'fbr_invoice_number': 'FBR-U1',
+             'fbr_error_message': ''},
+        ])
+        self.assertNotIn(other.id, [status['id'] for status in statuses])
+        self.assertEqual(self.env['pos.order'].get_fbr_status(), [])
+
+    def test_status_is_pushed_once_per_config(self):
+        orders = self.create_pos_orders(2)
+        notify = self.startPatcher(patch.object(self.registry['pos.config'], '_notify', autospec=True))
+
+        orders._fbr_notify_status()
+
+        (config, (message, payload)), _kwargs = notify.call_args
+        self.assertEqual(notify.call_count, 1)
+        self.assertEqual(config, self.pos_config)
+        self.assertEqual(message, 'FBR_STATUS')
+        self.assertEqual({status['id'] for status in payload['orders']}, set(orders.ids))
@@ -0,0 +1,60 @@
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from .common import FbrGatewayCommon
+from ..tools import fbr_tax_engine
+
+
+@tagged('post_install', '-at_install')
+class TestFbrTaxEngine(FbrGatewayCommon):
+
+    def _legacy_line_amounts(self, move, line):
+        """Per-line computation of the original _compute_tax_amounts."""
+        def rate(fbr_tax_type):
+            tax = line.tax_ids.filtered(lambda t: t.fbr_tax_type == fbr_tax_type)[:1]
+            return tax.amount if tax else 0.0
+
+        unregistered = (move.partner_id.fbr_registration_type or 'Unregistered') == 'Unregistered'
+        base = line.price_unit * line.quantity * (1 - (line.discount or 0.0) / 100)
+        sales = base * rate('sales_tax') / 100
+        extra = base * rate('extra_tax') / 100
+        further = base * rate('further_tax') / 100 if unregistered else 0.0
+        withholding = base * rate('withholding_tax') / 100
+        fed_tax = line.tax_ids.filtered(lambda t: t.fbr_tax_type == 'fed_payable')[:1]
+        fed = fed_tax.amount * line.quantity if fed_tax.amount_type == 'fixed' else 0.0
+        return {
+            'value_sales_excluding_st': base,
+            'sales_tax_applicable': sales,
+            'extra_tax_applicable': extra,
+            'further_tax_applicable': further,
+            'withholding_tax_applicable': withholding,
+            'fed_payable': fed,
+            'total_values': base + sales + extra + further + withholding + fed,
+        }
+
+    def test_tax_engine_matches_legacy_per_line(self):
+        for registered in (False, True):
+            partner = self.fbr_data.create_partner(registered=registered)
+            move = self.fbr_data.create_invoice(partner, self.products, 12)
+            move.invoice_line_ids[:3].write({'discount': 12.5})
+            lines = move.invoice_line_ids
+            amounts, totals = move._compute_fbr_document_amounts(lines)
+            for index, line in enumerate(lines):
+                for name, value in self._legacy_line_amounts(move, line).items():
+                    self.assertAlmostEqual(amounts[name][index], value, delta=0.006,
+                                           msg=f"{name} of line {index + 1} (registered buyer: {registered})")
+            self.assertAlmostEqual(totals['total_values'], sum(amounts['total_values']), delta=0.01 * len(lines))
+            if registered:
+                self.assertFalse(any(amounts['further_tax_applicable']))
+
+    def test_tax_engine_python_fallback(self):
+        matrix = [[18, 0, 4, 0, 45, 0], [18, 3, 0, 0, 0, 1], [0, 0, 0, 0, 0, 0]]
+        args = ([100.0, 33.33, 7.0], [2, 3, 1], [0.0, 10.0, 0.0], matrix)
+        with patch.object(fbr_tax_engine, 'np', None):
+            lines_python, totals_python = fbr_tax_engine.compute_document(*args)
+        lines, totals = fbr_tax_engine.compute_document(*args)
+        self.assertEqual(lines_python, lines)
+        self.assertEqual(totals_python, totals)
+        self.assertEqual(lines['fed_payable'][0], 90.0)
+        self.assertEqual(fbr_tax_engine.compute_document([], [], [], [])[1]['total_values'], 0.0)
@@ -0,0 +1,7 @@
+from . import fbr_errors
+from . import fbr_client
+from . import fbr_tax_engine
+from . import fbr_catalog_fetcher
+from . import fbr_metrics
+from . import fbr_rate_limiter
+from . import fbr_circuit_breaker
@@ -0,0 +1,55 @@
+"""Version stamps of the FBR ormcaches, shared by all workers through ``fbr_cache_stamp``.
+
+The FBR tax assignment and the option catalogs are cached per worker with
+``ormcache``, the stamp of their scope being part of the cache key. A change
+bumps only the stamps of the scopes it touches, instead of clearing the
+registry cache of every model in every worker. Stamps are drawn from a
+sequence, so a value is never reused, even when the bumping transaction is
+rolled back.
+
+Every worker reads the stamps at most every REFRESH_SECONDS; the worker
+making a change uses its new stamps at once.
+"""
+import threading
+import time
+
+REFRESH_SECONDS = 2.0
+
+TAX_ASSIGNMENT = 'tax_assignment'
+
+# dbname -> {'stamps': {scope: stamp}, 'fetched'}
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def catalog_scope(opt_type):
+    return 'catalog:%s' % opt_type
+
+
+def get(env, scope):
+    """Current stamp of ``scope``, 0 until it is first bumped."""
+    entry = _cache.get(env.registry.db_name)
+    if not entry or time.monotonic() - entry['fetched'] >= REFRESH_SECONDS:
+        env.cr.execute("SELECT scope, stamp FROM fbr_cache_stamp")
+        entry = {'stamps': dict(env.cr.fetchall()), 'fetched': time.monotonic()}
+        with _cache_lock:
+            _cache[env.registry.db_name] = entry
+    return entry['stamps'].get(scope, 0)
+
+
+def bump(env, scopes):
+    """Give ``scopes`` new stamps in the current transaction."""
+    scopes = sorted(set(scopes))
+    if not scopes:
+        return
+    env.cr.execute("""
+        INSERT INTO fbr_cache_stamp (scope, stamp)
+        SELECT scope, nextval('fbr_cache_stamp_seq') FROM unnest(%s::varchar[]) AS scope
+        ON CONFLICT (scope) DO UPDATE SET stamp = EXCLUDED.stamp
+        RETURNING scope, stamp
+    """, [scopes])
+    bumped = dict(env.cr.fetchall())
+    with _cache_lock:
+        entry = _cache.get(env.registry.db_name)
+        if entry:
+            _cache[env.registry.db_name] = dict(entry, stamps=dict(entry['stamps'], **bumped))
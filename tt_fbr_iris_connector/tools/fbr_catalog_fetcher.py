@@ -0,0 +1,109 @@
+"""Concurrent fetcher for the dependent FBR catalogs (rates, SRO schedules, SRO items).
+
+The gateway exposes these as a dependency graph::
+
+    sale type -> rates -> SRO schedules -> SRO items
+
+``FbrCatalogFetcher`` walks it breadth-first on a bounded thread pool,
+submitting each child request as soon as its parent answers and fetching
+every rate and SRO only once, however many parents return it. Workers only
+do HTTP through an :class:`FbrClient`; the caller writes the collected
+results back on its own cursor.
+"""
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import logging
+
+_logger = logging.getLogger(__name__)
+
+RATE_URL = "https://gw.fbr.gov.pk/pdi/v2/SaleTypeToRate?date={date}&transTypeId={sale_type}&originationSupplier={supplier}"
+SRO_URL = "https://gw.fbr.gov.pk/pdi/v1/SroSchedule?rate_id={rate_id}&date={date}&origination_supplier_csv={supplier}"
+SRO_ITEM_URL = "https://gw.fbr.gov.pk/pdi/v2/SROItem?date={iso_date}&sro_id={sro_id}"
+
+
+class FbrCatalogResult:
+    """Collected catalog data, keyed by FBR code."""
+
+    def __init__(self):
+        self.rates = {}        # rate id -> description
+        self.sros = {}         # SRO id -> description
+        self.sro_items = {}    # SRO id -> {item id: description}
+        self.failed = set()    # layers ('rate', 'sro') with at least one failed call
+        self.failed_sros = set()  # SRO ids whose item list could not be fetched
+        self.calls = 0
+
+
+class FbrCatalogFetcher:
+
+    def __init__(self, client, date, origination_supplier, max_workers=10):
+        self.client = client
+        self.date = date
+        self.origination_supplier = origination_supplier
+        self.max_workers = max_workers
+
+    def get_list(self, url):
+        """GET a catalog list. Returns [] when the gateway has none (404) and None on failure."""
+        try:
+            response = self.client.get(url)
+        except Exception as e:
+            _logger.error(f"💥 FBR API error [{url}]: {e}")
+            return None
+        if response.status_code == 404:
+            return []
+        if response.status_code != 200:
+            _logger.error(f"❌ FBR API call failed [{url}]: {response.status_code} - {response.text}")
+            return None
+        try:
+            return response.json() or []
+        except ValueError:
+            _logger.error(f"❌ FBR API returned invalid JSON [{url}]")
+            return None
+
+    def fetch(self, sale_type_codes):
+        """Fetch rates, SRO schedules and SRO items reachable from ``sale_type_codes``."""
+        result = FbrCatalogResult()
+        fmt = {
+            'date': self.date.strftime("%d-%b-%Y"),
+            'iso_date': self.date.strftime("%Y-%m-%d"),
+            'supplier': self.origination_supplier,
+        }
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {}
+
+            def submit(kind, key, url):
+                result.calls += 1
+                pending[executor.submit(self.get_list, url)] = (kind, key)
+
+            for code in sale_type_codes:
+                submit('rate', code, RATE_URL.format(sale_type=code, **fmt))
+
+            while pending:
+                done, _not_done = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, key = pending.pop(future)
+                    data = future.result()
+                    if data is None:
+                        if kind == 'sro_item':
+                            result.failed_sros.add(key)
+                        else:
+                            result.failed.add(kind)
+                        continue
+                    if kind == 'rate':
+                        for rate in data:
+                            rate_id, desc = rate.get("ratE_ID"), rate.get("ratE_DESC")
+                            if rate_id in (None, '') or str(rate_id) in result.rates:
+                                continue
+                            result.rates[str(rate_id)] = desc
+                            submit('sro', rate_id, SRO_URL.format(rate_id=rate_id, **fmt))
+                    elif kind == 'sro':
+                        for sro in data:
+                            sro_id, desc = sro.get("srO_ID"), sro.get("srO_DESC")
+                            if sro_id in (None, '') or str(sro_id) in result.sros:
+                                continue
+                            result.sros[str(sro_id)] = desc
+                            submit('sro_item', str(sro_id), SRO_ITEM_URL.format(sro_id=sro_id, **fmt))
+                    else:
+                        result.sro_items[key] = {
+                            str(item.get("srO_ITEM_ID")): item.get("srO_ITEM_DESC")
+                            for item in data if item.get("srO_ITEM_ID") not in (None, '')
+                        }
+        return result
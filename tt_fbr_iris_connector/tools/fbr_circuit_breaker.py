@@ -0,0 +1,210 @@
+"""Circuit breaker for the FBR gateway, shared by all workers through ``fbr_circuit_breaker``.
+
+The breaker of a host opens after ``failure_threshold`` consecutive failures.
+Transport errors, 5xx responses and calls slower than ``slow_call_seconds``
+all count as failures. While the breaker is open, calls fail at once with
+FbrCircuitOpen instead of waiting for the gateway timeouts. Once
+``open_until`` has passed, a single call per host is let through as a trial,
+claimed atomically by setting ``half_open_until``; the others keep failing
+until its outcome is recorded. A success closes the breaker and a failure
+opens it again. The probe cron closes it as soon as the gateway answers,
+without waiting for a real document.
+
+Every worker caches the breaker state for REFRESH_SECONDS, so a healthy
+gateway costs no database access per call.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import psycopg2
+
+from .fbr_errors import FbrDeferred
+
+_logger = logging.getLogger(__name__)
+
+REFRESH_SECONDS = 5.0
+# Seconds a trial call holds the breaker half-open when it is never recorded
+DEFAULT_TRIAL_SECONDS = 30.0
+
+# (dbname, host) -> {'state', 'failures', 'open_until', 'half_open_until', 'fetched'}
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class FbrCircuitOpen(FbrDeferred):
+    """The gateway is considered down; the call was not sent."""
+
+    def __init__(self, host, retry_after):
+        self.host = host
+        super().__init__(retry_after, "FBR gateway %s is unavailable, posting deferred for %.0f seconds"
+                         % (host, max(float(retry_after), 0.0)))
+
+
+class FbrCircuitBreaker:
+    """Per-host breaker; holds the registry and plain settings so threads can use it."""
+
+    def __init__(self, registry, failure_threshold=5, open_seconds=60.0, slow_call_seconds=8.0,
+                 trial_seconds=DEFAULT_TRIAL_SECONDS):
+        self.registry = registry
+        self.failure_threshold = int(failure_threshold)
+        self.open_seconds = float(open_seconds)
+        self.slow_call_seconds = float(slow_call_seconds)
+        self.trial_seconds = float(trial_seconds)
+
+    def _cache_key(self, host):
+        return (self.registry.db_name, host)
+
+    def _state(self, host):
+        key = self._cache_key(host)
+        entry = _cache.get(key)
+        if entry and time.monotonic() - entry['fetched'] < REFRESH_SECONDS:
+            return entry
+        try:
+            with self.registry.cursor() as cr:
+                cr.execute("""
+                    SELECT state, consecutive_failures, open_until, half_open_until
+                      FROM fbr_circuit_breaker WHERE host = %s
+                """, [host])
+                row = cr.fetchone()
+        except psycopg2.Error as e:
+            _logger.warning("FBR circuit breaker state unavailable: %s", e)
+            row = None
+        return self._remember(host, row)
+
+    def _remember(self, host, row):
+        state, failures, open_until, half_open_until = row or ('closed', 0, None, None)
+        entry = {'state': state, 'failures': failures or 0, 'open_until': open_until,
+                 'half_open_until': half_open_until, 'fetched': time.monotonic()}
+        with _cache_lock:
+            _cache[self._cache_key(host)] = entry
+        return entry
+
+    def before_call(self, host):
+        """Raise FbrCircuitOpen while the breaker of ``host`` is open.
+
+        Past ``open_until``, only the caller claiming the trial gets
+        through; returns True for it, and it must then ``record`` the
+        outcome or ``release_trial``.
+        """
+        entry = self._state(host)
+        if entry['state'] != 'open':
+            return False
+        now = datetime.utcnow()
+        until = self._closed_at(entry, now)
+        if until > now:
+            raise FbrCircuitOpen(host, (until - now).total_seconds())
+        return self._claim_trial(host, now)
+
+    @staticmethod
+    def _closed_at(entry, now):
+        """When a call may go through again: past ``open_until`` and any running trial."""
+        return max(until for until in (entry['open_until'], entry['half_open_until'], now) if until)
+
+    def _claim_trial(self, host, now):
+        try:
+            with self.registry.cursor() as cr:
+                cr.execute("""
+                    UPDATE fbr_circuit_breaker
+                       SET half_open_until = %(until)s
+                     WHERE host = %(host)s AND state = 'open' AND COALESCE(open_until, %(now)s) <= %(now)s
+                       AND (half_open_until IS NULL OR half_open_until <= %(now)s)
+                 RETURNING state, consecutive_failures, open_until, half_open_until
+                """, {'host': host, 'now': now, 'until': now + timedelta(seconds=self.trial_seconds)})
+                row = cr.fetchone()
+                claimed = bool(row)
+                if not claimed:
+                    cr.execute("""
+                        SELECT state, consecutive_failures, open_until, half_open_until
+                          FROM fbr_circuit_breaker WHERE host = %s
+                    """, [host])
+                    row = cr.fetchone()
+        except psycopg2.Error as e:
+            # Same as an unreadable state: the gateway is not known to be down
+            _logger.warning("FBR circuit breaker trial unavailable: %s", e)
+            return False
+        entry = self._remember(host, row)
+        if claimed:
+            _logger.info("FBR circuit breaker for %s half-open, sending a trial call", host)
+            return True
+        if entry['state'] != 'open':
+            # The trial closed it meanwhile
+            return False
+        raise FbrCircuitOpen(host, max((self._closed_at(entry, now) - now).total_seconds(), 1.0))
+
+    def release_trial(self, host):
+        """Give back a trial that ended without telling anything about the gateway health."""
+        try:
+            with self.registry.cursor() as cr:
+                cr.execute("UPDATE fbr_circuit_breaker SET half_open_until = NULL WHERE host = %s", [host])
+        except psycopg2.Error as e:
+            _logger.warning("Could not release the FBR circuit breaker trial: %s", e)
+        forget(self.registry, host)
+
+    def record(self, host, ok, elapsed, error=None):
+        """Account for one call to ``host``; slow calls count as failures."""
+        if ok and elapsed > self.slow_call_seconds:
+            ok, error = False, "Slow response: %.1fs" % elapsed
+        entry = _cache.get(self._cache_key(host))
+        if ok and entry and entry['state'] == 'closed' and not entry['failures']:
+            return
+        now = datetime.utcnow()
+        try:
+            with self.registry.cursor() as cr:
+                if ok:
+                    cr.execute("""
+                        UPDATE fbr_circuit_breaker
+                           SET state = 'closed', consecutive_failures = 0, open_until = NULL, half_open_until = NULL
+                         WHERE host = %s AND (state != 'closed' OR consecutive_failures != 0)
+                     RETURNING state, consecutive_failures, open_until, half_open_until
+                    """, [host])
+                    row = cr.fetchone() or ('closed', 0, None, None)
+                    if entry and entry['state'] != 'closed':
+                        _logger.info("FBR circuit breaker for %s closed", host)
+                else:
+                    cr.execute("""
+                        INSERT INTO fbr_circuit_breaker
+                               (host, state, consecutive_failures, trip_count, last_failure_at, last_error)
+                        VALUES (%(host)s, 'closed', 0, 0, %(now)s, %(error)s)
+                        ON CONFLICT (host) DO NOTHING
+                    """, {'host': host, 'now': now, 'error': error})
+                    cr.execute("""
+                        UPDATE fbr_circuit_breaker
+                           SET consecutive_failures = consecutive_failures + 1,
+                               last_failure_at = %(now)s,
+                               last_error = %(error)s,
+                               trip_count = trip_count + CASE
+                                   WHEN state != 'open' AND consecutive_failures + 1 >= %(threshold)s THEN 1 ELSE 0 END,
+                               opened_at = CASE
+                                   WHEN state != 'open' AND consecutive_failures + 1 >= %(threshold)s THEN %(now)s
+                                   ELSE opened_at END,
+                               open_until = CASE
+                                   WHEN consecutive_failures + 1 >= %(threshold)s THEN %(until)s ELSE open_until END,
+                               state = CASE
+                                   WHEN consecutive_failures + 1 >= %(threshold)s THEN 'open' ELSE state END,
+                               half_open_until = NULL
+                         WHERE host = %(host)s
+                     RETURNING state, consecutive_failures, open_until, half_open_until
+                    """, {
+                        'host': host,
+                        'now': now,
+                        'error': error,
+                        'threshold': self.failure_threshold,
+                        'until': now + timedelta(seconds=self.open_seconds),
+                    })
+                    row = cr.fetchone()
+                    if row[0] == 'open' and (not entry or entry['state'] != 'open'):
+                        _logger.warning("FBR circuit breaker for %s opened after %s failures: %s", host, row[1], error)
+        except psycopg2.Error as e:
+            _logger.warning("Could not update the FBR circuit breaker: %s", e)
+            return
+        self._remember(host, row)
+
+
+def forget(registry, host=None):
+    """Drop the cached state of ``host`` (or all hosts) after a manual change."""
+    with _cache_lock:
+        for key in list(_cache):
+            if key[0] == registry.db_name and (host is None or key[1] == host):
+                del _cache[key]
@@ -0,0 +1,246 @@
+import gzip
+import json
+import os
+import threading
+import time
+import logging
+
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from . import fbr_metrics
+from .fbr_circuit_breaker import FbrCircuitBreaker
+from .fbr_errors import FbrDeferred
+from .fbr_rate_limiter import BACKGROUND, INTERACTIVE, FbrRateLimiter, retry_after_of
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 10.0
+# (burst, requests per second) of each rate limiter budget
+DEFAULT_RATE_LIMITS = {INTERACTIVE: (10.0, 5.0), BACKGROUND: (5.0, 2.0)}
+# Adaptive read timeout: ADAPTIVE_FACTOR x observed p99, never below
+# ADAPTIVE_MIN_READ_TIMEOUT nor above the configured read timeout
+ADAPTIVE_FACTOR = 3.0
+ADAPTIVE_MIN_READ_TIMEOUT = 2.0
+ADAPTIVE_MIN_SAMPLES = 50
+
+# One pooled session per (process, credential, pool size). Odoo prefork workers
+# get their own sessions since the pid is part of the key.
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _get_session(authorization, pool_size):
+    key = (os.getpid(), authorization, pool_size)
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                if authorization:
+                    session.headers['Authorization'] = authorization
+                _sessions[key] = session
+    return session
+
+
+def authorization_header(token):
+    """``Authorization`` header value of a bearer ``token``, stored with or without its scheme.
+
+    Every caller must go through it: the limiter bucket and the pooled
+    session are both keyed on the resulting value.
+    """
+    token = (token or '').strip()
+    if token and not token.lower().startswith('bearer '):
+        token = f'Bearer {token}'
+    return token
+
+
+def is_ambiguous_error(exc):
+    """Whether the gateway may have received the request before ``exc`` was raised.
+
+    Only failures to open the connection are known to have sent nothing;
+    a read timeout or a reset mid-response may follow an accepted post.
+    """
+    if isinstance(exc, (requests.exceptions.ConnectTimeout, requests.exceptions.SSLError,
+                        requests.exceptions.ProxyError, requests.exceptions.InvalidURL)):
+        return False
+    reason = exc.args[0] if exc.args else None
+    return not isinstance(getattr(reason, 'reason', reason), NewConnectionError)
+
+
+class FbrClient:
+    """Keep-alive HTTP client for the FBR gateway.
+
+    Holds plain values only, so it can be built on the request cursor and
+    then used from worker threads without touching the ORM.
+    """
+
+    def __init__(self, authorization, pool_size=DEFAULT_POOL_SIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, gzip_requests=False, limiter=None, breaker=None,
+                 adaptive_timeout=False, deadline=None, registry=None):
+        self.authorization = authorization_header(authorization)
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.gzip_requests = gzip_requests
+        self.limiter = limiter
+        self.breaker = breaker
+        self.adaptive_timeout = adaptive_timeout
+        # time.monotonic() value after which no request may still be waiting
+        self.deadline = deadline
+        # Where the latency and status counters are shared with other processes
+        self.registry = registry
+
+    @classmethod
+    def from_env(cls, env, authorization):
+        """Build a client using the fbr.http_*, fbr.rate_limit_* and fbr.breaker_* system parameters.
+
+        Posts are paced by the shared limiter bucket named by the
+        ``fbr_traffic`` context key ('interactive' by default), waiting at
+        most ``fbr_rate_wait`` seconds (0 by default) for a token; when the
+        bucket cannot be read they are deferred, unless
+        fbr.rate_limit_fail_open lets interactive posts through. Past the
+        ``fbr_deadline`` context key, a ``time.monotonic()`` value, no
+        request is started and connecting is cut at it; a request already
+        sent keeps its full read timeout, since giving up on it would leave
+        the FBR answer unknown. ``fbr_pool_size`` overrides
+        fbr.http_pool_size for callers keeping many posts in flight.
+        """
+        ICP = env['ir.config_parameter'].sudo()
+        authorization = authorization_header(authorization)
+        limiter = None
+        if ICP.get_param('fbr.rate_limit_enabled', 'True').lower() in ('1', 'true'):
+            budget = env.context.get('fbr_traffic', INTERACTIVE)
+            burst, rate = DEFAULT_RATE_LIMITS[budget]
+            limiter = FbrRateLimiter(
+                env.registry, authorization, budget,
+                capacity=float(ICP.get_param(f'fbr.rate_limit_{budget}_burst', burst)),
+                rate=float(ICP.get_param(f'fbr.rate_limit_{budget}_rate', rate)),
+                max_wait=float(env.context.get('fbr_rate_wait', 0)),
+                fail_open=ICP.get_param('fbr.rate_limit_fail_open', 'False').lower() in ('1', 'true'),
+            )
+        connect_timeout = float(ICP.get_param('fbr.http_connect_timeout', DEFAULT_CONNECT_TIMEOUT))
+        read_timeout = float(ICP.get_param('fbr.http_read_timeout', DEFAULT_READ_TIMEOUT))
+        breaker = None
+        if ICP.get_param('fbr.breaker_enabled', 'True').lower() in ('1', 'true'):
+            breaker = FbrCircuitBreaker(
+                env.registry,
+                failure_threshold=int(ICP.get_param('fbr.breaker_failure_threshold', 5)),
+                open_seconds=float(ICP.get_param('fbr.breaker_open_seconds', 60)),
+                slow_call_seconds=float(ICP.get_param('fbr.breaker_slow_call_seconds', read_timeout * 0.8)),
+                # A trial never recorded, e.g. its worker died, holds the breaker for no longer than a call can last
+                trial_seconds=float(ICP.get_param('fbr.breaker_trial_seconds', connect_timeout + read_timeout)),
+            )
+        return cls(
+            authorization,
+            pool_size=int(env.context.get('fbr_pool_size') or ICP.get_param('fbr.http_pool_size', DEFAULT_POOL_SIZE)),
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            gzip_requests=ICP.get_param('fbr.http_gzip', 'False').lower() in ('1', 'true'),
+            limiter=limiter,
+            breaker=breaker,
+            adaptive_timeout=ICP.get_param('fbr.http_adaptive_timeout', 'True').lower() in ('1', 'true'),
+            deadline=env.context.get('fbr_deadline'),
+            registry=env.registry,
+        )
+
+    @property
+    def session(self):
+        return _get_session(self.authorization, self.pool_size)
+
+    def _timeout(self, timeout, url=None):
+        if timeout is None:
+            timeout = self._adaptive_timeout(url) if self.adaptive_timeout and url else self.timeout
+        elif not isinstance(timeout, tuple):
+            timeout = (min(self.timeout[0], timeout), timeout)
+        if self.deadline is None:
+            return timeout
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise FbrDeferred(0, "FBR posting deadline passed before the request was sent")
+        # Only the connect phase: a read cut short may follow an accepted post
+        return (min(timeout[0], remaining), timeout[1])
+
+    def _adaptive_timeout(self, url):
+        """Tighten the read timeout to a multiple of the p99 latency observed on this endpoint by all processes."""
+        if not self.registry:
+            return self.timeout
+        p99 = fbr_metrics.latency_quantile(fbr_metrics.shared_snapshot(self.registry), fbr_metrics.endpoint_of(url),
+                                           0.99, min_count=ADAPTIVE_MIN_SAMPLES)
+        if p99 is None or p99 == float('inf'):
+            return self.timeout
+        connect, read = self.timeout
+        return (connect, min(read, max(ADAPTIVE_MIN_READ_TIMEOUT, p99 * ADAPTIVE_FACTOR)))
+
+    def _request(self, method, url, check_breaker=True, trial=False, **kwargs):
+        """Send a request through the circuit breaker and record its latency and outcome.
+
+        ``trial`` tells that the caller already claimed the trial call of a
+        half-open breaker.
+        """
+        host = urlsplit(url).netloc
+        if self.breaker and check_breaker:
+            trial = self.breaker.before_call(host)
+        start = time.monotonic()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            elapsed = time.monotonic() - start
+            fbr_metrics.observe_request(url, elapsed, 'error')
+            if self.registry:
+                fbr_metrics.flush(self.registry)
+            if self.breaker:
+                # Giving up on our own deadline says nothing about the gateway health
+                if isinstance(e, requests.exceptions.ConnectTimeout) and kwargs['timeout'][0] < self.timeout[0]:
+                    if trial:
+                        self.breaker.release_trial(host)
+                else:
+                    self.breaker.record(host, False, elapsed, str(e))
+            raise
+        elapsed = time.monotonic() - start
+        fbr_metrics.observe_request(url, elapsed, response.status_code)
+        if self.registry:
+            fbr_metrics.flush(self.registry)
+        if self.breaker:
+            self.breaker.record(host, response.status_code < 500, elapsed, f"HTTP {response.status_code}")
+        return response
+
+    def get(self, url, params=None, timeout=None, probe=False):
+        """GET ``url``; a ``probe`` goes through even while the breaker is open."""
+        return self._request('GET', url, check_breaker=not probe, params=params, timeout=self._timeout(timeout, url))
+
+    def post(self, url, payload, timeout=None):
+        """POST ``payload`` as JSON, gzip-compressed when fbr.http_gzip is enabled.
+
+        Fails fast with FbrCircuitOpen while the gateway is down, then takes
+        a token from the shared rate limiter, which raises FbrRateLimited
+        when none is available in time, and feeds any 429 back into it.
+        """
+        body = json.dumps(payload, separators=(',', ':')).encode()
+        headers = {'Content-Type': 'application/json'}
+        if self.gzip_requests:
+            body = gzip.compress(body)
+            headers['Content-Encoding'] = 'gzip'
+        host = urlsplit(url).netloc
+        trial = self.breaker.before_call(host) if self.breaker else False
+        try:
+            if self.limiter:
+                self.limiter.acquire()
+            timeout = self._timeout(timeout, url)
+        except FbrDeferred:
+            if trial:
+                self.breaker.release_trial(host)
+            raise
+        response = self._request('POST', url, check_breaker=False, trial=trial, data=body, headers=headers,
+                                 timeout=timeout)
+        if response.status_code == 429 and self.limiter:
+            self.limiter.penalize(retry_after_of(response))
+        return response
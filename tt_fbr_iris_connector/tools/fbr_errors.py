@@ -0,0 +1,10 @@
+class FbrDeferred(Exception):
+    """The gateway must not be called now; retry the document in ``retry_after`` seconds.
+
+    Raised before anything is sent, so callers reschedule the document
+    instead of counting a failed attempt.
+    """
+
+    def __init__(self, retry_after, message=None):
+        self.retry_after = max(float(retry_after), 0.0)
+        super().__init__(message or "FBR posting deferred for %.0f seconds" % self.retry_after)
@@ -0,0 +1,191 @@
+"""Instrumentation of the FBR integration, shared by every process.
+
+Each process counts in memory and adds its counts to the ``fbr_metric``
+table (model ``fbr.metric``) at most every FLUSH_SECONDS, in a short
+transaction of its own. The scrape endpoint, the dashboard and the adaptive
+timeouts therefore see the traffic of HTTP workers, crons and ``fbr_drain``
+processes alike, and the counters survive worker recycling.
+"""
+import bisect
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import psycopg2
+
+_logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Seconds between two flushes of a process's counts to the database
+FLUSH_SECONDS = 5.0
+# Seconds a process keeps the shared counters read for the adaptive timeouts
+REFRESH_SECONDS = 30.0
+
+_lock = threading.Lock()
+# (metric, endpoint, label) -> increment not yet flushed; metric is one of
+# latency_bucket (label: upper bound), latency_sum, latency_count,
+# http_status (label: HTTP code or 'error'), fbr_status (label: statusCode)
+# and retries (label: source)
+_pending = {}
+_last_flush = {'at': 0.0}
+_shared = {}          # dbname -> (fetched, snapshot)
+
+
+def endpoint_of(url):
+    """Metric label of a gateway URL: its path, without the query string."""
+    return urlsplit(url).path or url
+
+
+def _add(metric, endpoint, label, value=1):
+    key = (metric, endpoint, label)
+    with _lock:
+        _pending[key] = _pending.get(key, 0) + value
+
+
+def observe_request(url, elapsed, status):
+    """Record one gateway round trip; ``status`` is the HTTP code or 'error'."""
+    endpoint = endpoint_of(url)
+    index = bisect.bisect_left(LATENCY_BUCKETS, elapsed)
+    if index < len(LATENCY_BUCKETS):
+        _add('latency_bucket', endpoint, str(LATENCY_BUCKETS[index]))
+    _add('latency_sum', endpoint, '', elapsed)
+    _add('latency_count', endpoint, '')
+    _add('http_status', endpoint, str(status))
+
+
+def count_fbr_status(status_code):
+    _add('fbr_status', '', str(status_code or 'none'))
+
+
+def count_retry(source):
+    _add('retries', '', source)
+
+
+def flush(registry, force=False):
+    """Add the counts of this process to the shared table, at most every FLUSH_SECONDS unless ``force``."""
+    with _lock:
+        now = time.monotonic()
+        if not _pending or (not force and now - _last_flush['at'] < FLUSH_SECONDS):
+            return
+        _last_flush['at'] = now
+        pending = dict(_pending)
+        _pending.clear()
+    keys = list(pending)
+    try:
+        with registry.cursor() as cr:
+            cr.execute("""
+                INSERT INTO fbr_metric (metric, endpoint, label, value)
+                SELECT * FROM unnest(%s::varchar[], %s::varchar[], %s::varchar[], %s::float8[])
+                ON CONFLICT (metric, endpoint, label) DO UPDATE SET value = fbr_metric.value + EXCLUDED.value
+            """, [[key[0] for key in keys], [key[1] for key in keys], [key[2] for key in keys],
+                  [pending[key] for key in keys]])
+    except psycopg2.Error as e:
+        # Keep the counts for the next flush rather than losing them
+        _logger.warning("Could not flush FBR metrics: %s", e)
+        with _lock:
+            for key, value in pending.items():
+                _pending[key] = _pending.get(key, 0) + value
+
+
+def read(cr):
+    """Counters of all processes as stored in ``fbr_metric``."""
+    data = {'latency': {}, 'http_status': {}, 'fbr_status': {}, 'retries': {}}
+    cr.execute("SELECT metric, endpoint, label, value FROM fbr_metric")
+    for metric, endpoint, label, value in cr.fetchall():
+        if metric.startswith('latency_'):
+            histogram = data['latency'].setdefault(
+                endpoint, {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0})
+            if metric == 'latency_sum':
+                histogram['sum'] = value
+            elif metric == 'latency_count':
+                histogram['count'] = int(value)
+            elif float(label) in LATENCY_BUCKETS:
+                histogram['buckets'][LATENCY_BUCKETS.index(float(label))] = int(value)
+        elif metric == 'http_status':
+            data['http_status'][(endpoint, label)] = int(value)
+        elif metric in ('fbr_status', 'retries'):
+            data[metric][label] = int(value)
+    return data
+
+
+def shared_snapshot(registry):
+    """Counters of all processes, read at most every REFRESH_SECONDS by this process."""
+    entry = _shared.get(registry.db_name)
+    if entry and time.monotonic() - entry[0] < REFRESH_SECONDS:
+        return entry[1]
+    try:
+        with registry.cursor() as cr:
+            data = read(cr)
+    except psycopg2.Error as e:
+        _logger.warning("Could not read FBR metrics: %s", e)
+        data = entry[1] if entry else None
+    _shared[registry.db_name] = (time.monotonic(), data)
+    return data
+
+
+def latency_quantile(data, endpoint, quantile, min_count=1):
+    """Upper bucket bound containing ``quantile`` of the latencies of ``endpoint`` in ``data``,
+    or None with fewer than ``min_count`` observations."""
+    histogram = (data or {}).get('latency', {}).get(endpoint)
+    if not histogram or histogram['count'] < max(min_count, 1):
+        return None
+    target = quantile * histogram['count']
+    seen = 0
+    for bound, count in zip(LATENCY_BUCKETS, histogram['buckets']):
+        seen += count
+        if seen >= target:
+            return bound
+    return float('inf')
+
+
+def _labels(**labels):
+    return ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for key, value in labels.items())
+
+
+def render_prometheus(data, gauges=()):
+    """Prometheus text exposition of the counters ``data`` (see :func:`read`) plus ``gauges``.
+
+    ``gauges`` is an iterable of ``(name, help, [(labels dict, value)])``
+    computed by the caller, typically from the database.
+    """
+    out = []
+
+    out.append('# HELP fbr_gateway_request_duration_seconds FBR gateway round-trip latency.')
+    out.append('# TYPE fbr_gateway_request_duration_seconds histogram')
+    for endpoint, histogram in sorted(data['latency'].items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, histogram['buckets']):
+            cumulative += count
+            out.append('fbr_gateway_request_duration_seconds_bucket{%s} %d' % (
+                _labels(endpoint=endpoint, le=bound), cumulative))
+        out.append('fbr_gateway_request_duration_seconds_bucket{%s} %d' % (
+            _labels(endpoint=endpoint, le='+Inf'), histogram['count']))
+        out.append('fbr_gateway_request_duration_seconds_sum{%s} %f' % (
+            _labels(endpoint=endpoint), histogram['sum']))
+        out.append('fbr_gateway_request_duration_seconds_count{%s} %d' % (
+            _labels(endpoint=endpoint), histogram['count']))
+
+    out.append('# HELP fbr_gateway_responses_total FBR gateway responses by HTTP status.')
+    out.append('# TYPE fbr_gateway_responses_total counter')
+    for (endpoint, status), count in sorted(data['http_status'].items()):
+        out.append('fbr_gateway_responses_total{%s} %d' % (_labels(endpoint=endpoint, status=status), count))
+
+    out.append('# HELP fbr_validation_status_total FBR validationResponse statusCode values.')
+    out.append('# TYPE fbr_validation_status_total counter')
+    for status, count in sorted(data['fbr_status'].items()):
+        out.append('fbr_validation_status_total{%s} %d' % (_labels(status_code=status), count))
+
+    out.append('# HELP fbr_retries_total FBR submission retries.')
+    out.append('# TYPE fbr_retries_total counter')
+    for source, count in sorted(data['retries'].items()):
+        out.append('fbr_retries_total{%s} %d' % (_labels(source=source), count))
+
+    for name, help_text, samples in gauges:
+        out.append('# HELP %s %s' % (name, help_text))
+        out.append('# TYPE %s gauge' % name)
+        for labels, value in samples:
+            out.append('%s{%s} %s' % (name, _labels(**labels), value) if labels else '%s %s' % (name, value))
+    return '\n'.join(out) + '\n'
@@ -0,0 +1,167 @@
+"""Token bucket shared by every Odoo worker posting with the same bearer token.
+
+Bucket state lives in the ``fbr_rate_limit`` table (model ``fbr.rate.limit``)
+and is updated with one row-locked statement in a short transaction of its
+own, so prefork workers, threads and cron processes all draw from the same
+budget. Each token has an ``interactive`` and a ``background`` bucket so bulk
+and cron traffic cannot starve cashiers and users.
+
+A 429 blocks every bucket of the token until its ``Retry-After`` and halves
+their refill rate, which then recovers linearly back to the configured rate.
+"""
+import hashlib
+import logging
+import time
+from datetime import datetime, timedelta
+
+import psycopg2
+
+from .fbr_errors import FbrDeferred
+
+_logger = logging.getLogger(__name__)
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+# Seconds for a halved refill rate to climb back to the configured one
+RECOVERY_SECONDS = 300.0
+# Floor of the learned refill rate, as a fraction of the configured rate
+MIN_RATE_FACTOR = 0.1
+# Seconds a caller is told to wait when the bucket cannot be read
+UNAVAILABLE_RETRY_SECONDS = 2.0
+
+
+class FbrRateLimited(FbrDeferred):
+    """The gateway budget of the token is exhausted for at least ``retry_after`` seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(retry_after, "FBR rate limit reached, retry in %.0f seconds" % max(float(retry_after), 0.0))
+
+
+def _utcnow():
+    return datetime.utcnow()
+
+
+def retry_after_of(response, default=1.0):
+    """Seconds requested by the ``Retry-After`` header of a 429, or ``default``."""
+    try:
+        return max(float(response.headers.get('Retry-After', default)), 0.0)
+    except (TypeError, ValueError):
+        # HTTP-date form, not used by the FBR gateway
+        return default
+
+
+class FbrRateLimiter:
+    """Shared token bucket for one bearer token and traffic class.
+
+    Holds plain values and the registry only, so it can be used from
+    worker threads; every call opens its own short-lived cursor.
+
+    When the bucket cannot be read, calls are refused like an exhausted
+    budget. ``fail_open`` lets interactive traffic through instead; it is
+    ignored for background traffic, which can always be rescheduled.
+    """
+
+    def __init__(self, registry, authorization, budget=INTERACTIVE, capacity=10.0, rate=5.0, max_wait=0.0,
+                 fail_open=False):
+        self.registry = registry
+        self.key = hashlib.sha1((authorization or '').encode()).hexdigest()
+        self.budget = budget
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self.max_wait = float(max_wait)
+        self.fail_open = fail_open and budget == INTERACTIVE
+
+    def _take(self):
+        """Try to consume one token; return ``(granted, seconds until one is available)``."""
+        now = _utcnow()
+        params = {
+            'key': self.key,
+            'budget': self.budget,
+            'capacity': self.capacity,
+            'rate': self.rate,
+            'recovery': self.rate / RECOVERY_SECONDS,
+            'now': now,
+        }
+        with self.registry.cursor() as cr:
+            cr.execute("""
+                INSERT INTO fbr_rate_limit (key, budget, tokens, capacity, refill_rate, max_rate, updated_at)
+                VALUES (%(key)s, %(budget)s, %(capacity)s, %(capacity)s, %(rate)s, %(rate)s, %(now)s)
+                ON CONFLICT (key, budget) DO NOTHING
+            """, params)
+            cr.execute("""
+                WITH bucket AS (
+                    SELECT id, blocked_until,
+                           LEAST(%(capacity)s, tokens + refill_rate * GREATEST(EXTRACT(EPOCH FROM (%(now)s - updated_at)), 0)) AS available,
+                           LEAST(%(rate)s, refill_rate + %(recovery)s * GREATEST(EXTRACT(EPOCH FROM (%(now)s - updated_at)), 0)) AS refill
+                      FROM fbr_rate_limit
+                     WHERE key = %(key)s AND budget = %(budget)s
+                       FOR UPDATE
+                ), decision AS (
+                    SELECT id, available, refill, blocked_until,
+                           available >= 1 AND (blocked_until IS NULL OR blocked_until <= %(now)s) AS granted
+                      FROM bucket
+                )
+                UPDATE fbr_rate_limit r
+                   SET tokens = CASE WHEN d.granted THEN d.available - 1 ELSE d.available END,
+                       refill_rate = d.refill,
+                       capacity = %(capacity)s,
+                       max_rate = %(rate)s,
+                       updated_at = %(now)s
+                  FROM decision d
+                 WHERE r.id = d.id
+             RETURNING d.granted,
+                       GREATEST(
+                           CASE WHEN d.available >= 1 THEN 0 ELSE (1 - d.available) / NULLIF(d.refill, 0) END,
+                           COALESCE(EXTRACT(EPOCH FROM (d.blocked_until - %(now)s)), 0),
+                           0
+                       )
+            """, params)
+            granted, wait = cr.fetchone()
+        return granted, float(wait or 0.0)
+
+    def acquire(self):
+        """Consume one token, waiting at most ``max_wait`` seconds for it.
+
+        Raises FbrRateLimited instead of waiting longer, so interactive
+        callers (``max_wait=0``) never hold a request worker while throttled.
+        """
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            try:
+                granted, wait = self._take()
+            except psycopg2.Error as e:
+                if self.fail_open:
+                    _logger.warning("FBR rate limiter unavailable, letting the request through: %s", e)
+                    return
+                # Unknown budget: a burst from every worker could get the token banned
+                _logger.warning("FBR rate limiter unavailable, deferring the request: %s", e)
+                raise FbrRateLimited(UNAVAILABLE_RETRY_SECONDS) from e
+            if granted:
+                return
+            wait = wait or 1.0 / (self.rate or 1.0)
+            if time.monotonic() + wait > deadline:
+                raise FbrRateLimited(wait)
+            time.sleep(wait)
+
+    def penalize(self, retry_after):
+        """Learn from a 429: block every bucket of the token and halve its refill rate."""
+        now = _utcnow()
+        try:
+            with self.registry.cursor() as cr:
+                cr.execute("""
+                    UPDATE fbr_rate_limit
+                       SET blocked_until = GREATEST(COALESCE(blocked_until, %(now)s), %(until)s),
+                           refill_rate = GREATEST(max_rate * %(floor)s, refill_rate / 2),
+                           tokens = 0,
+                           updated_at = %(now)s,
+                           throttled_count = COALESCE(throttled_count, 0) + 1
+                     WHERE key = %(key)s
+                """, {
+                    'key': self.key,
+                    'now': now,
+                    'until': now + timedelta(seconds=retry_after),
+                    'floor': MIN_RATE_FACTOR,
+                })
+        except psycopg2.Error as e:
+            _logger.warning("Could not record FBR rate limit: %s", e)
@@ -0,0 +1,115 @@
+"""FBR tax computation shared by invoices and POS orders.
+
+Works on whole documents at once: callers pass per-line price, quantity and
+discount columns plus a tax matrix (one row per line, one column per entry
+of ``TAX_COLUMNS``) and get every FBR amount column back. Uses NumPy when it
+is installed and falls back to plain Python otherwise.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TAX_COLUMNS = ('sales_tax', 'extra_tax', 'further_tax', 'fed_percent', 'fed_fixed', 'withholding_tax')
+SALES_TAX, EXTRA_TAX, FURTHER_TAX, FED_PERCENT, FED_FIXED, WITHHOLDING_TAX = range(len(TAX_COLUMNS))
+
+AMOUNT_COLUMNS = (
+    'value_sales_excluding_st',
+    'sales_tax_applicable',
+    'extra_tax_applicable',
+    'further_tax_applicable',
+    'fed_payable',
+    'withholding_tax_applicable',
+    'total_values',
+)
+
+
+def classify_tax(fbr_tax_type, amount, amount_type):
+    """Column index of a tax in the tax matrix, or None if it is not an FBR tax."""
+    if fbr_tax_type == 'fed_payable':
+        if amount_type == 'fixed':
+            return FED_FIXED
+        if amount_type == 'percent':
+            return FED_PERCENT
+        return None
+    if fbr_tax_type in TAX_COLUMNS:
+        return TAX_COLUMNS.index(fbr_tax_type)
+    return None
+
+
+def build_tax_matrix(line_tax_ids, tax_info, apply_further_tax=True):
+    """Tax matrix rows for the given per-line tax ids.
+
+    ``tax_info`` maps a tax id to ``(fbr_tax_type, amount, amount_type)``.
+    Only the first tax of each FBR type is used on a line, and further tax
+    is left out when ``apply_further_tax`` is false (registered buyers).
+    """
+    columns = {tax_id: classify_tax(*info) for tax_id, info in tax_info.items()}
+    matrix = []
+    for tax_ids in line_tax_ids:
+        row = [0.0] * len(TAX_COLUMNS)
+        seen = set()
+        for tax_id in tax_ids:
+            column = columns.get(tax_id)
+            if column is None:
+                continue
+            kind = FED_PERCENT if column == FED_FIXED else column
+            if kind in seen:
+                continue
+            seen.add(kind)
+            row[column] = tax_info[tax_id][1]
+        if not apply_further_tax:
+            row[FURTHER_TAX] = 0.0
+        matrix.append(row)
+    return matrix
+
+
+def _compute_numpy(price_unit, quantity, discount, tax_matrix):
+    price = np.asarray(price_unit, dtype=float)
+    qty = np.asarray(quantity, dtype=float)
+    disc = np.asarray(discount, dtype=float)
+    rates = np.asarray(tax_matrix, dtype=float).reshape(len(price), len(TAX_COLUMNS))
+
+    base = price * qty * (1 - disc / 100)
+    percent = base[:, None] * rates / 100
+    fed = percent[:, FED_PERCENT] + qty * rates[:, FED_FIXED]
+    total = (base + percent[:, SALES_TAX] + percent[:, EXTRA_TAX] + percent[:, FURTHER_TAX]
+             + fed + percent[:, WITHHOLDING_TAX])
+    columns = (base, percent[:, SALES_TAX], percent[:, EXTRA_TAX], percent[:, FURTHER_TAX],
+               fed, percent[:, WITHHOLDING_TAX], total)
+    return {name: column.tolist() for name, column in zip(AMOUNT_COLUMNS, columns)}
+
+
+def _compute_python(price_unit, quantity, discount, tax_matrix):
+    result = {name: [] for name in AMOUNT_COLUMNS}
+    for price, qty, disc, rates in zip(price_unit, quantity, discount, tax_matrix):
+        base = price * qty * (1 - disc / 100)
+        sales = base * rates[SALES_TAX] / 100
+        extra = base * rates[EXTRA_TAX] / 100
+        further = base * rates[FURTHER_TAX] / 100
+        fed = base * rates[FED_PERCENT] / 100 + qty * rates[FED_FIXED]
+        withholding = base * rates[WITHHOLDING_TAX] / 100
+        values = (base, sales, extra, further, fed, withholding,
+                  base + sales + extra + further + fed + withholding)
+        for name, value in zip(AMOUNT_COLUMNS, values):
+            result[name].append(value)
+    return result
+
+
+def compute_document(price_unit, quantity, discount, tax_matrix, precision=2):
+    """Compute the FBR amount columns of a document.
+
+    Returns ``(lines, totals)``: ``lines`` maps each name of
+    ``AMOUNT_COLUMNS`` to the per-line values rounded to ``precision``, and
+    ``totals`` maps it to the rounded sum of the unrounded line values.
+    """
+    if not len(price_unit):
+        return {name: [] for name in AMOUNT_COLUMNS}, {name: 0.0 for name in AMOUNT_COLUMNS}
+    if np is not None:
+        raw = _compute_numpy(price_unit, quantity, discount, tax_matrix)
+    else:
+        raw = _compute_python(price_unit, quantity, discount, tax_matrix)
+    lines = {name: [round(value, precision) for value in values] for name, values in raw.items()}
+    totals = {name: round(sum(values), precision) for name, values in raw.items()}
+    return lines, totals